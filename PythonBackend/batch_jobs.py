@@ -0,0 +1,218 @@
+# batch_jobs.py
+"""
+Batch processing of request letters.
+
+A batch job takes a directory (or a list) of PDFs, extracts them through the
+shared ``PDFTextExtractor`` and runs the per-letter compliance flow with
+bounded concurrency against the model deployment. Every finished letter is
+appended to a JSONL output file, which doubles as the checkpoint: re-running
+a job with the same output skips letters that already succeeded with the same
+content hash, so an interrupted overnight run resumes where it stopped.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+from pdf_extract import PDFTextExtractor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+DEFAULT_BATCH_PREFETCH = int(os.getenv("BATCH_PREFETCH", "4"))
+
+# (filename, page texts) -> result fields for the JSONL record
+LetterProcessor = Callable[[str, list[str]], Awaitable[dict]]
+
+
+def discover_letters(sources: list[str]) -> list[str]:
+    """Expand directories (recursively) and files into a sorted, de-duplicated list of PDFs"""
+    found: list[str] = []
+    for source in sources:
+        if os.path.isdir(source):
+            found.extend(glob.glob(os.path.join(source, "**", "*.pdf"), recursive=True))
+            found.extend(glob.glob(os.path.join(source, "**", "*.PDF"), recursive=True))
+        elif os.path.isfile(source):
+            found.append(source)
+        else:
+            raise FileNotFoundError(f"No such file or directory: {source}")
+    return sorted({os.path.abspath(path) for path in found})
+
+
+def resolve_letters(base_dir: str, sources: list[str]) -> list[str]:
+    """
+    Letters for client-supplied paths, which must be relative to ``base_dir``
+
+    Raises:
+        ValueError: If a path is absolute or resolves (symlinks included) outside ``base_dir``
+        FileNotFoundError: If a path does not exist
+    """
+    root = os.path.realpath(base_dir)
+
+    def inside(path: str) -> bool:
+        return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+    resolved = []
+    for source in sources:
+        if os.path.isabs(source) or os.path.splitdrive(source)[0]:
+            raise ValueError(f"Batch paths must be relative to the batch input directory: {source}")
+        path = os.path.join(root, source)
+        if not inside(path):
+            raise ValueError(f"Batch path escapes the batch input directory: {source}")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No such file or directory in the batch input directory: {source}")
+        resolved.append(path)
+    # Links inside the input directory must not lead out of it either
+    return [path for path in discover_letters(resolved) if inside(path)]
+
+
+def load_checkpoint(output_path: str) -> dict[str, str]:
+    """Map of file path ➜ SHA-256 for every letter that already succeeded"""
+    done: dict[str, str] = {}
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial line from an interrupted write
+            if record.get("status") == "ok":
+                done[record["file"]] = record["sha256"]
+    return done
+
+
+@dataclass
+class BatchJob:
+    """A batch run and its progress counters"""
+    files: list[str]
+    output_path: str
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "pending"          # pending ➜ running ➜ completed | failed | cancelled
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed + self.skipped
+
+    def progress(self) -> dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "output": self.output_path,
+            "total": len(self.files),
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_seconds": elapsed,
+            "error": self.error,
+        }
+
+
+class BatchRunner:
+    """
+    Run the per-letter flow over many PDFs
+
+    Args:
+        extractor: Shared PDF extractor (process pool + content-hash cache)
+        process_letter: Per-letter flow; its returned dict is merged into the record
+        concurrency: Letters in flight against the model deployment
+        prefetch: Letters read and extracted ahead of a free model slot
+    """
+
+    def __init__(
+        self,
+        extractor: PDFTextExtractor,
+        process_letter: LetterProcessor,
+        concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        prefetch: int = DEFAULT_BATCH_PREFETCH,
+    ):
+        self.extractor = extractor
+        self.process_letter = process_letter
+        self.concurrency = max(concurrency, 1)
+        self.prefetch = max(prefetch, 0)
+
+    async def run(self, job: BatchJob) -> BatchJob:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            directory = os.path.dirname(os.path.abspath(job.output_path))
+            os.makedirs(directory, exist_ok=True)
+            checkpoint = load_checkpoint(job.output_path)
+            # Bounds memory: only this many letters are held between read and result
+            slots = asyncio.Semaphore(self.concurrency + self.prefetch)
+            model_slots = asyncio.Semaphore(self.concurrency)
+            with open(job.output_path, "a", encoding="utf-8") as output:
+                await asyncio.gather(*(
+                    self._run_letter(job, path, checkpoint, slots, model_slots, output)
+                    for path in job.files
+                ))
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Batch job {job.job_id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+        logger.info(f"Batch job {job.job_id} {job.status}: {job.progress()}")
+        return job
+
+    async def _run_letter(self, job, path, checkpoint, slots, model_slots, output) -> None:
+        async with slots:
+            started = time.perf_counter()
+            record = {"file": path, "filename": os.path.basename(path)}
+            try:
+                pdf_bytes = await asyncio.to_thread(_read_bytes, path)
+                record["sha256"] = hashlib.sha256(pdf_bytes).hexdigest()
+                if checkpoint.get(path) == record["sha256"]:
+                    job.skipped += 1
+                    return
+
+                extract_started = time.perf_counter()
+                pages = await self.extractor.extract_pages(pdf_bytes)
+                del pdf_bytes
+                extract_seconds = time.perf_counter() - extract_started
+
+                async with model_slots:
+                    model_started = time.perf_counter()
+                    result = await self.process_letter(os.path.basename(path), pages)
+                    model_seconds = time.perf_counter() - model_started
+
+                record.update(status="ok", **result)
+                record["timing"] = {"extract_seconds": round(extract_seconds, 4),
+                                    "model_seconds": round(model_seconds, 4)}
+                job.succeeded += 1
+            except Exception as e:
+                logger.error(f"Batch job {job.job_id}: {path} failed: {str(e)}")
+                record.update(status="error", error=str(e))
+                job.failed += 1
+
+            record.setdefault("timing", {})["total_seconds"] = round(time.perf_counter() - started, 4)
+            record["finished_at"] = datetime.now(timezone.utc).isoformat()
+            # One line per letter; flushed so a crash loses at most the line being written
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
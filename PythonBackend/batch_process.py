@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Batch-process request letters from the command line
+
+Runs the same per-letter flow as the /api/batch endpoint without a server:
+
+    python batch_process.py ../Contoso_Request_Letters -o results.jsonl --concurrency 4
+
+Re-running with the same output file resumes: letters that already succeeded
+(with unchanged content) are skipped.
+"""
+
+import argparse
+import asyncio
+import sys
+
+from batch_jobs import DEFAULT_BATCH_CONCURRENCY, DEFAULT_BATCH_PREFETCH, BatchJob, BatchRunner, discover_letters
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Process a directory or list of request letters")
+    parser.add_argument("paths", nargs="+", help="PDF files and/or directories (searched recursively)")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL results / checkpoint file")
+    parser.add_argument("-m", "--message", default=None, help="Instruction applied to every letter")
+    parser.add_argument("-s", "--scenario", default="default", help="System prompt scenario")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY,
+                        help="Letters in flight against the model deployment")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_BATCH_PREFETCH,
+                        help="Letters extracted ahead of a free model slot")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> BatchJob:
+    # Imported here so --help works without Azure configuration
+    import main
+
+    message = args.message or main.BATCH_DEFAULT_MESSAGE
+    runner = BatchRunner(
+        main.pdf_extractor,
+        lambda filename, pages: main.process_letter(filename, pages, message=message, scenario=args.scenario),
+        concurrency=args.concurrency,
+        prefetch=args.prefetch,
+    )
+    job = BatchJob(files=discover_letters(args.paths), output_path=args.output)
+    print(f"📄 Processing {len(job.files)} letters ➜ {job.output_path}")
+    await main.email_outbox.start()
+    try:
+        return await runner.run(job)
+    finally:
+        await main.email_outbox.stop()
+        main.pdf_extractor.shutdown()
+        main.tool_executor.shutdown()
+        await main.close_upstream()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    job = asyncio.run(run(args))
+    progress = job.progress()
+    print(f"{'✅' if job.status == 'completed' and not job.failed else '❌'} {progress}")
+    sys.exit(0 if job.status == "completed" and not job.failed else 1)
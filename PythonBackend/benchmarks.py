@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the backend's CPU-side hot paths
+
+Covers tool dispatch through ``call_function``, tool list construction,
+serialising consolidated data for 1/10/100 users, SSE frame building per
+delta and PDF text extraction of every request letter. Nothing touches the
+network. Results are written as JSON so runs can be compared:
+
+    python benchmarks.py -o bench/baseline.json
+    python benchmarks.py -o bench/after.json --compare bench/baseline.json
+
+With ``--compare``, a benchmark whose median got slower than ``--threshold``
+times the baseline is reported as a regression and the exit code is 1.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LETTERS_DIR = os.path.join(HERE, "..", "Contoso_Request_Letters")
+
+# (name, group, factory returning the zero-argument function to time)
+Benchmark = tuple[str, str, Callable[[], Callable[[], object]]]
+
+
+@dataclass
+class BenchmarkResult:
+    """Per-call timings of one benchmark, in seconds"""
+    name: str
+    group: str
+    rounds: int
+    iterations: int
+    min: float
+    median: float
+    mean: float
+    stdev: float
+
+    @property
+    def ops_per_second(self) -> float:
+        return 1 / self.median if self.median else float("inf")
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "ops_per_second": round(self.ops_per_second, 2)}
+
+
+def measure(function: Callable[[], object], rounds: int = 7, min_round_time: float = 0.05) -> tuple[int, list[float]]:
+    """
+    Time ``function`` like timeit: pick an iteration count that makes one
+    round last at least ``min_round_time``, then return the per-call time of
+    each round (garbage collection disabled while timing)
+    """
+    function()  # warm-up (imports, caches, lazy pools)
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time:
+            break
+        iterations *= 2 if elapsed == 0 else max(2, min(10, int(min_round_time / elapsed) + 1))
+
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                function()
+            timings.append((time.perf_counter() - started) / iterations)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return iterations, timings
+
+
+def run_benchmark(name: str, group: str, function: Callable[[], object], rounds: int = 7,
+                  min_round_time: float = 0.05) -> BenchmarkResult:
+    iterations, timings = measure(function, rounds, min_round_time)
+    return BenchmarkResult(
+        name=name,
+        group=group,
+        rounds=rounds,
+        iterations=iterations,
+        min=min(timings),
+        median=statistics.median(timings),
+        mean=statistics.fmean(timings),
+        stdev=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def _load_main():
+    # The app module builds its Azure client at import; an API key keeps that offline
+    os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://localhost:8100/openai/v1/")
+    os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, HERE)
+    import main
+    return main
+
+
+def tool_benchmarks() -> list[Benchmark]:
+    def dispatch_no_args():
+        main = _load_main()
+        return lambda: main.call_function("get_user_info")
+
+    def dispatch_with_args():
+        main = _load_main()
+        return lambda: main.call_function("get_training_gap_analysis", username="jdoe")
+
+    def get_all_tools():
+        main = _load_main()
+        return main.get_all_tools
+
+    def build_registry():
+        from tool_registry import ToolRegistry
+        source = _load_main().registry
+
+        def build():
+            fresh = ToolRegistry()
+            for name in source.function_map:
+                spec = source.spec(name)
+                fresh.register(spec.function, description=spec.description, name=name,
+                               cacheable=spec.cacheable, cache_ttl=spec.cache_ttl)
+            return fresh.freeze()
+        return build
+
+    return [
+        ("tools.call_function.no_args", "tools", dispatch_no_args),
+        ("tools.call_function.with_args", "tools", dispatch_with_args),
+        ("tools.get_all_tools", "tools", get_all_tools),
+        ("tools.registry_build", "tools", build_registry),
+    ]
+
+
+def consolidated_benchmarks() -> list[Benchmark]:
+    def dumps_for(count: int):
+        def factory():
+            from functions import get_consolidated_data_multiple_people
+            data = get_consolidated_data_multiple_people([f"user{i:03d}" for i in range(count)])
+            return lambda: json.dumps(data)
+        return factory
+
+    def fetch_and_dumps_for(count: int):
+        def factory():
+            from functions import get_consolidated_data_multiple_people
+            usernames = [f"user{i:03d}" for i in range(count)]
+            return lambda: json.dumps(get_consolidated_data_multiple_people(usernames))
+        return factory
+
+    benchmarks = []
+    for count in (1, 10, 100):
+        benchmarks.append((f"consolidated.json_dumps.{count}_users", "consolidated", dumps_for(count)))
+        benchmarks.append((f"consolidated.fetch_and_dumps.{count}_users", "consolidated", fetch_and_dumps_for(count)))
+    return benchmarks
+
+
+def sse_benchmarks() -> list[Benchmark]:
+    def format_content_delta():
+        from sse import format_sse
+        payload = {"type": "content", "content": " compliance"}
+        return lambda: format_sse(payload, event_id="0123456789abcdef0123456789abcdef:1234", event="content")
+
+    def present_content_delta():
+        from sse import TurnPresenter, format_sse
+        from turn_engine import ContentDelta
+        presenter = TurnPresenter()
+        presenter.content_started = True
+        event = ContentDelta(round=1, text=" compliance")
+        return lambda: [format_sse(payload, event_id="s:1", event=payload.get("type"))
+                        for payload in presenter.payloads(event)]
+
+    def format_function_args_delta():
+        from sse import format_sse
+        payload = {"type": "function_args_delta", "call_id": "call_0123456789abcdef", "name": "send_email",
+                   "delta": '{"to": "compliance@contoso.com", "subject": "Follow-up"'}
+        return lambda: format_sse(payload, event_id="s:99", event="function_args_delta")
+
+    return [
+        ("sse.format_sse.content_delta", "sse", format_content_delta),
+        ("sse.presenter_frame.content_delta", "sse", present_content_delta),
+        ("sse.format_sse.function_args_delta", "sse", format_function_args_delta),
+    ]
+
+
+def pdf_benchmarks(letters_dir: str = LETTERS_DIR) -> list[Benchmark]:
+    from batch_jobs import discover_letters
+
+    def extract(path: str):
+        def factory():
+            from pdf_extract import extract_pages
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            return lambda: extract_pages(pdf_bytes)
+        return factory
+
+    if not os.path.isdir(letters_dir):
+        return []
+    return [
+        (f"pdf.extract_pages.{os.path.relpath(path, letters_dir).replace(os.sep, '/')}", "pdf", extract(path))
+        for path in discover_letters([letters_dir])
+    ]
+
+
+def all_benchmarks() -> list[Benchmark]:
+    return tool_benchmarks() + consolidated_benchmarks() + sse_benchmarks() + pdf_benchmarks()
+
+
+# ---------------------------------------------------------------------------
+# Runs and comparison
+# ---------------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(benchmarks: list[Benchmark], pattern: Optional[str] = None, rounds: int = 7,
+              min_round_time: float = 0.05, progress: bool = True) -> dict:
+    """Run the selected benchmarks and return a JSON-serialisable report"""
+    selected = [b for b in benchmarks if pattern is None or re.search(pattern, b[0])]
+    results = []
+    for name, group, factory in selected:
+        result = run_benchmark(name, group, factory(), rounds, min_round_time)
+        results.append(result.to_dict())
+        if progress:
+            print(f"  {name:<60} {result.median * 1e6:>12.2f} µs  (±{result.stdev * 1e6:.2f}, {result.iterations} iters)")
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = 1.15) -> list[dict]:
+    """Benchmarks whose median is more than ``threshold`` times the baseline median"""
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in current.get("results", []):
+        before = previous.get(result["name"])
+        if before is None or not before["median"]:
+            continue
+        ratio = result["median"] / before["median"]
+        if ratio > threshold:
+            regressions.append({"name": result["name"], "baseline": before["median"],
+                                "current": result["median"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the CPU hot-path microbenchmarks")
+    parser.add_argument("-k", "--filter", default=None, help="Only run benchmarks whose name matches this regex")
+    parser.add_argument("-o", "--output", default=None, help="Write the results as JSON")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.15,
+                        help="Slowdown ratio of the median that counts as a regression")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="Seconds per timing round")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    print("⏱️  Running benchmarks")
+    report = run_suite(all_benchmarks(), args.filter, args.rounds, args.min_round_time)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"❌ {regression['name']}: {regression['ratio']}x slower "
+                  f"({regression['baseline'] * 1e6:.2f} ➜ {regression['current'] * 1e6:.2f} µs)")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"✅ No regressions above {args.threshold}x")
+    sys.exit(exit_code)
@@ -0,0 +1,313 @@
+# conversation_store.py
+"""
+Server-side conversation state for chaining turns with ``previous_response_id``.
+
+The Responses API keeps every response (input items included) upstream, so a
+follow-up turn only has to send the new user message together with the id of
+the conversation's last response instead of the system prompt and the whole
+history. ``ConversationStore`` remembers that id per conversation id: an LRU
+of recently active conversations in memory, optionally backed by SQLite so
+conversations survive a restart.
+
+Conversations expire after a TTL of inactivity (well inside the upstream
+retention of stored responses) and both tiers are size-bounded. A
+conversation belongs to the user who started it; anyone else presenting its
+id gets a fresh conversation.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+from turn_engine import TurnEvent, TurnFinished
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_MAX_ENTRIES", "10000"))
+DEFAULT_CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL_SECONDS", "86400"))
+DEFAULT_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "")        # empty keeps conversations in memory only
+DEFAULT_DB_MAX_ROWS = int(os.getenv("CONVERSATION_DB_MAX_ROWS", "100000"))
+
+# Budget stops that end a turn with function calls the model is still waiting
+# for; such a response cannot be continued with a new user message
+UNANSWERED_CALL_STOPS = ("max_seconds", "max_tokens")
+
+_PRUNE_EVERY = 100   # database writes between expiry / size sweeps
+
+
+@dataclass
+class Conversation:
+    conversation_id: str
+    user: str = ""
+    scenario: str = "default"
+    last_response_id: Optional[str] = None
+    turns: int = 0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    @property
+    def continued(self) -> bool:
+        """Whether the next turn can chain from an earlier response"""
+        return self.last_response_id is not None
+
+
+def is_stale_response_error(error: Exception) -> bool:
+    """Whether the upstream rejected ``previous_response_id`` (expired or unknown response)"""
+    status = getattr(error, "status_code", None)
+    return status == 404 or (status == 400 and "previous_response" in str(error).lower())
+
+
+class ConversationStore:
+    """
+    Last response id per conversation, with LRU eviction, TTL expiry and an
+    optional SQLite tier
+
+    Thread-safe; every operation is a dictionary lookup or a single-row
+    SQLite statement, cheap enough to run on the event loop.
+
+    Args:
+        max_conversations: LRU bound on conversations held in memory
+        ttl: Seconds of inactivity after which a conversation is forgotten
+        path: SQLite database file (empty for memory only)
+        max_rows: Bound on conversations kept in the database (oldest first out)
+        clock: Wall-clock time source (injectable for tests); persisted
+            timestamps have to stay meaningful across restarts
+    """
+
+    def __init__(
+        self,
+        max_conversations: int = DEFAULT_MAX_CONVERSATIONS,
+        ttl: float = DEFAULT_CONVERSATION_TTL,
+        path: str = DEFAULT_DB_PATH,
+        max_rows: int = DEFAULT_DB_MAX_ROWS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        self.path = path
+        self.max_rows = max_rows
+        self.clock = clock
+        self._conversations: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            " conversation_id TEXT PRIMARY KEY, user TEXT NOT NULL, scenario TEXT NOT NULL,"
+            " last_response_id TEXT, turns INTEGER NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)")
+
+    # -- lookup -------------------------------------------------------------
+
+    def _expired(self, conversation: Conversation) -> bool:
+        return self.clock() - conversation.updated_at >= self.ttl
+
+    def _remember(self, conversation: Conversation) -> None:
+        self._conversations[conversation.conversation_id] = conversation
+        self._conversations.move_to_end(conversation.conversation_id)
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, conversation_id: str) -> Optional[Conversation]:
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT conversation_id, user, scenario, last_response_id, turns, created_at, updated_at"
+            " FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return Conversation(*row) if row else None
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """A live conversation, or None when unknown or expired"""
+        with self._lock:
+            conversation = self._conversations.get(conversation_id) or self._load(conversation_id)
+            if conversation is None:
+                self.misses += 1
+                return None
+            if self._expired(conversation):
+                self._delete(conversation_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._remember(conversation)
+            self.hits += 1
+            return conversation
+
+    def open(self, conversation_id: Optional[str], user: str, scenario: str = "default") -> Conversation:
+        """
+        The conversation a turn belongs to: the stored one when it is live and
+        owned by ``user``, otherwise a new one (keeping a client-chosen id
+        unless it belongs to somebody else)
+        """
+        conversation = self.get(conversation_id) if conversation_id else None
+        if conversation is not None and conversation.user == user:
+            return conversation
+        if conversation is not None:
+            logger.warning("Conversation id presented by another user; starting a new conversation")
+            conversation_id = None
+        now = self.clock()
+        return Conversation(conversation_id or uuid.uuid4().hex, user=user, scenario=scenario,
+                            created_at=now, updated_at=now)
+
+    # -- updates ------------------------------------------------------------
+
+    def record(self, conversation: Conversation, response_id: str) -> None:
+        """Continue the conversation from ``response_id`` on its next turn"""
+        conversation.last_response_id = response_id
+        conversation.turns += 1
+        conversation.updated_at = self.clock()
+        with self._lock:
+            self._remember(conversation)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO conversations"
+                    " (conversation_id, user, scenario, last_response_id, turns, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (conversation.conversation_id, conversation.user, conversation.scenario,
+                     conversation.last_response_id, conversation.turns, conversation.created_at,
+                     conversation.updated_at),
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._prune_db()
+
+    def forget(self, conversation_id: str) -> bool:
+        """Drop a conversation; its next turn starts over from the full history"""
+        with self._lock:
+            return self._delete(conversation_id)
+
+    def _delete(self, conversation_id: str) -> bool:
+        removed = self._conversations.pop(conversation_id, None) is not None
+        if self._db is not None:
+            removed = self._db.execute(
+                "DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,)).rowcount > 0 or removed
+        return removed
+
+    def _prune_db(self) -> int:
+        cutoff = self.clock() - self.ttl
+        removed = self._db.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,)).rowcount
+        removed += self._db.execute(
+            "DELETE FROM conversations WHERE conversation_id IN"
+            " (SELECT conversation_id FROM conversations ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        ).rowcount
+        return removed
+
+    def purge(self) -> int:
+        """Remove expired conversations (and database rows over the size limit)"""
+        with self._lock:
+            expired = [cid for cid, c in self._conversations.items() if self._expired(c)]
+            for conversation_id in expired:
+                del self._conversations[conversation_id]
+            self.expirations += len(expired)
+            removed = self._prune_db() if self._db is not None else 0
+            return max(len(expired), removed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stored = (self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+                      if self._db is not None else None)
+            return {
+                "conversations": len(self._conversations),
+                "stored": stored,
+                "max_conversations": self.max_conversations,
+                "ttl_seconds": self.ttl,
+                "backend": "sqlite" if self._db is not None else "memory",
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+async def track_conversation(
+    events: AsyncIterator[TurnEvent], store: ConversationStore, conversation: Conversation
+) -> AsyncIterator[TurnEvent]:
+    """
+    Pass a turn's events through and remember its last response id for the
+    conversation's next turn
+    """
+    async for event in events:
+        if isinstance(event, TurnFinished):
+            if event.stop_reason in UNANSWERED_CALL_STOPS:
+                # The last response still waits for tool output: start over next time
+                store.forget(conversation.conversation_id)
+                conversation.last_response_id = None
+            elif event.response_id:
+                store.record(conversation, event.response_id)
+        yield event
+
+
+async def continue_conversation(
+    store: ConversationStore,
+    conversation: Conversation,
+    run: Callable[[list, Optional[str]], AsyncIterator[TurnEvent]],
+    new_input: list,
+    full_input: list,
+    on_mode: Optional[Callable[[str], None]] = None,
+) -> AsyncIterator[TurnEvent]:
+    """
+    Run one turn of a conversation and remember where it ended
+
+    A continued conversation sends only ``new_input`` and chains from its last
+    response; a new one sends ``full_input`` (system prompt and any history).
+    If the upstream no longer knows the last response, the turn is retried
+    once from ``full_input``.
+
+    Args:
+        run: Starts a turn from ``(input_items, previous_response_id)``
+        on_mode: Told how the turn was sent: "chained", "full" or "fallback"
+    """
+    async def events() -> AsyncIterator[TurnEvent]:
+        mode = "full"
+        if conversation.continued:
+            turn = run(new_input, conversation.last_response_id)
+            try:
+                first = await turn.__anext__()
+            except Exception as e:
+                if not is_stale_response_error(e):
+                    raise
+                logger.warning(f"Conversation {conversation.conversation_id} expired upstream, resending history: {e}")
+                store.forget(conversation.conversation_id)
+                conversation.last_response_id = None
+                mode = "fallback"
+            else:
+                if on_mode:
+                    on_mode("chained")
+                yield first
+                async for event in turn:
+                    yield event
+                return
+        if on_mode:
+            on_mode(mode)
+        async for event in run(full_input, None):
+            yield event
+
+    async for event in track_conversation(events(), store, conversation):
+        yield event
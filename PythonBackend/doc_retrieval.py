@@ -0,0 +1,203 @@
+# doc_retrieval.py
+"""
+Chunked lexical retrieval over uploaded documents.
+
+Instead of truncating the extracted text to a fixed number of characters, the
+pages are split into paragraph-aware chunks, ranked against the user's message
+with BM25 and packed into the prompt under a token budget. Everything runs
+in-process; a 40-page document indexes in a few milliseconds.
+"""
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional
+
+DEFAULT_CHUNK_TOKENS = int(os.getenv("DOC_CHUNK_TOKENS", "200"))
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("DOC_CONTEXT_TOKENS", "2000"))
+DEFAULT_TOP_K = int(os.getenv("DOC_TOP_K", "8"))
+
+_TERM = re.compile(r"[a-z0-9$][a-z0-9$.\-]*[a-z0-9]|[a-z0-9]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do for from has have i in is it its me my of on or our please "
+    "that the their this to us was we what which will with you your".split()
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English prose)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+def tokenize(text: str) -> list[str]:
+    return [term for term in _TERM.findall(text.lower()) if term not in _STOPWORDS]
+
+
+@dataclass
+class DocumentChunk:
+    """A contiguous run of paragraphs from one page"""
+    index: int
+    page: int            # 1-based page number
+    text: str
+    tokens: int = 0
+
+    def __post_init__(self):
+        if not self.tokens:
+            self.tokens = estimate_tokens(self.text)
+
+
+def _split_oversized(paragraph: str, max_tokens: int) -> list[str]:
+    """Break a paragraph that exceeds the chunk size on line, then word, boundaries"""
+    pieces: list[str] = []
+    current = ""
+    for unit in re.split(r"(?<=\n)|(?<= )", paragraph):
+        if current and estimate_tokens(current + unit) > max_tokens:
+            pieces.append(current.strip())
+            current = ""
+        current += unit
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+
+def chunk_pages(pages: list[str], max_tokens: int = DEFAULT_CHUNK_TOKENS) -> list[DocumentChunk]:
+    """
+    Split page texts into chunks of at most ``max_tokens``
+
+    Chunks never cross a page boundary. Paragraphs (blank-line separated) are
+    packed together until the chunk is full; a paragraph larger than a chunk
+    is split on line and word boundaries.
+    """
+    chunks: list[DocumentChunk] = []
+    for page_number, page in enumerate(pages, start=1):
+        buffer: list[str] = []
+        size = 0
+        for paragraph in re.split(r"\n\s*\n", page):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            for piece in _split_oversized(paragraph, max_tokens):
+                piece_tokens = estimate_tokens(piece)
+                if buffer and size + piece_tokens > max_tokens:
+                    chunks.append(DocumentChunk(len(chunks), page_number, "\n".join(buffer)))
+                    buffer, size = [], 0
+                buffer.append(piece)
+                size += piece_tokens
+        if buffer:
+            chunks.append(DocumentChunk(len(chunks), page_number, "\n".join(buffer)))
+    return chunks
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of chunks
+
+    Args:
+        chunks: Chunks to index
+        k1: Term-frequency saturation
+        b: Length normalisation
+    """
+
+    def __init__(self, chunks: list[DocumentChunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._term_counts = [Counter(tokenize(chunk.text)) for chunk in chunks]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._average_length = (sum(self._lengths) / len(chunks)) if chunks else 0.0
+        document_frequency: Counter = Counter()
+        for counts in self._term_counts:
+            document_frequency.update(counts.keys())
+        total = len(chunks)
+        self._idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query: str) -> list[float]:
+        terms = set(tokenize(query))
+        results = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._average_length) if self._average_length else self.k1
+            for term in terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+    def search(self, query: str, k: int = DEFAULT_TOP_K) -> list[tuple[DocumentChunk, float]]:
+        """Top-k chunks with a positive score, best first"""
+        ranked = sorted(zip(self.chunks, self.scores(query)), key=lambda pair: (-pair[1], pair[0].index))
+        return [(chunk, score) for chunk, score in ranked[:k] if score > 0]
+
+
+@dataclass
+class DocumentContext:
+    """The excerpt of a document selected for one prompt"""
+    text: str
+    chunks: list[DocumentChunk] = field(default_factory=list)
+    total_chunks: int = 0
+    tokens: int = 0
+
+    @property
+    def complete(self) -> bool:
+        return len(self.chunks) == self.total_chunks
+
+    def summary(self) -> dict:
+        return {"chunks_used": len(self.chunks), "total_chunks": self.total_chunks, "context_tokens": self.tokens}
+
+
+def select_context(
+    pages: list[str],
+    query: str,
+    token_budget: int = DEFAULT_CONTEXT_TOKENS,
+    top_k: int = DEFAULT_TOP_K,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    index: Optional[BM25Index] = None,
+) -> DocumentContext:
+    """
+    Pick the chunks most relevant to ``query`` that fit in ``token_budget``
+
+    The opening chunk is always kept because letters carry sender, recipient
+    and subject there. When nothing matches the query (e.g. "summarise this"),
+    chunks are taken in document order instead. The selected chunks are
+    rendered in document order with page markers.
+    """
+    if index is None:
+        index = BM25Index(chunk_pages(pages, chunk_tokens))
+    chunks = index.chunks
+    if not chunks:
+        return DocumentContext(text="", total_chunks=0)
+
+    ranked = [chunk for chunk, _ in index.search(query, top_k)]
+    candidates = [chunks[0]] + [chunk for chunk in ranked if chunk.index != 0]
+    if not ranked:
+        candidates = chunks
+
+    selected: list[DocumentChunk] = []
+    used = 0
+    for chunk in candidates:
+        if used + chunk.tokens > token_budget:
+            continue
+        selected.append(chunk)
+        used += chunk.tokens
+    selected.sort(key=lambda chunk: chunk.index)
+
+    return DocumentContext(text=render_chunks(selected), chunks=selected, total_chunks=len(chunks), tokens=used)
+
+
+def render_chunks(chunks: list[DocumentChunk]) -> str:
+    """Join chunks with a page marker on each new page and an ellipsis over gaps"""
+    parts: list[str] = []
+    previous: Optional[DocumentChunk] = None
+    for chunk in chunks:
+        if previous is not None and chunk.index != previous.index + 1:
+            parts.append("[...]")
+        if previous is None or chunk.page != previous.page:
+            parts.append(f"[Page {chunk.page}]")
+        parts.append(chunk.text)
+        previous = chunk
+    return "\n\n".join(parts)
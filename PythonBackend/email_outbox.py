@@ -0,0 +1,444 @@
+# email_outbox.py
+"""
+Outbound e-mail queue.
+
+The e-mail tools only hand a message to the ``EmailOutbox`` and return its
+message id; nothing waits for the mail server inside a model turn. The
+outbox writes every message to a spool directory first, so queued mail
+survives a restart, and background workers deliver it:
+
+- each worker owns one persistent SMTP connection (STARTTLS and login happen
+  once per connection, not once per message) and reconnects when the server
+  drops it;
+- messages that are waiting together are sent as a batch over one
+  connection in a single thread hop;
+- transient failures (connection errors, 4xx replies) are retried with
+  exponential backoff; permanent failures (5xx) and messages that ran out of
+  attempts are moved to ``<spool>/failed``;
+- the queue is ordered by priority, so urgent mail goes out ahead of
+  normal mail that is already waiting.
+
+smtplib is blocking, so each batch runs on a worker thread; the event loop
+only schedules and tracks.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import make_msgid
+from typing import Callable, Optional
+
+from request_logging import log_event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPOOL_DIR = os.getenv("EMAIL_SPOOL_DIR", "email_spool")
+DEFAULT_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+DEFAULT_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+DEFAULT_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "2"))
+DEFAULT_RETRY_MAX = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "300"))
+DEFAULT_DRAIN_SECONDS = float(os.getenv("EMAIL_DRAIN_SECONDS", "10"))
+DEFAULT_KEEPALIVE = float(os.getenv("SMTP_KEEPALIVE_SECONDS", "60"))
+
+# Lower ranks are sent first; equal ranks keep submission order
+PRIORITY_RANK = {"urgent": 0, "high": 1, "normal": 2, "low": 3}
+
+
+class PermanentDeliveryError(Exception):
+    """The server rejected a message for good (5xx); retrying will not help"""
+
+
+@dataclass
+class OutboundEmail:
+    """One queued message and its delivery state"""
+    sender: str
+    recipients: list[str]
+    subject: str
+    content: str
+    content_type: str = "plain"
+    sender_name: str = ""
+    priority: str = "normal"             # urgent, high, normal or low
+    message_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+    attempts: int = 0
+    next_attempt_at: float = 0.0
+    last_error: Optional[str] = None
+
+    def to_mime(self) -> str:
+        message = MIMEMultipart("alternative")
+        message["Subject"] = self.subject
+        message["From"] = f"{self.sender_name} <{self.sender}>" if self.sender_name else self.sender
+        message["To"] = ", ".join(self.recipients)
+        message["Message-ID"] = make_msgid(idstring=self.message_id)
+        message.attach(MIMEText(self.content, "html" if self.content_type.lower() == "html" else "plain"))
+        return message.as_string()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OutboundEmail":
+        return cls(**{name: data[name] for name in cls.__dataclass_fields__ if name in data})
+
+
+class SMTPTransport:
+    """
+    One persistent SMTP connection (blocking; called from a worker thread)
+
+    Args:
+        host, port: Mail server
+        username, password: Login (skipped when no password is set)
+        starttls: Upgrade the connection with STARTTLS before logging in
+        timeout: Socket timeout in seconds
+        keepalive: Idle seconds after which the connection is probed with NOOP before reuse
+    """
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "", starttls: bool = True,
+                 timeout: float = 30.0, keepalive: float = DEFAULT_KEEPALIVE):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.connections_opened = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+                smtp.ehlo()
+            if self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connections_opened += 1
+        return smtp
+
+    def _connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.keepalive:
+            try:
+                if self._smtp.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def send_batch(self, emails: list[OutboundEmail]) -> list[Optional[Exception]]:
+        """Send each message over the pooled connection; returns one error (or None) per message"""
+        errors: list[Optional[Exception]] = []
+        for email in emails:
+            try:
+                self._send_one(email)
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    def _send_one(self, email: OutboundEmail) -> None:
+        text = email.to_mime()
+        for attempt in range(2):
+            smtp = self._connection()
+            try:
+                refused = smtp.sendmail(email.sender, email.recipients, text)
+                self._last_used = time.monotonic()
+                if refused:
+                    raise PermanentDeliveryError(f"Recipients refused: {sorted(refused)}")
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server closed the idle connection: reconnect once, right away
+                self.close()
+                if attempt:
+                    raise
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500:
+                    raise PermanentDeliveryError(f"{e.smtp_code} {e.smtp_error!r}") from e
+                raise
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentDeliveryError(f"Recipients refused: {sorted(e.recipients)}") from e
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+
+class LoggingTransport:
+    """Simulation mode: log messages instead of delivering them"""
+
+    connections_opened = 0
+
+    def send_batch(self, emails: list[OutboundEmail]) -> list[Optional[Exception]]:
+        for email in emails:
+            log_event(logger, logging.INFO, "email simulated", message_id=email.message_id,
+                      to=email.recipients, subject=email.subject, content_type=email.content_type,
+                      content_preview=email.content[:200])
+        return [None] * len(emails)
+
+    def close(self) -> None:
+        pass
+
+
+class EmailOutbox:
+    """
+    Spooled, batched, retrying delivery of outbound e-mail
+
+    Args:
+        transport_factory: Creates one transport (connection) per worker
+        spool_dir: Directory messages are persisted to until delivered (None keeps them in memory only)
+        workers: Concurrent connections to the mail server
+        batch_size: Messages sent per batch over one connection
+        max_attempts: Delivery attempts before a message is given up
+        retry_base, retry_max: Exponential backoff bounds in seconds
+    """
+
+    def __init__(
+        self,
+        transport_factory: Callable[[], object],
+        spool_dir: Optional[str] = DEFAULT_SPOOL_DIR,
+        workers: int = DEFAULT_WORKERS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_base: float = DEFAULT_RETRY_BASE,
+        retry_max: float = DEFAULT_RETRY_MAX,
+    ):
+        self.transport_factory = transport_factory
+        self.spool_dir = spool_dir
+        self.workers = max(workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._order = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._transports: list = []
+        self._retry_timers: dict[str, tuple[asyncio.TimerHandle, OutboundEmail]] = {}
+        self._pending: list[OutboundEmail] = []     # submitted while the outbox is not running
+        self._states: OrderedDict[str, dict] = OrderedDict()
+        self._states_lock = threading.Lock()       # submit() records state from tool worker threads
+        self.counts = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "batches": 0}
+        if spool_dir:
+            os.makedirs(os.path.join(spool_dir, "failed"), exist_ok=True)
+
+    # -- spool -------------------------------------------------------------
+
+    def _spool_path(self, message_id: str, failed: bool = False) -> str:
+        return os.path.join(self.spool_dir, "failed" if failed else "", f"{message_id}.json")
+
+    def _persist(self, email: OutboundEmail) -> None:
+        if not self.spool_dir:
+            return
+        path = self._spool_path(email.message_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(asdict(email), f, ensure_ascii=False)
+        os.replace(tmp, path)   # atomic: a crash never leaves a half-written message
+
+    def _unspool(self, email: OutboundEmail, failed: bool = False) -> None:
+        if not self.spool_dir:
+            return
+        path = self._spool_path(email.message_id)
+        try:
+            if failed:
+                self._persist(email)
+                os.replace(path, self._spool_path(email.message_id, failed=True))
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _load_spool(self) -> list[OutboundEmail]:
+        if not self.spool_dir:
+            return []
+        emails = []
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.spool_dir, name), "r", encoding="utf-8") as f:
+                    emails.append(OutboundEmail.from_dict(json.load(f)))
+            except (OSError, ValueError, TypeError) as e:
+                logger.error(f"Skipping unreadable spooled e-mail {name}: {e}")
+        return sorted(emails, key=lambda email: email.created_at)
+
+    # -- submission ----------------------------------------------------------
+
+    def _set_state(self, email: OutboundEmail, status: str) -> None:
+        with self._states_lock:
+            self._states[email.message_id] = {"message_id": email.message_id, "status": status,
+                                              "attempts": email.attempts, "last_error": email.last_error}
+            self._states.move_to_end(email.message_id)
+            while len(self._states) > 10_000:
+                self._states.popitem(last=False)
+
+    def submit(self, email: OutboundEmail) -> str:
+        """
+        Queue a message for delivery and return its id
+
+        Safe to call from tool worker threads: the message is spooled and its
+        "queued" state recorded right away, then it is handed to the event
+        loop the outbox runs on, so ``status()`` knows the id on return.
+        """
+        self._persist(email)
+        self._set_state(email, "queued")
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._accept, email)
+        else:
+            self._accept(email)
+        return email.message_id
+
+    def _accept(self, email: OutboundEmail) -> None:
+        self.counts["queued"] += 1
+        self._enqueue(email)
+
+    def _enqueue(self, email: OutboundEmail) -> None:
+        self._retry_timers.pop(email.message_id, None)
+        if self._queue is not None:
+            self._queue.put_nowait((PRIORITY_RANK.get(email.priority, PRIORITY_RANK["normal"]), next(self._order), email))
+        else:
+            self._pending.append(email)
+
+    def _schedule(self, email: OutboundEmail, delay: float) -> None:
+        handle = self._loop.call_later(delay, self._enqueue, email)
+        self._retry_timers[email.message_id] = (handle, email)
+
+    def status(self, message_id: str) -> Optional[dict]:
+        with self._states_lock:
+            return self._states.get(message_id)
+
+    def stats(self) -> dict:
+        return {
+            **self.counts,
+            "in_queue": self._queue.qsize() if self._queue is not None else len(self._pending),
+            "awaiting_retry": len(self._retry_timers),
+            "connections_opened": sum(getattr(t, "connections_opened", 0) for t in self._transports),
+            "running": bool(self._tasks),
+        }
+
+    # -- delivery ------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start the workers and re-queue anything left in the spool"""
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        spooled = {email.message_id: email for email in self._load_spool()}
+        for email in self._pending:
+            spooled.setdefault(email.message_id, email)
+        self._pending.clear()
+        now = time.time()
+        for email in spooled.values():
+            self._set_state(email, "queued")
+            delay = email.next_attempt_at - now
+            if delay > 0:
+                self._schedule(email, delay)
+            else:
+                self._enqueue(email)
+        if spooled:
+            log_event(logger, logging.INFO, "email outbox resumed", messages=len(spooled))
+        self._transports = [self.transport_factory() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(transport)) for transport in self._transports]
+
+    async def _next_batch(self) -> list[OutboundEmail]:
+        batch = [(await self._queue.get())[-1]]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait()[-1])
+        return batch
+
+    async def _worker(self, transport) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                for email in batch:
+                    email.attempts += 1
+                    self._set_state(email, "sending")
+                try:
+                    errors = await asyncio.to_thread(transport.send_batch, batch)
+                except Exception as e:
+                    errors = [e] * len(batch)
+                self.counts["batches"] += 1
+                for email, error in zip(batch, errors):
+                    self._settle(email, error)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _settle(self, email: OutboundEmail, error: Optional[Exception]) -> None:
+        if error is None:
+            self.counts["sent"] += 1
+            email.last_error = None
+            self._set_state(email, "sent")
+            self._unspool(email)
+            log_event(logger, logging.INFO, "email sent", message_id=email.message_id, attempts=email.attempts)
+            return
+
+        email.last_error = f"{type(error).__name__}: {error}"
+        if isinstance(error, PermanentDeliveryError) or email.attempts >= self.max_attempts:
+            self.counts["failed"] += 1
+            self._set_state(email, "failed")
+            self._unspool(email, failed=True)
+            logger.error(f"E-mail {email.message_id} failed after {email.attempts} attempt(s): {email.last_error}")
+            return
+
+        delay = min(self.retry_base * 2 ** (email.attempts - 1), self.retry_max)
+        delay *= random.uniform(0.8, 1.2)
+        email.next_attempt_at = time.time() + delay
+        self.counts["retries"] += 1
+        self._set_state(email, "retrying")
+        self._persist(email)
+        self._schedule(email, delay)
+        log_event(logger, logging.WARNING, "email retry scheduled", message_id=email.message_id,
+                  attempts=email.attempts, delay_s=round(delay, 2), error=email.last_error)
+
+    async def join(self) -> None:
+        """Wait until every queued message has been attempted (retries not included)"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self, drain: float = DEFAULT_DRAIN_SECONDS) -> None:
+        """Deliver what is queued (up to ``drain`` seconds), then stop; the rest stays spooled"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout=drain)
+        except asyncio.TimeoutError:
+            logger.warning(f"E-mail outbox stopped with {self._queue.qsize()} message(s) still spooled")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for transport in self._transports:
+            await asyncio.to_thread(transport.close)
+        # Undelivered messages are picked up again by the next start() (and are still in the spool)
+        for handle, email in self._retry_timers.values():
+            handle.cancel()
+            self._pending.append(email)
+        self._retry_timers.clear()
+        while not self._queue.empty():
+            self._pending.append(self._queue.get_nowait()[-1])
+        self._loop = None
+        self._queue = None
@@ -1,8 +1,17 @@
 # functions.py
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date
+from typing import Callable, Iterator, Literal, Optional
+
+from tool_registry import tool
 
 TODAY = str(date.today())      # quick helper for “last_updated” fields
 
+@tool(
+    "Get vendor risk ratings for a specific user",
+    username="The username to get vendor risk ratings for",
+)
 def get_vendor_risk_ratings_complete(username: str) -> dict:
     """Get vendor risk ratings for a specific user"""
     return {
@@ -18,6 +27,10 @@ def get_vendor_risk_ratings_complete(username: str) -> dict:
         "last_updated": "2024-12-15"
     }
 
+@tool(
+    "Get asset checkout records for a specific user",
+    username="The username to get asset checkout records for",
+)
 def get_asset_checkout_records(username: str) -> dict:
     """Get asset checkout records for a specific user"""
     return {
@@ -33,6 +46,10 @@ def get_asset_checkout_records(username: str) -> dict:
         "last_updated": "2024-12-15"
     }
 
+@tool(
+    "Get final HR clearance forms for a specific user",
+    username="The username to get HR clearance forms for",
+)
 def get_final_hr_clearance_forms(username: str) -> dict:
     """Get final HR clearance forms for a specific user"""
     return {
@@ -49,6 +66,10 @@ def get_final_hr_clearance_forms(username: str) -> dict:
         "last_updated": "2024-12-15"
     }
 
+@tool(
+    "Get pre and post transfer KPI deltas for a specific user",
+    username="The username to get KPI deltas for",
+)
 def get_pre_post_transfer_kpi_deltas(username: str) -> dict:
     """Get pre and post transfer KPI deltas for a specific user"""
     return {
@@ -66,6 +87,10 @@ def get_pre_post_transfer_kpi_deltas(username: str) -> dict:
         "last_updated": "2024-12-15"
     }
 
+@tool(
+    "Get training gap analysis for a specific user",
+    username="The username to get training gap analysis for",
+)
 def get_training_gap_analysis(username: str) -> dict:
     """Get training gap analysis for a specific user"""
     return {
@@ -83,6 +108,10 @@ def get_training_gap_analysis(username: str) -> dict:
         "last_updated": "2024-12-15"
     }
 
+@tool(
+    "Get sales leaderboard rankings for a specific user",
+    username="The username to get sales rankings for",
+)
 def get_sales_leaderboard_rankings(username: str) -> dict:
     """Get sales leaderboard rankings for a specific user"""
     return {
@@ -105,6 +134,10 @@ def get_sales_leaderboard_rankings(username: str) -> dict:
         "last_updated": "2024-12-15"
     }
 
+@tool(
+    "Get new client acquisition metrics for a specific user",
+    username="The username to get client acquisition metrics for",
+)
 def get_new_client_acquisition_metrics(username: str) -> dict:
     """Get new client acquisition metrics for a specific user"""
     return {
@@ -137,6 +170,10 @@ def _wrap(username: str, data_type: str, payload: dict) -> dict:
     }
 
 
+@tool(
+    "Get quarter-end variance schedules for a specific user",
+    username="The username to get variance schedules for",
+)
 def get_quarter_end_variance_schedules(username: str) -> dict:
     return _wrap(
         username,
@@ -150,6 +187,10 @@ def get_quarter_end_variance_schedules(username: str) -> dict:
     )
 
 
+@tool(
+    "Get invoices over threshold for a specific user",
+    username="The username to get invoices over threshold for",
+)
 def get_invoices_over_threshold(username: str) -> dict:
     return _wrap(
         username,
@@ -164,6 +205,10 @@ def get_invoices_over_threshold(username: str) -> dict:
     )
 
 
+@tool(
+    "Get pending contract redlines for a specific user",
+    username="The username to get pending contract redlines for",
+)
 def get_pending_contract_redlines(username: str) -> dict:
     return _wrap(
         username,
@@ -177,6 +222,10 @@ def get_pending_contract_redlines(username: str) -> dict:
     )
 
 
+@tool(
+    "Get customer signature status for a specific user",
+    username="The username to get customer signature status for",
+)
 def get_customer_signature_status(username: str) -> dict:
     return _wrap(
         username,
@@ -190,6 +239,10 @@ def get_customer_signature_status(username: str) -> dict:
     )
 
 
+@tool(
+    "Get vendor arbitration documents for a specific user",
+    username="The username to get vendor arbitration documents for",
+)
 def get_vendor_arbitration_documents(username: str) -> dict:
     return _wrap(
         username,
@@ -202,6 +255,10 @@ def get_vendor_arbitration_documents(username: str) -> dict:
     )
 
 
+@tool(
+    "Get shipping discrepancy logs for a specific user",
+    username="The username to get shipping discrepancy logs for",
+)
 def get_shipping_discrepancy_logs(username: str) -> dict:
     return _wrap(
         username,
@@ -215,6 +272,10 @@ def get_shipping_discrepancy_logs(username: str) -> dict:
     )
 
 
+@tool(
+    "Get control test evidence for a specific user",
+    username="The username to get control test evidence for",
+)
 def get_control_test_evidence(username: str) -> dict:
     return _wrap(
         username,
@@ -230,6 +291,10 @@ def get_control_test_evidence(username: str) -> dict:
     )
 
 
+@tool(
+    "Get remediation status matrix for a specific user",
+    username="The username to get remediation status matrix for",
+)
 def get_remediation_status_matrix(username: str) -> dict:
     return _wrap(
         username,
@@ -243,6 +308,10 @@ def get_remediation_status_matrix(username: str) -> dict:
     )
 
 
+@tool(
+    "Get inter-site transfer approvals for a specific user",
+    username="The username to get transfer approvals for",
+)
 def get_inter_site_transfer_approvals(username: str) -> dict:
     return _wrap(
         username,
@@ -256,6 +325,10 @@ def get_inter_site_transfer_approvals(username: str) -> dict:
     )
 
 
+@tool(
+    "Get mobility stipend usage for a specific user",
+    username="The username to get mobility stipend usage for",
+)
 def get_mobility_stipend_usage(username: str) -> dict:
     return _wrap(
         username,
@@ -271,6 +344,10 @@ def get_mobility_stipend_usage(username: str) -> dict:
     )
 
 
+@tool(
+    "Get endpoint patch compliance summary for a specific user",
+    username="The username to get patch compliance summary for",
+)
 def get_endpoint_patch_compliance_summary(username: str) -> dict:
     return _wrap(
         username,
@@ -284,6 +361,10 @@ def get_endpoint_patch_compliance_summary(username: str) -> dict:
     )
 
 
+@tool(
+    "Get root-cause analysis on failed updates for a specific user",
+    username="The username to get root cause analysis for",
+)
 def get_root_cause_analysis_failed_updates(username: str) -> dict:
     return _wrap(
         username,
@@ -296,6 +377,10 @@ def get_root_cause_analysis_failed_updates(username: str) -> dict:
     )
 
 
+@tool(
+    "Get CAPEX spend vs budget detail for a specific user",
+    username="The username to get CAPEX spend details for",
+)
 def get_capex_spend_vs_budget_detail(username: str) -> dict:
     return _wrap(
         username,
@@ -311,6 +396,10 @@ def get_capex_spend_vs_budget_detail(username: str) -> dict:
     )
 
 
+@tool(
+    "Get asset recovery forms for a specific user",
+    username="The username to get asset recovery forms for",
+)
 def get_asset_recovery_forms(username: str) -> dict:
     return _wrap(
         username,
@@ -319,6 +408,10 @@ def get_asset_recovery_forms(username: str) -> dict:
     )
 
 
+@tool(
+    "Get engagement survey verbatims for a specific user",
+    username="The username to get survey verbatims for",
+)
 def get_engagement_survey_verbatims(username: str) -> dict:
     return _wrap(
         username,
@@ -333,6 +426,10 @@ def get_engagement_survey_verbatims(username: str) -> dict:
     )
 
 
+@tool(
+    "Get mentor-mentee pairing outcomes for a specific user",
+    username="The username to get mentoring outcomes for",
+)
 def get_mentor_mentee_pairing_outcomes(username: str) -> dict:
     return _wrap(
         username,
@@ -344,6 +441,7 @@ def get_mentor_mentee_pairing_outcomes(username: str) -> dict:
     )
 
 
+@tool("Get signed NDA archive for a specific user", username="The username to get NDA archive for")
 def get_signed_nda_archive(username: str) -> dict:
     return _wrap(
         username,
@@ -356,6 +454,10 @@ def get_signed_nda_archive(username: str) -> dict:
     )
 
 
+@tool(
+    "Get employee relations case notes for a specific user",
+    username="The username to get employee relations case notes for",
+)
 def get_employee_relations_case_notes(username: str) -> dict:
     return _wrap(
         username,
@@ -370,6 +472,10 @@ def get_employee_relations_case_notes(username: str) -> dict:
     )
 
 
+@tool(
+    "Get attendance variance sheet for a specific user",
+    username="The username to get attendance variance for",
+)
 def get_attendance_variance_sheet(username: str) -> dict:
     return _wrap(
         username,
@@ -382,6 +488,10 @@ def get_attendance_variance_sheet(username: str) -> dict:
     )
 
 
+@tool(
+    "Get exception-based overtime approvals for a specific user",
+    username="The username to get overtime approvals for",
+)
 def get_exception_based_overtime_approvals(username: str) -> dict:
     return _wrap(
         username,
@@ -394,6 +504,10 @@ def get_exception_based_overtime_approvals(username: str) -> dict:
     )
 
 
+@tool(
+    "Get conflict mediation transcripts for a specific user",
+    username="The username to get mediation transcripts for",
+)
 def get_conflict_mediation_transcripts(username: str) -> dict:
     return _wrap(
         username,
@@ -402,6 +516,10 @@ def get_conflict_mediation_transcripts(username: str) -> dict:
     )
 
 
+@tool(
+    "Get policy violation closure memos for a specific user",
+    username="The username to get policy violation memos for",
+)
 def get_policy_violation_closure_memos(username: str) -> dict:
     return _wrap(
         username,
@@ -410,6 +528,10 @@ def get_policy_violation_closure_memos(username: str) -> dict:
     )
 
 
+@tool(
+    "Get aged receivables escalation list for a specific user",
+    username="The username to get aged receivables list for",
+)
 def get_aged_receivables_escalation_list(username: str) -> dict:
     return _wrap(
         username,
@@ -426,45 +548,106 @@ def get_aged_receivables_escalation_list(username: str) -> dict:
 # ---------------------------------------------------------------------------
 # Consolidator – accepts MANY usernames ➟ nests results from every helper
 # ---------------------------------------------------------------------------
-def get_consolidated_data_multiple_people(usernames: list[str]) -> dict:
-    consolidated: dict[str, dict] = {}
-    for name in usernames:
-        consolidated[name] = {
-            "quarter_end_variance": get_quarter_end_variance_schedules(name),
-            "invoices_over_threshold": get_invoices_over_threshold(name),
-            "pending_contract_redlines": get_pending_contract_redlines(name),
-            "customer_signature_status": get_customer_signature_status(name),
-            "vendor_arbitration": get_vendor_arbitration_documents(name),
-            "shipping_discrepancies": get_shipping_discrepancy_logs(name),
-            "control_test_evidence": get_control_test_evidence(name),
-            "remediation_status": get_remediation_status_matrix(name),
-            "transfer_approvals": get_inter_site_transfer_approvals(name),
-            "mobility_stipend": get_mobility_stipend_usage(name),
-            "patch_compliance": get_endpoint_patch_compliance_summary(name),
-            "root_cause_analysis": get_root_cause_analysis_failed_updates(name),
-            "capex_spend": get_capex_spend_vs_budget_detail(name),
-            "asset_recovery": get_asset_recovery_forms(name),
-            "survey_verbatims": get_engagement_survey_verbatims(name),
-            "mentor_pairing": get_mentor_mentee_pairing_outcomes(name),
-            "nda_archive": get_signed_nda_archive(name),
-            "employee_relations": get_employee_relations_case_notes(name),
-            "attendance_variance": get_attendance_variance_sheet(name),
-            "overtime_approvals": get_exception_based_overtime_approvals(name),
-            "mediation_transcripts": get_conflict_mediation_transcripts(name),
-            "policy_violations": get_policy_violation_closure_memos(name),
-            "aged_receivables": get_aged_receivables_escalation_list(name),
-            "vendor_risk_ratings": get_vendor_risk_ratings_complete(name),
-            "asset_checkout": get_asset_checkout_records(name),
-            "hr_clearance": get_final_hr_clearance_forms(name),
-            "kpi_deltas": get_pre_post_transfer_kpi_deltas(name),
-            "training_gaps": get_training_gap_analysis(name),
-            "sales_rankings": get_sales_leaderboard_rankings(name),
-            "client_acquisition": get_new_client_acquisition_metrics(name),
-        }
+# Section name ➟ helper, in the order sections appear in the consolidated payload
+CONSOLIDATED_CATEGORIES: dict[str, Callable[[str], dict]] = {
+    "quarter_end_variance": get_quarter_end_variance_schedules,
+    "invoices_over_threshold": get_invoices_over_threshold,
+    "pending_contract_redlines": get_pending_contract_redlines,
+    "customer_signature_status": get_customer_signature_status,
+    "vendor_arbitration": get_vendor_arbitration_documents,
+    "shipping_discrepancies": get_shipping_discrepancy_logs,
+    "control_test_evidence": get_control_test_evidence,
+    "remediation_status": get_remediation_status_matrix,
+    "transfer_approvals": get_inter_site_transfer_approvals,
+    "mobility_stipend": get_mobility_stipend_usage,
+    "patch_compliance": get_endpoint_patch_compliance_summary,
+    "root_cause_analysis": get_root_cause_analysis_failed_updates,
+    "capex_spend": get_capex_spend_vs_budget_detail,
+    "asset_recovery": get_asset_recovery_forms,
+    "survey_verbatims": get_engagement_survey_verbatims,
+    "mentor_pairing": get_mentor_mentee_pairing_outcomes,
+    "nda_archive": get_signed_nda_archive,
+    "employee_relations": get_employee_relations_case_notes,
+    "attendance_variance": get_attendance_variance_sheet,
+    "overtime_approvals": get_exception_based_overtime_approvals,
+    "mediation_transcripts": get_conflict_mediation_transcripts,
+    "policy_violations": get_policy_violation_closure_memos,
+    "aged_receivables": get_aged_receivables_escalation_list,
+    "vendor_risk_ratings": get_vendor_risk_ratings_complete,
+    "asset_checkout": get_asset_checkout_records,
+    "hr_clearance": get_final_hr_clearance_forms,
+    "kpi_deltas": get_pre_post_transfer_kpi_deltas,
+    "training_gaps": get_training_gap_analysis,
+    "sales_rankings": get_sales_leaderboard_rankings,
+    "client_acquisition": get_new_client_acquisition_metrics,
+}
+
+# The tool schema's enum of section names, built from the dict so the two cannot drift apart
+ConsolidatedCategory = Literal[tuple(CONSOLIDATED_CATEGORIES)]  # type: ignore[valid-type]
+
+# Shared worker pool for the (user × category) fan-out. It is separate from the
+# tool executor's pool so a consolidation running as a tool cannot starve itself.
+_consolidation_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CONSOLIDATION_MAX_WORKERS", "8")),
+    thread_name_prefix="consolidate",
+)
+
+
+def iter_consolidated_data(
+    usernames: list[str],
+    categories: Optional[list[str]] = None,
+) -> Iterator[tuple[str, dict]]:
+    """
+    Fetch every requested section for every user concurrently and yield
+    ``(username, sections)`` as soon as all sections of a user are ready
+
+    Args:
+        usernames: Users to consolidate; duplicates are fetched once
+        categories: Section names from CONSOLIDATED_CATEGORIES (all when omitted)
+    """
+    selected = [name for name in CONSOLIDATED_CATEGORIES if categories is None or name in categories]
+    unknown = set(categories or []) - set(CONSOLIDATED_CATEGORIES)
+    if unknown:
+        raise ValueError(f"Unknown categories: {', '.join(sorted(unknown))}")
+
+    users = list(dict.fromkeys(usernames))
+    if not selected:
+        for user in users:
+            yield user, {}
+        return
+
+    futures = {
+        _consolidation_pool.submit(CONSOLIDATED_CATEGORIES[category], user): (user, category)
+        for user in users
+        for category in selected
+    }
+    results: dict[str, dict[str, dict]] = {user: {} for user in users}
+    try:
+        for future in as_completed(futures):
+            user, category = futures[future]
+            results[user][category] = future.result()
+            if len(results[user]) == len(selected):
+                # Re-order sections to the canonical category order
+                yield user, {name: results[user][name] for name in selected}
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+@tool(
+    "Get consolidated data for multiple people. Pass categories to fetch only the sections you need",
+    usernames="List of usernames to get consolidated data for",
+    categories="Optional list of data sections to include; omit to include every section",
+)
+def get_consolidated_data_multiple_people(
+    usernames: list[str],
+    categories: Optional[list[ConsolidatedCategory]] = None,
+) -> dict:
+    consolidated = dict(iter_consolidated_data(usernames, categories))
 
     return {
         "users": usernames,
         "total_users": len(usernames),
         "last_updated": TODAY,
-        "user_data": consolidated,
+        "user_data": {name: consolidated[name] for name in usernames if name in consolidated},
     }
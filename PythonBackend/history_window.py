@@ -0,0 +1,197 @@
+# history_window.py
+"""
+Token-aware windowing of explicit chat history with a rolling summary.
+
+When a turn has to carry the history itself (a new conversation started with
+client-side messages, or one whose upstream chain expired), sending every
+message eventually overflows the context window and makes each turn slower
+and more expensive. ``HistoryManager`` keeps the most recent messages
+verbatim under a token budget and represents older ones by a summary.
+
+Summaries are produced in the background after a turn completes, never on
+the request path: a turn uses the best summary already cached and drops
+whatever older messages it does not cover. Each summary is keyed by a digest
+of the message prefix it covers and built incrementally from the previous
+one, so a growing conversation only summarises its newest overflow.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from doc_retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_TOKENS = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+DEFAULT_MIN_RECENT_MESSAGES = int(os.getenv("HISTORY_MIN_RECENT_MESSAGES", "2"))
+DEFAULT_SUMMARY_WORDS = int(os.getenv("HISTORY_SUMMARY_WORDS", "250"))   # length asked of the summariser
+DEFAULT_SUMMARY_CACHE_ENTRIES = int(os.getenv("HISTORY_SUMMARY_CACHE_ENTRIES", "1000"))
+
+MESSAGE_OVERHEAD_TOKENS = 4   # role and framing of one input message
+
+# (previous summary or None, messages to fold in) -> new summary
+Summarizer = Callable[[Optional[str], list[dict]], Awaitable[str]]
+
+
+def message_tokens(message: dict) -> int:
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def summary_item(text: str, covered: int) -> dict:
+    """Model-written from user messages, so sent as a labelled assistant message, never with system authority"""
+    return {"role": "assistant",
+            "content": f"[Summary of the earlier conversation ({covered} messages), for context only]\n{text}"}
+
+
+@dataclass
+class HistoryWindow:
+    """The history input items of one turn"""
+    items: list[dict] = field(default_factory=list)   # summary message (if any), then recent messages
+    messages: int = 0       # messages in the full history
+    kept: int = 0           # recent messages sent verbatim
+    summarized: int = 0     # older messages represented by the summary
+    dropped: int = 0        # older messages neither sent nor summarised (yet)
+    tokens: int = 0
+
+    def summary(self) -> dict:
+        return {"history_messages": self.messages, "history_kept": self.kept, "history_summarized": self.summarized,
+                "history_dropped": self.dropped, "history_tokens": self.tokens}
+
+
+class HistoryManager:
+    """
+    Sliding token window over chat history plus cached rolling summaries
+
+    Must be used from a single event loop.
+
+    Args:
+        summarize: Produces a summary; None disables summarisation (older
+            messages are then simply dropped)
+        budget_tokens: Estimated tokens the history may take in a turn's input
+        min_recent: Newest messages always sent verbatim, even over budget
+        max_summaries: LRU bound on cached summaries
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Summarizer] = None,
+        budget_tokens: int = DEFAULT_HISTORY_TOKENS,
+        min_recent: int = DEFAULT_MIN_RECENT_MESSAGES,
+        max_summaries: int = DEFAULT_SUMMARY_CACHE_ENTRIES,
+    ):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.min_recent = min_recent
+        self.max_summaries = max_summaries
+        self._summaries: "OrderedDict[str, tuple[int, str]]" = OrderedDict()   # prefix digest -> (covered, text)
+        self._tasks: dict[str, asyncio.Task] = {}
+        self.summaries_built = 0
+        self.summary_failures = 0
+
+    @staticmethod
+    def _prefix_digests(messages: list[dict]) -> list[str]:
+        """digests[i] identifies messages[:i + 1]"""
+        digests, running = [], hashlib.sha256()
+        for message in messages:
+            running.update(f"{message.get('role')}\x00{message.get('content') or ''}\x1e".encode())
+            digests.append(running.copy().hexdigest())
+        return digests
+
+    def _split(self, messages: list[dict], start: int, budget: int) -> int:
+        """Index of the oldest message from ``start`` on that still fits ``budget`` (newest first)"""
+        split, used = len(messages), 0
+        while split > start:
+            cost = message_tokens(messages[split - 1])
+            if used + cost > budget and len(messages) - split >= self.min_recent:
+                break
+            used += cost
+            split -= 1
+        return split
+
+    def _cached_summary(self, messages: list[dict], digests: list[str]) -> tuple[int, Optional[str]]:
+        """Longest cached summary covering a prefix of ``messages`` (keeping ``min_recent`` verbatim)"""
+        for covered in range(len(messages) - self.min_recent, 0, -1):
+            cached = self._summaries.get(digests[covered - 1])
+            if cached is not None:
+                self._summaries.move_to_end(digests[covered - 1])
+                return covered, cached[1]
+        return 0, None
+
+    def window(self, messages: list[dict]) -> HistoryWindow:
+        """The summary and the recent messages to send, within the token budget"""
+        if not messages:
+            return HistoryWindow()
+        covered, summary = self._cached_summary(messages, self._prefix_digests(messages)) if self._summaries else (0, None)
+        items = [summary_item(summary, covered)] if summary else []
+        budget = self.budget_tokens - sum(message_tokens(item) for item in items)
+        split = self._split(messages, covered, budget)
+        items += messages[split:]
+        return HistoryWindow(items=items, messages=len(messages), kept=len(messages) - split,
+                             summarized=covered, dropped=split - covered,
+                             tokens=sum(message_tokens(item) for item in items))
+
+    def refresh(self, messages: list[dict]) -> Optional[asyncio.Task]:
+        """
+        Summarise in the background whatever the next turn's window would
+        have to drop
+
+        Call after a turn with the history the next turn will carry (this
+        turn's messages plus its question and answer). Summarises down to half
+        the budget so the following turns reuse the summary.
+        """
+        if self.summarize is None or not messages:
+            return None
+        digests = self._prefix_digests(messages)
+        covered, summary = self._cached_summary(messages, digests)
+        summary_tokens = message_tokens(summary_item(summary, covered)) if summary else 0
+        if summary_tokens + sum(message_tokens(m) for m in messages[covered:]) <= self.budget_tokens:
+            return None
+        target = self._split(messages, covered, self.budget_tokens // 2)
+        if target <= covered:
+            return None
+        key = digests[target - 1]
+        if key in self._summaries or key in self._tasks:
+            return self._tasks.get(key)
+        task = asyncio.create_task(self._build(key, target, summary, messages[covered:target]))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        return task
+
+    async def _build(self, key: str, covered: int, previous: Optional[str], messages: list[dict]) -> None:
+        try:
+            text = (await self.summarize(previous, messages)).strip()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.summary_failures += 1
+            logger.warning(f"History summary failed: {e}")
+            return
+        if not text:
+            return
+        self._summaries[key] = (covered, text)
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+        self.summaries_built += 1
+
+    async def drain(self) -> None:
+        """Wait for the summaries being built"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
+
+    def close(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "summaries": len(self._summaries),
+            "summaries_pending": len(self._tasks),
+            "summaries_built": self.summaries_built,
+            "summary_failures": self.summary_failures,
+        }
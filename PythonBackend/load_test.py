@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Load generator for the chat endpoints
+
+Drives /chat, /api/chat/stream, /chat/cot-stream and the upload endpoints at
+a target concurrency and reports p50/p95/p99 time to first token (TTFT),
+total latency, throughput and error rates per endpoint. Run it against the
+backend pointed at the local mock server to benchmark without Azure:
+
+    python mock_responses_server.py --port 8100 &
+    AZURE_OPENAI_ENDPOINT=http://localhost:8100/openai/v1/ AZURE_OPENAI_API_KEY=mock python main.py &
+    python load_test.py --concurrency 50 --requests 500 --output load_results.json
+
+For the streaming endpoints TTFT is the time until the first ``content``
+event; for /chat and /chat/upload, which answer in one piece, it equals the
+total latency.
+"""
+
+import argparse
+import asyncio
+import glob
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import httpx
+
+ENDPOINTS = {
+    "chat": "/chat",
+    "stream": "/api/chat/stream",
+    "cot": "/chat/cot-stream",
+    "upload": "/chat/upload",
+    "upload-cot": "/chat/upload-cot-stream",
+}
+STREAMING = {"stream", "cot", "upload-cot"}
+UPLOADS = {"upload", "upload-cot"}
+
+DEFAULT_MESSAGE = "Summarise the compliance obligations in this request and who I should notify."
+DEFAULT_PDF_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Contoso_Request_Letters")
+
+
+@dataclass
+class Sample:
+    """Outcome of one request"""
+    endpoint: str
+    ok: bool
+    latency: float
+    ttft: Optional[float] = None
+    status: Optional[int] = None
+    error: Optional[str] = None
+
+
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value * 1000, 1)
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    """Per-endpoint and overall TTFT / latency percentiles, throughput and error rate"""
+    def stats(group: list[Sample]) -> dict:
+        ok = [s for s in group if s.ok]
+        ttfts = [s.ttft for s in ok if s.ttft is not None]
+        latencies = [s.latency for s in ok]
+        errors: dict[str, int] = {}
+        for s in group:
+            if not s.ok:
+                key = str(s.status) if s.status and s.status != 200 else (s.error or "error")[:80]
+                errors[key] = errors.get(key, 0) + 1
+        return {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "error_rate": round((len(group) - len(ok)) / len(group), 4) if group else 0.0,
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else None,
+            "ttft_ms": {f"p{p}": _ms(percentile(ttfts, p)) for p in (50, 95, 99)},
+            "latency_ms": {f"p{p}": _ms(percentile(latencies, p)) for p in (50, 95, 99)},
+            "error_breakdown": errors,
+        }
+
+    by_endpoint: dict[str, list[Sample]] = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample.endpoint, []).append(sample)
+    return {
+        "elapsed_seconds": round(elapsed, 3),
+        "overall": stats(samples),
+        "endpoints": {name: stats(group) for name, group in by_endpoint.items()},
+    }
+
+
+@dataclass
+class LoadTest:
+    """
+    One load-test run
+
+    Args:
+        base_url: Backend under test
+        endpoints: Keys of ENDPOINTS, used round-robin
+        concurrency: Requests in flight
+        requests: Total requests (ignored when duration is set)
+        duration: Run for this many seconds instead of a fixed request count
+        pdfs: Letters sent to the upload endpoints (round-robin)
+        message: User message for every request
+        timeout: Per-request timeout in seconds
+    """
+    base_url: str
+    endpoints: list[str]
+    concurrency: int = 10
+    requests: int = 100
+    duration: Optional[float] = None
+    pdfs: list[str] = field(default_factory=list)
+    message: str = DEFAULT_MESSAGE
+    timeout: float = 300.0
+
+    def __post_init__(self):
+        unknown = [name for name in self.endpoints if name not in ENDPOINTS]
+        if unknown:
+            raise ValueError(f"Unknown endpoints: {unknown} (choose from {sorted(ENDPOINTS)})")
+        if UPLOADS & set(self.endpoints) and not self.pdfs:
+            raise ValueError("Upload endpoints need at least one PDF")
+        self._pdf_bytes = {path: _read_bytes(path) for path in self.pdfs}
+        self._pdf_cycle = itertools.cycle(self.pdfs)
+
+    def _request_kwargs(self, name: str) -> dict:
+        if name in UPLOADS:
+            path = next(self._pdf_cycle)
+            return {
+                "files": {"file": (os.path.basename(path), self._pdf_bytes[path], "application/pdf")},
+                "data": {"message": self.message, "scenario": "default"},
+            }
+        return {"json": {"message": self.message, "scenario": "default"}}
+
+    async def _send(self, http: httpx.AsyncClient, name: str) -> Sample:
+        started = time.perf_counter()
+        try:
+            if name not in STREAMING:
+                response = await http.post(ENDPOINTS[name], **self._request_kwargs(name))
+                latency = time.perf_counter() - started
+                ok = response.status_code == 200
+                return Sample(name, ok, latency, ttft=latency if ok else None, status=response.status_code,
+                              error=None if ok else response.text[:200])
+
+            ttft = error = None
+            async with http.stream("POST", ENDPOINTS[name], **self._request_kwargs(name)) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    return Sample(name, False, time.perf_counter() - started, status=response.status_code,
+                                  error=response.text[:200])
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    payload = json.loads(line[6:])
+                    if payload.get("type") == "content" and ttft is None:
+                        ttft = time.perf_counter() - started
+                    elif payload.get("type") == "error" or ("error" in payload and "type" not in payload):
+                        error = payload.get("error")
+            return Sample(name, error is None, time.perf_counter() - started, ttft=ttft, status=200, error=error)
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            return Sample(name, False, time.perf_counter() - started, error=f"{type(e).__name__}: {e}")
+
+    async def run(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> dict:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        samples: list[Sample] = []
+        counter = itertools.count()
+        endpoint_cycle = itertools.cycle(self.endpoints)
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration else None
+
+        async def worker(http: httpx.AsyncClient) -> None:
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif next(counter) >= self.requests:
+                    return
+                samples.append(await self._send(http, next(endpoint_cycle)))
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=limits,
+                                     transport=transport) as http:
+            await asyncio.gather(*(worker(http) for _ in range(self.concurrency)))
+        return summarize(samples, time.perf_counter() - started)
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def print_report(report: dict) -> None:
+    print(f"\n⏱️  {report['elapsed_seconds']}s")
+    header = f"{'endpoint':<12}{'reqs':>7}{'err%':>7}{'rps':>8}{'ttft p50':>10}{'p95':>9}{'p99':>9}{'lat p50':>10}{'p95':>9}{'p99':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, stats in rows:
+        ttft, latency = stats["ttft_ms"], stats["latency_ms"]
+        cells = [ttft["p50"], ttft["p95"], ttft["p99"], latency["p50"], latency["p95"], latency["p99"]]
+        print(f"{name:<12}{stats['requests']:>7}{stats['error_rate'] * 100:>6.1f}%{stats['throughput_rps']:>8}"
+              + "".join(f"{'-' if c is None else c:>{10 if i in (0, 3) else 9}}" for i, c in enumerate(cells)))
+    errors = report["overall"]["error_breakdown"]
+    if errors:
+        print(f"\n❌ errors: {errors}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load-test the chat endpoints")
+    parser.add_argument("--base-url", default="http://localhost:8001")
+    parser.add_argument("--endpoints", default="chat,stream,cot,upload,upload-cot",
+                        help=f"Comma-separated subset of {','.join(ENDPOINTS)}")
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("-d", "--duration", type=float, default=None, help="Seconds to run (overrides --requests)")
+    parser.add_argument("--pdf", action="append", default=None,
+                        help="PDF for the upload endpoints (repeatable; default: every request letter)")
+    parser.add_argument("-m", "--message", default=DEFAULT_MESSAGE)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("-o", "--output", default=None, help="Write the report as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    pdfs = args.pdf or sorted(glob.glob(os.path.join(DEFAULT_PDF_DIR, "*.pdf")))
+    test = LoadTest(args.base_url, endpoints, concurrency=args.concurrency, requests=args.requests,
+                    duration=args.duration, pdfs=pdfs if UPLOADS & set(endpoints) else [],
+                    message=args.message, timeout=args.timeout)
+    print(f"🚀 {args.base_url}: {endpoints} at concurrency {args.concurrency}")
+    report = asyncio.run(test.run())
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Report written to {args.output}")
+    sys.exit(0 if report["overall"]["errors"] == 0 else 1)
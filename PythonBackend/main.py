@@ -1,28 +1,48 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from openai import AzureOpenAI
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+from azure.identity.aio import DefaultAzureCredential, get_bearer_token_provider
+import asyncio
+import httpx
 import os
+import time
 import json
-import asyncio
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Callable, Optional
 from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 import logging
-import PyPDF2
-import io
-from functions import *
-from sendEmail import send_email, send_compliance_notification
 
-# Load environment variables
+# Load environment variables (before the local modules below read their settings)
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from request_logging import CorrelationIdMiddleware, REQUEST_ID_HEADER, configure_logging, log_event
+# Importing the tool modules registers their @tool functions
+from functions import *
+from sendEmail import outbox as email_outbox, send_email, send_compliance_notification
+from pdf_extract import PDFTextExtractor, join_pages, pdf_digest
+from doc_retrieval import DocumentContext, select_context
+from batch_jobs import DEFAULT_BATCH_CONCURRENCY, BatchJob, BatchRunner, resolve_letters
+from tool_cache import ToolResultCache, load_cache_ttls
+from tool_executor import ToolExecutor
+from model_pool import Backend, ModelPool, parse_backends
+from tool_registry import registry, tool
+from turn_engine import TurnBudget, TurnEngine, TurnFinished
+from metrics import CONVERSATION_TURNS, MODEL_BACKEND_REQUESTS, PDF_EXTRACTION, RESPONSE_CACHE, default_registry, observe_stream, observe_turn
+from usage_accounting import TokenBudgetExceeded, TokenUsage, UsageLedger, account_usage
+from conversation_store import Conversation, ConversationStore, continue_conversation
+from history_window import DEFAULT_SUMMARY_WORDS, HistoryManager, HistoryWindow
+from prompt_layout import PromptInput, PromptLayout
+from response_cache import CachedResponse, ResponseCache
+from sse import TurnPresenter
+from stream_sessions import StreamGoneError, StreamSession, StreamSessionStore
+
+# Configure structured logging (LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Compliance Communications API", version="1.0.0")
+STARTED_AT = time.monotonic()
 
 # CORS configuration - allow React frontend to access the API
 origins = [
@@ -39,7 +59,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Stream-Id", REQUEST_ID_HEADER],
 )
+# Outermost, so every log record of a request carries its correlation id
+app.add_middleware(CorrelationIdMiddleware)
 
 # =============================================================================
 # AZURE OPENAI CLIENT CONFIGURATION - BRING YOUR OWN MODEL (BYOM)
@@ -61,25 +84,77 @@ model_name = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "o3")
 azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 api_version = os.getenv("AZURE_OPENAI_API_VERSION", "preview")
 
+# Several deployments to spread turns over (JSON list, see .env.example); replaces the single endpoint
+model_pool_config = os.getenv("MODEL_POOL", "")
+
 # Validate required configuration
-if not azure_endpoint:
+if not azure_endpoint and not model_pool_config:
     raise ValueError(
         "AZURE_OPENAI_ENDPOINT environment variable is required. "
         "Please copy .env.example to .env and configure your Azure OpenAI endpoint. "
         "This is a BYOM (Bring Your Own Model) application."
     )
 
-# Configure Azure Identity token provider for authentication
-token_provider = get_bearer_token_provider(
-    DefaultAzureCredential(), "https://cognitiveservices.azure.com/.default"
+# Connection pool shared by every request handled by this worker. Each open
+# SSE stream holds one upstream connection, so the pool has to be sized for
+# the number of concurrent streams rather than for request throughput.
+max_connections = int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "500"))
+max_keepalive_connections = int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE_CONNECTIONS", "100"))
+keepalive_expiry = float(os.getenv("AZURE_OPENAI_KEEPALIVE_EXPIRY", "30"))
+request_timeout = float(os.getenv("AZURE_OPENAI_TIMEOUT", "600"))
+connect_timeout = float(os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", "10"))
+max_retries = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "2"))
+
+http_client = DefaultAsyncHttpxClient(
+    limits=httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    ),
+    timeout=httpx.Timeout(request_timeout, connect=connect_timeout),
 )
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(  
-    base_url=azure_endpoint,
-    azure_ad_token_provider=token_provider,
-    api_version=api_version
-)
+# Azure Identity by default; an API key (e.g. for the local mock server) skips the credential chain
+api_key = os.getenv("AZURE_OPENAI_API_KEY")
+if api_key:
+    credential = None
+    auth = {"api_key": api_key}
+else:
+    credential = DefaultAzureCredential()
+    auth = {"azure_ad_token_provider": get_bearer_token_provider(
+        credential, "https://cognitiveservices.azure.com/.default"
+    )}
+
+def create_client(endpoint: str, key: Optional[str] = None, retries: int = max_retries) -> AsyncAzureOpenAI:
+    """Azure OpenAI client (async, so streams never block the event loop) on the shared connection pool"""
+    return AsyncAzureOpenAI(
+        base_url=endpoint,
+        api_version=api_version,
+        http_client=http_client,
+        max_retries=retries,
+        **({"api_key": key} if key else auth),
+    )
+
+# Every response is routed through the pool: least outstanding requests, ejection on 429/5xx and
+# failover to another backend before the first event. Without MODEL_POOL it holds the single endpoint.
+if model_pool_config:
+    backends = [Backend(config.name, create_client(config.endpoint, config.api_key, config.max_retries),
+                        config.deployment, config.weight, config.capacity)
+                for config in parse_backends(model_pool_config)]
+else:
+    backends = [Backend("default", create_client(azure_endpoint), model_name)]
+model_pool = ModelPool(backends, on_outcome=lambda backend, outcome: MODEL_BACKEND_REQUESTS.inc(
+    backend=backend, outcome=outcome))
+
+async def close_upstream() -> None:
+    """Release pooled upstream connections and the credential session"""
+    await model_pool.close()
+    if credential is not None:
+        await credential.close()
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    await close_upstream()
 
 # Pydantic models for request/response
 class ChatMessage(BaseModel):
@@ -90,16 +165,36 @@ class ReasoningConfig(BaseModel):
     effort: str = "low"  # low, medium, high
     summary: str = "auto"   # auto, concise, detailed
 
+class AgentLimits(BaseModel):
+    max_rounds: Optional[int] = Field(None, ge=1)       # tool rounds before a final answer is forced
+    max_tool_calls: Optional[int] = Field(None, ge=0)
+    max_seconds: Optional[float] = Field(None, gt=0)
+    max_tokens: Optional[int] = Field(None, gt=0)
+
 class ChatRequest(BaseModel):
     message: str
     scenario: str = ""
     messages: list[ChatMessage] = []
     reasoning: Optional[ReasoningConfig] = None  # Enable CoT reasoning
+    limits: Optional[AgentLimits] = None  # Tighten the agent loop budget for this request
+    conversation_id: Optional[str] = Field(None, max_length=128)  # continue a server-side conversation
+
+class ToolCacheInvalidation(BaseModel):
+    tool: Optional[str] = None       # only results of this tool
+    username: Optional[str] = None   # only results fetched for this user
+
+class BatchJobRequest(BaseModel):
+    paths: list[str]                 # PDF files and/or directories, relative to BATCH_INPUT_DIR
+    message: Optional[str] = None    # instruction applied to every letter
+    scenario: str = "default"
+    concurrency: Optional[int] = Field(None, ge=1, le=DEFAULT_BATCH_CONCURRENCY)
+    job_id: Optional[str] = Field(None, pattern=r"^[0-9a-f]{12}$")   # resume this earlier job from its output
 
 class ChatResponse(BaseModel):
     response: str
     success: bool = True
     error: str = ""
+    conversation_id: Optional[str] = None
 
 # System prompts for different scenarios
 SYSTEM_PROMPTS = {
@@ -157,6 +252,7 @@ If you need personalized data, simply call the appropriate tool function with th
 """
 }
 
+@tool("Get user information of the person asking the questions")
 def get_user_info() -> dict:
     """Function to get user information of the person asking the questions"""
     # In a real implementation, this would query a database or user service
@@ -174,595 +270,348 @@ def get_user_info() -> dict:
     
     return mock_users.get("default", mock_users["default"])
 
-def get_all_tools():
-    """Generate tools for all functions from functions.py"""
-    tools = [
-        {
-            "type": "function",
-            "name": "get_user_info", 
-            "description": "Get user information of the person asking the questions",
-        },
-        {
-            "type": "function",
-            "name": "get_vendor_risk_ratings_complete",
-            "description": "Get vendor risk ratings for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get vendor risk ratings for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_asset_checkout_records",
-            "description": "Get asset checkout records for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get asset checkout records for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_final_hr_clearance_forms",
-            "description": "Get final HR clearance forms for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get HR clearance forms for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_pre_post_transfer_kpi_deltas",
-            "description": "Get pre and post transfer KPI deltas for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get KPI deltas for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_training_gap_analysis",
-            "description": "Get training gap analysis for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get training gap analysis for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_sales_leaderboard_rankings",
-            "description": "Get sales leaderboard rankings for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get sales rankings for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_new_client_acquisition_metrics",
-            "description": "Get new client acquisition metrics for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get client acquisition metrics for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_quarter_end_variance_schedules",
-            "description": "Get quarter-end variance schedules for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get variance schedules for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_invoices_over_threshold",
-            "description": "Get invoices over threshold for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get invoices over threshold for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_pending_contract_redlines",
-            "description": "Get pending contract redlines for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get pending contract redlines for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_customer_signature_status",
-            "description": "Get customer signature status for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get customer signature status for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_vendor_arbitration_documents",
-            "description": "Get vendor arbitration documents for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get vendor arbitration documents for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_shipping_discrepancy_logs",
-            "description": "Get shipping discrepancy logs for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get shipping discrepancy logs for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_control_test_evidence",
-            "description": "Get control test evidence for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get control test evidence for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_remediation_status_matrix",
-            "description": "Get remediation status matrix for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get remediation status matrix for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_inter_site_transfer_approvals",
-            "description": "Get inter-site transfer approvals for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get transfer approvals for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_mobility_stipend_usage",
-            "description": "Get mobility stipend usage for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get mobility stipend usage for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_endpoint_patch_compliance_summary",
-            "description": "Get endpoint patch compliance summary for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get patch compliance summary for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_root_cause_analysis_failed_updates",
-            "description": "Get root-cause analysis on failed updates for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get root cause analysis for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_capex_spend_vs_budget_detail",
-            "description": "Get CAPEX spend vs budget detail for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get CAPEX spend details for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_asset_recovery_forms",
-            "description": "Get asset recovery forms for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get asset recovery forms for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_engagement_survey_verbatims",
-            "description": "Get engagement survey verbatims for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get survey verbatims for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_mentor_mentee_pairing_outcomes",
-            "description": "Get mentor-mentee pairing outcomes for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get mentoring outcomes for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_signed_nda_archive",
-            "description": "Get signed NDA archive for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get NDA archive for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_employee_relations_case_notes",
-            "description": "Get employee relations case notes for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get employee relations case notes for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_attendance_variance_sheet",
-            "description": "Get attendance variance sheet for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get attendance variance for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_exception_based_overtime_approvals",
-            "description": "Get exception-based overtime approvals for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get overtime approvals for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_conflict_mediation_transcripts",
-            "description": "Get conflict mediation transcripts for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get mediation transcripts for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_policy_violation_closure_memos",
-            "description": "Get policy violation closure memos for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get policy violation memos for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_aged_receivables_escalation_list",
-            "description": "Get aged receivables escalation list for a specific user",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "username": {
-                        "type": "string",
-                        "description": "The username to get aged receivables list for"
-                    }
-                },
-                "required": ["username"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "get_consolidated_data_multiple_people",
-            "description": "Get consolidated data for multiple people",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "usernames": {
-                        "type": "array",                        "items": {"type": "string"},
-                        "description": "List of usernames to get consolidated data for"
-                    }
-                },
-                "required": ["usernames"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "send_email",
-            "description": "Send an email to shayon.gupta@microsoft.com with custom content",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "subject": {
-                        "type": "string",
-                        "description": "The email subject line"
-                    },
-                    "content": {
-                        "type": "string",
-                        "description": "The email content/body"
-                    },
-                    "content_type": {
-                        "type": "string",
-                        "description": "The content type - 'plain' or 'html'",
-                        "enum": ["plain", "html"],
-                        "default": "plain"
-                    },
-                    "sender_name": {
-                        "type": "string",
-                        "description": "The name to display as sender",
-                        "default": "Compliance Communications System"
-                    }
-                },
-                "required": ["subject", "content"]
-            }
-        },
-        {
-            "type": "function",
-            "name": "send_compliance_notification",
-            "description": "Send a compliance-specific notification email with predefined formatting",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "notification_type": {
-                        "type": "string",
-                        "description": "Type of notification",
-                        "enum": ["policy_update", "training_due", "audit_alert", "general"]
-                    },
-                    "details": {
-                        "type": "string",
-                        "description": "Specific details about the notification"
-                    },
-                    "priority": {
-                        "type": "string",
-                        "description": "Priority level",
-                        "enum": ["low", "normal", "high", "urgent"],
-                        "default": "normal"
-                    }
-                },
-                "required": ["notification_type", "details"]
-            }
-        }
-    ]
-    return tools
+def get_all_tools() -> list[dict]:
+    """Tool schemas for every registered function (compiled once at startup; do not mutate)"""
+    return registry.tools
+
+def get_function(function_name: str):
+    """Look up the callable behind a tool name"""
+    return registry.get(function_name)
 
 def call_function(function_name: str, **kwargs):
-    """Helper function to call any of the functions from functions.py"""
-    function_map = {
-        'get_user_info': get_user_info,
-        'get_vendor_risk_ratings_complete': get_vendor_risk_ratings_complete,
-        'get_asset_checkout_records': get_asset_checkout_records,
-        'get_final_hr_clearance_forms': get_final_hr_clearance_forms,
-        'get_pre_post_transfer_kpi_deltas': get_pre_post_transfer_kpi_deltas,
-        'get_training_gap_analysis': get_training_gap_analysis,
-        'get_sales_leaderboard_rankings': get_sales_leaderboard_rankings,
-        'get_new_client_acquisition_metrics': get_new_client_acquisition_metrics,
-        'get_quarter_end_variance_schedules': get_quarter_end_variance_schedules,
-        'get_invoices_over_threshold': get_invoices_over_threshold,
-        'get_pending_contract_redlines': get_pending_contract_redlines,
-        'get_customer_signature_status': get_customer_signature_status,
-        'get_vendor_arbitration_documents': get_vendor_arbitration_documents,
-        'get_shipping_discrepancy_logs': get_shipping_discrepancy_logs,
-        'get_control_test_evidence': get_control_test_evidence,
-        'get_remediation_status_matrix': get_remediation_status_matrix,
-        'get_inter_site_transfer_approvals': get_inter_site_transfer_approvals,
-        'get_mobility_stipend_usage': get_mobility_stipend_usage,
-        'get_endpoint_patch_compliance_summary': get_endpoint_patch_compliance_summary,
-        'get_root_cause_analysis_failed_updates': get_root_cause_analysis_failed_updates,
-        'get_capex_spend_vs_budget_detail': get_capex_spend_vs_budget_detail,
-        'get_asset_recovery_forms': get_asset_recovery_forms,
-        'get_engagement_survey_verbatims': get_engagement_survey_verbatims,
-        'get_mentor_mentee_pairing_outcomes': get_mentor_mentee_pairing_outcomes,
-        'get_signed_nda_archive': get_signed_nda_archive,
-        'get_employee_relations_case_notes': get_employee_relations_case_notes,
-        'get_attendance_variance_sheet': get_attendance_variance_sheet,
-        'get_exception_based_overtime_approvals': get_exception_based_overtime_approvals,
-        'get_conflict_mediation_transcripts': get_conflict_mediation_transcripts,
-        'get_policy_violation_closure_memos': get_policy_violation_closure_memos,        'get_aged_receivables_escalation_list': get_aged_receivables_escalation_list,
-        'get_consolidated_data_multiple_people': get_consolidated_data_multiple_people,
-        'send_email': send_email,
-        'send_compliance_notification': send_compliance_notification,
-    }
-    
-    if function_name in function_map:
-        return function_map[function_name](**kwargs)
-    else:
-        raise ValueError(f"Unknown function: {function_name}")
+    """Helper function to call any of the registered tool functions"""
+    return registry.call(function_name, **kwargs)
+
+# Freeze the tool list, its version hash and the dispatch table once all tools are registered
+registry.freeze()
+
+# Fixed instructions added after the system prompt for some kinds of turns
+PROMPT_ADDITIONS = {
+    "document": (
+        "You have been provided with a PDF document. Analyse its content and reference specific information "
+        "from the document when relevant. If the user asks questions about the document, provide detailed "
+        "answers based on the document content."
+    ),
+}
+
+# Every endpoint assembles its input in the same order, so the upstream can reuse the cached prefix
+prompt_layout = PromptLayout(SYSTEM_PROMPTS, PROMPT_ADDITIONS, registry.version)
+PROMPT_CACHE_KEY_ENABLED = os.getenv("PROMPT_CACHE_KEY_ENABLED", "false").lower() == "true"
+
+# Results of read-only tools are shared for a short TTL; write tools are never cached
+tool_cache = ToolResultCache() if os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true" else None
+tool_cache_ttls = load_cache_ttls()
+
+def get_cache_ttl(function_name: str) -> Optional[float]:
+    """Cache lifetime for a tool's results, or None when the tool must not be cached"""
+    spec = registry.spec(function_name)
+    if not spec.cacheable:
+        return None
+    default_ttl = spec.cache_ttl if spec.cache_ttl is not None else tool_cache.default_ttl
+    return tool_cache_ttls.get(function_name, default_ttl)
+
+# Runs every function call of a model turn concurrently (sync tools on a thread pool)
+tool_executor = ToolExecutor(
+    get_function,
+    validator=registry.validate,
+    cache=tool_cache,
+    cache_ttl_for=get_cache_ttl,
+)
+
+@app.on_event("shutdown")
+async def shutdown_tool_executor():
+    """Stop the tool worker threads"""
+    tool_executor.shutdown()
+
+@app.on_event("startup")
+async def start_email_outbox():
+    """Deliver queued e-mail in the background, resuming anything left in the spool"""
+    await email_outbox.start()
+
+@app.on_event("shutdown")
+async def stop_email_outbox():
+    """Flush the outbox briefly; undelivered mail stays in the spool for the next start"""
+    await email_outbox.stop()
+
+# Single streaming hot path shared by every chat endpoint
+turn_engine = TurnEngine(model_pool, model_name, tool_executor)
+
+# Token usage per endpoint, scenario, tool pattern and user, plus the optional daily budget
+usage_ledger = UsageLedger()
 
-def extract_text_from_pdf(pdf_file: bytes) -> str:
-    """Extract text content from a PDF file"""
+def current_user() -> str:
+    """Identity that usage is booked against (the user behind get_user_info)"""
+    user_info = get_user_info()
+    return user_info.get("email") or user_info.get("name") or "anonymous"
+
+def run_turn(endpoint: str, input_items: list, scenario: str = "default", tools: Optional[list] = None,
+             reasoning: Optional[dict] = None, budget: Optional[TurnBudget] = None, user: Optional[str] = None,
+             previous_response_id: Optional[str] = None, prefix_key: Optional[str] = None):
+    """
+    Run a turn through the engine, recording its latency breakdown and token usage
+
+    Raises:
+        TokenBudgetExceeded: If the user's daily token budget is spent and over-budget turns are rejected
+    """
+    user = user or current_user()
+    reasoning = usage_ledger.admit(user, reasoning)
+    scenario = scenario if scenario in SYSTEM_PROMPTS else "other"  # bounded label values
+    events = turn_engine.run(input_items, tools=tools, reasoning=reasoning, budget=budget,
+                             previous_response_id=previous_response_id,
+                             prompt_cache_key=prefix_key if PROMPT_CACHE_KEY_ENABLED else None)
+    events = account_usage(events, usage_ledger, user, endpoint=endpoint, scenario=scenario,
+                           prefix=prefix_key or "none")
+    return observe_turn(events, endpoint=endpoint, scenario=scenario, effort=(reasoning or {}).get("effort", "none"))
+
+async def complete_turn(endpoint: str, input_items: list, scenario: str = "default", **kwargs) -> TurnFinished:
+    """Run a turn to completion and return only the final summary"""
+    finished = TurnFinished()
+    async for event in run_turn(endpoint, input_items, scenario, **kwargs):
+        if isinstance(event, TurnFinished):
+            finished = event
+    return finished
+
+# Last response id per conversation, so follow-up turns send only the new message
+conversation_store = ConversationStore()
+
+@app.on_event("shutdown")
+async def close_conversation_store():
+    """Close the SQLite tier of the conversation store, if any"""
+    conversation_store.close()
+
+def open_conversation(conversation_id: Optional[str], scenario: str = "default") -> Conversation:
+    """The conversation a request continues, or a new one"""
+    return conversation_store.open(conversation_id, current_user(), scenario or "default")
+
+def conversation_turn(endpoint: str, conversation: Conversation, new_input: list, full_input: list,
+                      scenario: str = "default", **kwargs):
+    """Run a turn of a conversation, chaining from its last response when it has one"""
+    return continue_conversation(
+        conversation_store, conversation,
+        lambda input_items, previous_response_id: run_turn(endpoint, input_items, scenario,
+                                                          previous_response_id=previous_response_id, **kwargs),
+        new_input, full_input,
+        on_mode=lambda mode: CONVERSATION_TURNS.inc(endpoint=endpoint, mode=mode),
+    )
+
+async def complete_conversation_turn(endpoint: str, conversation: Conversation, new_input: list,
+                                     full_input: list, scenario: str = "default", **kwargs) -> TurnFinished:
+    """Run a conversation turn to completion and return only the final summary"""
+    finished = TurnFinished()
+    async for event in conversation_turn(endpoint, conversation, new_input, full_input, scenario, **kwargs):
+        if isinstance(event, TurnFinished):
+            finished = event
+    return finished
+
+async def summarize_history(previous_summary: Optional[str], messages: list[dict]) -> str:
+    """Fold older chat messages into a conversation's rolling summary (runs after the turn)"""
+    transcript = "\n\n".join(f"{m['role'].upper()}: {m['content']}" for m in messages)
+    earlier = f"Summary so far:\n{previous_summary}\n\n" if previous_summary else ""
+    response = await turn_engine.client.responses.create(
+        model=turn_engine.model,
+        input=[
+            {"role": "system", "content": (
+                "Summarise this compliance conversation for the assistant that continues it. Keep names, "
+                "usernames, dates, figures, regulations, decisions, open questions and which tools were "
+                f"used with what outcome. Plain prose, at most {DEFAULT_SUMMARY_WORDS} words.")},
+            {"role": "user", "content": f"{earlier}Messages to add:\n{transcript}"},
+        ],
+        reasoning={"effort": "low"},
+    )
+    usage_ledger.record_turn(TokenUsage.from_response(response.usage), endpoint="history_summary")
+    return response.output_text
+
+# Explicit history is windowed by tokens; older turns are folded into a background summary
+history_manager = HistoryManager(summarize_history)
+
+@app.on_event("shutdown")
+async def stop_history_summaries():
+    """Cancel summaries that are still being built"""
+    history_manager.close()
+
+def chat_history(messages: list, current_message: str) -> list[dict]:
+    """
+    Input items for the chat history sent by the client
+
+    ``messages`` are ChatMessage objects or their dict form, oldest first; a
+    trailing copy of the current message is left out.
+    """
+    history = []
+    for m in messages:
+        agent, content = (m.get("agent"), m.get("content")) if isinstance(m, dict) else (m.agent, m.content)
+        if content:
+            history.append({"role": "user" if agent in ("user", "userAgent") else "assistant", "content": content})
+    if history and history[-1] == {"role": "user", "content": current_message}:
+        history.pop()
+    return history
+
+def history_window(history: list[dict]) -> HistoryWindow:
+    """The part of the history (and summary) that fits this turn's token budget"""
+    window = history_manager.window(history)
+    if window.messages:
+        log_event(logger, logging.INFO, "history window", **window.summary())
+    return window
+
+def refresh_history(history: list[dict], message: str, finished: TurnFinished) -> None:
+    """Summarise in the background what the next turn's history window would drop"""
+    history_manager.refresh(history + [{"role": "user", "content": message},
+                                       {"role": "assistant", "content": finished.text}])
+
+# Answers of stateless turns (new conversation, no history) for repeated questions; opt-in
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_SCOPE = os.getenv("RESPONSE_CACHE_SCOPE", "user")   # "global" shares answers between users
+response_cache = ResponseCache(lambda name: registry.spec(name).cacheable) if RESPONSE_CACHE_ENABLED else None
+
+def response_cache_key(endpoint: str, message: str, scenario: str, conversation: Conversation,
+                       history: Optional[list] = None, reasoning: Optional[dict] = None,
+                       document: Optional[bytes] = None) -> Optional[str]:
+    """Cache key of a turn whose answer may be reused, or None when it depends on earlier turns"""
+    if response_cache is None or conversation.continued or history:
+        return None
+    scope = "" if RESPONSE_CACHE_SCOPE == "global" else conversation.user
+    return response_cache.key(endpoint, message, scenario, reasoning, registry.version,
+                              pdf_digest(document) if document is not None else None, scope)
+
+def cached_response(endpoint: str, key: Optional[str], conversation: Conversation) -> Optional[CachedResponse]:
+    """The cached answer for ``key``; a hit continues the conversation from the recorded response"""
+    if key is None:
+        return None
+    entry = response_cache.get(key)
+    RESPONSE_CACHE.inc(endpoint=endpoint, result="hit" if entry is not None else "miss")
+    if entry is not None and entry.response_id:
+        conversation_store.record(conversation, entry.response_id)
+    return entry
+
+async def cached_stream(endpoint: str, key: Optional[str], conversation: Conversation,
+                        produce: Callable[[], AsyncGenerator[dict, None]],
+                        response_id: Callable[[], Optional[str]]) -> AsyncGenerator[dict, None]:
+    """Replay a cached answer's payloads at full speed, or produce them and record them for next time"""
+    entry = cached_response(endpoint, key, conversation)
+    if entry is not None:
+        yield {'type':'cache_hit','cached_at':entry.created_at}
+        for payload in entry.payloads or ():
+            yield payload
+        return
+    payloads = produce()
+    if key is not None:
+        payloads = response_cache.record(key, payloads, response_id)
+    async for payload in payloads:
+        yield payload
+
+# Streaming responses are produced in the background and can be resumed with Last-Event-ID
+stream_sessions = StreamSessionStore(
+    on_finish=lambda session: observe_stream(session.label, session.finished_at - session.created_at,
+                                             session.bytes, session.cancelled)
+)
+
+@app.on_event("shutdown")
+async def close_stream_sessions():
+    """Stop producing any stream that is still running"""
+    stream_sessions.close()
+
+def stream_response(session: StreamSession, after: int = 0) -> StreamingResponse:
+    """Serve a stream session as text/event-stream, starting after event ``after``"""
+    return StreamingResponse(
+        session.frames(after, heartbeat=stream_sessions.heartbeat),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # keep reverse proxies from buffering the stream
+            "X-Stream-Id": session.stream_id,
+            "Access-Control-Allow-Origin": "*",
+        },
+    )
+
+def event_stream_response(http_request: Request, generate: Callable[[], AsyncGenerator[dict, None]]) -> StreamingResponse:
+    """
+    Stream an endpoint's payloads, or resume an earlier stream
+
+    A request carrying ``Last-Event-ID`` re-attaches to the stream that id
+    belongs to instead of calling ``generate`` (and the model) again.
+    """
+    last_event_id = http_request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            session, after = stream_sessions.resume(last_event_id)
+        except StreamGoneError as e:
+            raise HTTPException(status_code=410, detail=str(e))
+        log_event(logger, logging.INFO, "stream resumed", stream_id=session.stream_id, after=after)
+        return stream_response(session, after)
+    # Fail with a status code rather than an error event when the turn would be refused anyway;
+    # such a turn never reaches run_turn, so its refusal is booked here
+    user = current_user()
+    if usage_ledger.plan(user, None)[1] == "rejected":
+        try:
+            usage_ledger.admit(user, None)
+        except TokenBudgetExceeded as e:
+            raise HTTPException(status_code=429, detail=str(e))
+    return stream_response(stream_sessions.start(generate(), label=http_request.url.path))
+
+pdf_extractor = PDFTextExtractor()
+
+@app.on_event("shutdown")
+async def shutdown_pdf_extractor():
+    """Stop the PDF worker processes"""
+    pdf_extractor.shutdown()
+
+async def extract_pages_from_pdf(pdf_file: bytes, endpoint: str) -> list[str]:
+    """Extract the text of each page of a PDF file"""
+    started = time.perf_counter()
     try:
-        pdf_stream = io.BytesIO(pdf_file)
-        pdf_reader = PyPDF2.PdfReader(pdf_stream)
-        
-        text_content = ""
-        for page in pdf_reader.pages:
-            text_content += page.extract_text() + "\n"
-        
-        return text_content.strip()
+        return await pdf_extractor.extract_pages(pdf_file)
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error processing PDF: {str(e)}")
+    finally:
+        PDF_EXTRACTION.observe(time.perf_counter() - started, endpoint=endpoint)
+
+def build_document_context(pages: list[str], message: str) -> DocumentContext:
+    """Select the parts of an uploaded document relevant to the user's message"""
+    context = select_context(pages, message)
+    log_event(logger, logging.INFO, "document context", **context.summary())
+    return context
+
+def document_prompt_section(context: DocumentContext) -> str:
+    """Document excerpt for the user prompt, flagged when parts were left out"""
+    if context.complete:
+        return f"PDF Document Content:\n{context.text}"
+    return (
+        f"PDF Document Excerpts ({len(context.chunks)} of {context.total_chunks} sections, "
+        f"selected for relevance to the user's message; [...] marks omitted text):\n{context.text}"
+    )
+
+def build_upload_input(context: DocumentContext, message: str, scenario: str,
+                       history: Optional[list[dict]] = None) -> PromptInput:
+    """System prompt, document instructions, history and the user message with the document"""
+    # Document excerpts are dynamic content: they go into the user message, after the cacheable prefix
+    enhanced_message = f"""User message: {message}
+
+{document_prompt_section(context)}
+
+Please analyze the provided PDF document and respond to the user's message in the context of this document."""
+
+    return prompt_layout.build(scenario, enhanced_message, additions=("document",), history=history or ())
+
+BATCH_DEFAULT_MESSAGE = (
+    "Process this request letter: identify who is asking for what, retrieve the requested "
+    "information with the available tools and report the outcome."
+)
+
+async def process_letter(filename: str, pages: list[str], message: str = BATCH_DEFAULT_MESSAGE,
+                         scenario: str = "default") -> dict:
+    """Run the upload flow for one letter of a batch job"""
+    document_context = build_document_context(pages, message)
+    prompt = build_upload_input(document_context, message, scenario)
+    finished = await complete_turn("batch", prompt.items, scenario, tools=get_all_tools(),
+                                   prefix_key=prompt.prefix_key)
+    return {
+        "response": finished.text,
+        "functions_called": [result.name for result in finished.tool_results],
+        "stop_reason": finished.stop_reason,
+        "total_tokens": finished.total_tokens,
+        **document_context.summary(),
+    }
 
 def get_reasoning_config(request_reasoning: Optional[ReasoningConfig] = None, default_effort: str = "medium", default_summary: str = "auto") -> dict:
     """
@@ -787,6 +636,20 @@ def get_reasoning_config(request_reasoning: Optional[ReasoningConfig] = None, de
     
     return reasoning_config
 
+def get_turn_budget(request_limits: Optional[AgentLimits] = None) -> TurnBudget:
+    """
+    Build the agent loop budget for a request
+
+    Args:
+        request_limits: Optional per-request limits; they can only lower the server defaults
+
+    Returns:
+        TurnBudget for the turn engine
+    """
+    if not request_limits:
+        return TurnBudget()
+    return TurnBudget().narrowed(**request_limits.model_dump())
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -795,18 +658,118 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
-    try:
-        return {
-            "status": "healthy",
-            "openai_configured": True,
-            "model": model_name
-        }
-    except Exception as e:
-        return {
-            "status": "healthy", 
-            "openai_configured": False,
-            "error": str(e)
-        }
+    return {
+        "status": "healthy",
+        "openai_configured": bool(azure_endpoint or model_pool_config),
+        "model": model_name,
+        "model_backends": {"count": len(model_pool.backends), "available": model_pool.available()},
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 1),
+        "tools": {"count": len(registry), "version": registry.version},
+        "streams": stream_sessions.stats(),
+        "cancelled_turns": turn_engine.cancelled_turns,
+        "pdf_cache": pdf_extractor.stats(),
+        "tool_cache": tool_cache.stats() if tool_cache is not None else None,
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Latency histograms and counters in Prometheus text format"""
+    return PlainTextResponse(default_registry.render() + runtime_gauges(),
+                             media_type="text/plain; version=0.0.4")
+
+def runtime_gauges() -> str:
+    """Point-in-time values read from the live components at scrape time"""
+    values = [
+        ("stream_sessions_live", "Streams still producing", stream_sessions.stats()["live"]),
+        ("stream_sessions_stored", "Streams kept for Last-Event-ID resume", stream_sessions.stats()["sessions"]),
+        ("turns_cancelled", "Turns cancelled because the client disconnected", turn_engine.cancelled_turns),
+        ("pdf_cache_entries", "Documents in the PDF text cache", pdf_extractor.stats()["size"]),
+        ("model_backends_available", "Model backends not ejected", model_pool.available()),
+        ("model_backend_failovers", "Responses retried on another backend", model_pool.failovers),
+    ]
+    if tool_cache is not None:
+        stats = tool_cache.stats()
+        values += [("tool_cache_entries", "Entries in the tool result cache", stats["size"]),
+                   ("tool_cache_hit_ratio", "Tool cache hit ratio since start", stats["hit_rate"])]
+    return "".join(f"# HELP {name} {help}\n# TYPE {name} gauge\n{name} {value}\n" for name, help, value in values)
+
+@app.get("/api/model-backends")
+async def get_model_backends():
+    """Routing state of each model backend: outstanding requests, health and ejections"""
+    return model_pool.stats()
+
+@app.get("/api/usage")
+async def get_token_usage():
+    """Token usage and estimated cost per endpoint, scenario, round, tool pattern and user"""
+    return usage_ledger.snapshot()
+
+@app.get("/api/usage/me")
+async def get_my_token_budget():
+    """Tokens the current user spent today against the daily budget"""
+    return usage_ledger.budget_status(current_user())
+
+@app.get("/api/conversations")
+async def get_conversation_stats():
+    """Conversation store size, hit rate and evictions, and the history summary cache"""
+    return {**conversation_store.stats(), "history": history_manager.stats()}
+
+@app.delete("/api/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str):
+    """Forget a conversation; its next turn starts again from the full history"""
+    conversation = conversation_store.get(conversation_id)
+    if conversation is None or conversation.user != current_user():
+        raise HTTPException(status_code=404, detail=f"Unknown conversation: {conversation_id}")
+    conversation_store.forget(conversation_id)
+    return {"conversation_id": conversation_id, "deleted": True}
+
+@app.get("/api/response-cache")
+async def get_response_cache_stats():
+    """Hit/miss counters and size of the response cache"""
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "scope": RESPONSE_CACHE_SCOPE, **response_cache.stats()}
+
+@app.delete("/api/response-cache")
+async def clear_response_cache():
+    """Drop every cached answer, e.g. after the data behind the tools changed"""
+    if response_cache is None:
+        return {"enabled": False, "removed": 0}
+    return {"enabled": True, "removed": response_cache.clear()}
+
+@app.get("/api/tools/cache")
+async def get_tool_cache_stats():
+    """Hit/miss counters and size of the tool result cache"""
+    if tool_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **tool_cache.stats()}
+
+@app.post("/api/tools/cache/invalidate")
+async def invalidate_tool_cache(request: ToolCacheInvalidation):
+    """Drop cached tool results, optionally filtered by tool and/or username"""
+    if tool_cache is None:
+        return {"enabled": False, "removed": 0}
+    if request.tool and request.tool not in registry:
+        raise HTTPException(status_code=404, detail=f"Unknown tool: {request.tool}")
+    removed = tool_cache.invalidate_matching(
+        lambda name, arguments: (request.tool is None or name == request.tool)
+        and (request.username is None or arguments.get("username") == request.username
+             or request.username in arguments.get("usernames", []))
+    )
+    return {"enabled": True, "removed": removed}
+
+@app.get("/api/outbox")
+async def get_outbox_stats():
+    """Queued, sent, retried and failed e-mail counts"""
+    return email_outbox.stats()
+
+@app.get("/api/outbox/{message_id}")
+async def get_outbox_message(message_id: str):
+    """Delivery status of one queued e-mail"""
+    status = email_outbox.status(message_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown message: {message_id}")
+    return status
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_completion(request: ChatRequest):
@@ -814,505 +777,164 @@ async def chat_completion(request: ChatRequest):
     Handle chat completion requests from the frontend using the new Responses API with all available functions
     """
     try:
-        # Get system prompt based on scenario
-        system_prompt = SYSTEM_PROMPTS.get(request.scenario, SYSTEM_PROMPTS["default"])
-        
-        # Convert chat history to new Responses API input format
-        input_messages = [{"role": "user", "content": request.message}]
-        
-        # Get all available tools
-        tools = get_all_tools()
-        
-        # Create initial response with tools
-        response = client.responses.create(
-            model=model_name,
-            tools=tools,
-            input=input_messages
-        )
-        
-        # Check if function calls were made and handle them
-        input_for_second_call = []
-        for output in response.output:
-            if output.type == "function_call":
-                try:
-                    args = json.loads(output.arguments) if isinstance(output.arguments, str) else output.arguments
-                    function_result = call_function(output.name, **args)
-                    
-                    input_for_second_call.append({
-                        "type": "function_call_output",
-                        "call_id": output.call_id,
-                        "output": json.dumps(function_result)
-                    })
-                except Exception as e:
-                    logger.error(f"Error processing {output.name} call: {str(e)}")
-                    input_for_second_call.append({
-                        "type": "function_call_output",
-                        "call_id": output.call_id,
-                        "output": json.dumps({"error": f"Failed to execute {output.name}"})
-                    })
-        
-        # If function calls were made, create a second response with the function outputs
-        if input_for_second_call:
-            second_response = client.responses.create(
-                model=model_name,
-                previous_response_id=response.id,
-                input=input_for_second_call
-            )
-            
-            # Extract the final response
-            assistant_response = ""
-            for output in second_response.output:
-                if output.type == "message":
-                    for content in output.content:
-                        if content.type == "output_text":
-                            assistant_response += content.text
-        else:
-            # No function calls, extract response directly
-            assistant_response = ""
-            for output in response.output:
-                if output.type == "message":
-                    for content in output.content:
-                        if content.type == "output_text":
-                            assistant_response += content.text
-        
+        # System prompt first, then the message (the same prefix as every other endpoint)
+        prompt = prompt_layout.build(request.scenario, request.message)
+        conversation = open_conversation(request.conversation_id, request.scenario)
+        cache_key = response_cache_key("/chat", request.message, request.scenario, conversation)
+        cached = cached_response("/chat", cache_key, conversation)
+        if cached is not None:
+            return ChatResponse(response=cached.text, success=True, conversation_id=conversation.conversation_id)
+
+        # Run the turn (tool calls and the follow-up response are handled by the engine)
+        finished = await complete_conversation_turn("/chat", conversation, [prompt.user_item], prompt.items,
+                                                    request.scenario or "default", tools=get_all_tools(),
+                                                    budget=get_turn_budget(request.limits),
+                                                    prefix_key=prompt.prefix_key)
+        if cache_key is not None:
+            response_cache.store_turn(cache_key, finished)
+
         return ChatResponse(
-            response=assistant_response,
-            success=True
+            response=finished.text,
+            success=True,
+            conversation_id=conversation.conversation_id,
         )
         
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat completion: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing chat request: {str(e)}")
 
+@app.get("/api/streams")
+async def get_stream_stats():
+    """Stream session counters, including turns cancelled because the client left"""
+    return {**stream_sessions.stats(), "cancelled_turns": turn_engine.cancelled_turns}
+
+@app.get("/api/stream/{stream_id}")
+async def resume_stream(stream_id: str, http_request: Request, last_event_id: Optional[str] = None):
+    """
+    Re-attach to a running or recently finished stream
+
+    Replays from the ``Last-Event-ID`` header (or ``last_event_id`` query
+    parameter) when given, otherwise from the first buffered event.
+    """
+    last_event_id = http_request.headers.get("last-event-id") or last_event_id
+    if not last_event_id:
+        session = stream_sessions.get(stream_id)
+        if session is None or not session.can_resume_after(0):
+            raise HTTPException(status_code=410, detail=f"Stream {stream_id} can no longer be replayed")
+        return stream_response(session)
+    if not last_event_id.startswith(f"{stream_id}:"):
+        raise HTTPException(status_code=400, detail="Last-Event-ID does not belong to this stream")
+    try:
+        session, after = stream_sessions.resume(last_event_id)
+    except StreamGoneError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return stream_response(session, after)
+
 @app.post("/api/chat/stream")
-async def chat_completion_stream(request: ChatRequest):
+async def chat_completion_stream(request: ChatRequest, http_request: Request):
     """
     Handle streaming chat completion requests with tool calls and Chain of Thought reasoning.
     Fully captures function-call names and arguments.
     """
-    async def generate_response() -> AsyncGenerator[str, None]:
+    conversation = open_conversation(request.conversation_id, request.scenario)
+
+    async def generate_response() -> AsyncGenerator[dict, None]:
         try:
-            tools = get_all_tools()
-            input_messages = [{"role": "user", "content": request.message}]
-            reasoning_config = get_reasoning_config()
-
-            response = client.responses.create(
-                model=model_name,
-                tools=tools,
-                input=input_messages,
-                reasoning=reasoning_config,
-                stream=True
+            prompt = prompt_layout.build(request.scenario, request.message)
+            reasoning = get_reasoning_config()
+            cache_key = response_cache_key("/api/chat/stream", request.message, request.scenario, conversation,
+                                           reasoning=reasoning)
+            yield {'type':'conversation','conversation_id':conversation.conversation_id,
+                   'continued':conversation.continued}
+            presenter = TurnPresenter(
+                result_type="function_call",
+                status_message="Processing function results...",
+                phase_markers=False,
             )
 
-            # ------------------------------------------------------------------
-            # State we keep while the FIRST stream is running
-            # ------------------------------------------------------------------
-            function_calls_meta: dict[str, dict] = {}   # item_id ➜ {name, call_id, arguments}
-            function_calls_made = False
-            input_for_second_call: list = []
-
-            for event in response:
-                logger.info(f"[STREAM DEBUG] Event type: {event.type}")
-                if hasattr(event, '__dict__'):
-                    logger.info(f"[STREAM DEBUG] Event attributes: {event.__dict__}")
-
-                # --------------------------------------------------------------
-                # 1. Stream lifecycle messages (unchanged)
-                # --------------------------------------------------------------
-                if event.type == 'response.created':
-                    yield f"data: {json.dumps({'type':'stream_created'})}\n\n"
-
-                elif event.type == 'response.in_progress':
-                    yield f"data: {json.dumps({'type':'stream_progress'})}\n\n"
-
-                # --------------------------------------------------------------
-                # 2. New output items (including function calls)
-                # --------------------------------------------------------------
-                elif event.type == 'response.output_item.added':
-                    output_item = getattr(event, "item", None) or getattr(event, "output_item", None)
-                    if output_item and getattr(output_item, 'type', None) == 'function_call':
-                        item_id = getattr(output_item, 'id', None)          # <-- matches later item_id field
-                        function_calls_meta[item_id] = {                    # ### NEW
-                            "name": output_item.name,
-                            "call_id": output_item.call_id,
-                            "arguments": ""
-                        }
-                        logger.info(f"[STREAM DEBUG] Captured meta for {item_id}: {function_calls_meta[item_id]}")  # ### NEW-DEBUG
-                        yield f"data: {json.dumps({'type':'function_call_added','function':output_item.name,'call_id':output_item.call_id})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type':'output_item_added'})}\n\n"
-
-                # --------------------------------------------------------------
-                # 3. Completed output items
-                # --------------------------------------------------------------
-                elif event.type == 'response.output_item.done':
-                    output_item = getattr(event, "item", None) or getattr(event, "output_item", None)
-                    if output_item and getattr(output_item, 'type', None) == 'function_call':
-                        yield f"data: {json.dumps({'type':'function_call_done','function':output_item.name,'call_id':output_item.call_id})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type':'output_item_done'})}\n\n"
-
-                # --------------------------------------------------------------
-                # 4. Text / reasoning deltas (unchanged)
-                # --------------------------------------------------------------
-                elif event.type == 'response.output_text.delta':
-                    yield f"data: {json.dumps({'type':'content','content':event.delta})}\n\n"
-                    await asyncio.sleep(0.01)
-
-                elif event.type == 'response.reasoning_summary_text.delta':
-                    yield f"data: {json.dumps({'type':'reasoning','content':event.delta})}\n\n"
-                    await asyncio.sleep(0.01)
-
-                # --------------------------------------------------------------
-                # 5. Function-argument streaming (FIXED)
-                # --------------------------------------------------------------
-                elif event.type == 'response.function_call_arguments.delta':
-                    item_id = getattr(event, 'item_id', None)              # <-- use item_id
-                    delta = getattr(event, 'delta', '')
-                    meta = function_calls_meta.setdefault(item_id, {"name": 'unknown_function',
-                                                                     "call_id": 'unknown',
-                                                                     "arguments": ""})
-                    meta['arguments'] += delta
-                    logger.info(f"[STREAM DEBUG] Args delta for {item_id}: '{delta}'")  # ### NEW-DEBUG
-                    yield f"data: {json.dumps({'type':'function_args_delta','call_id':item_id,'delta':delta,'function':meta['name']})}\n\n"
-
-                elif event.type == 'response.function_call_arguments.done':
-                    item_id = getattr(event, 'item_id', None)              # <-- use item_id
-                    meta = function_calls_meta.get(item_id, {})
-                    meta['arguments'] = getattr(event, 'arguments', meta.get('arguments', ''))
-                    function_name = meta.get('name', 'unknown_function')
-                    arguments_str = meta['arguments']
-                    logger.info(f"[STREAM DEBUG] Final args for {item_id}: {arguments_str}")  # ### NEW-DEBUG
-
-                    yield f"data: {json.dumps({'type':'function_args_complete','call_id':item_id,'function':function_name})}\n\n"
-
-                    # Execute the tool
-                    try:
-                        args = json.loads(arguments_str) if arguments_str else {}
-                        function_result = call_function(function_name, **args)
-                        function_calls_made = True
-                        input_for_second_call.append({
-                            "type": "function_call_output",
-                            "call_id": item_id,
-                            "output": json.dumps(function_result)
-                        })
-                        yield f"data: {json.dumps({'type':'function_call','function':function_name,'status':'completed','call_id':item_id})}\n\n"
-                    except Exception as e:
-                        logger.error(f"Error processing {function_name}: {e}")
-                        input_for_second_call.append({
-                            "type": "function_call_output",
-                            "call_id": item_id,
-                            "output": json.dumps({"error": str(e)})
-                        })
-                        yield f"data: {json.dumps({'type':'function_call','function':function_name,'status':'error','error':str(e),'call_id':item_id})}\n\n"
-
-                # --------------------------------------------------------------
-                # 6. Legacy single-shot function_call events (unchanged)
-                # --------------------------------------------------------------
-                elif event.type == 'response.function_call':
-                    ...
-
-                # --------------------------------------------------------------
-                # 7. Stream finished
-                # --------------------------------------------------------------
-                elif event.type == 'response.completed':
-                    yield f"data: {json.dumps({'type':'stream_completed'})}\n\n"
-                    break
-
-                elif event.type == 'response.done':
-                    break
-
-                else:
-                    logger.info(f"[STREAM DEBUG] Unhandled event: {event.type}")
-
-            # ------------------------------------------------------------------
-            # SECOND round: feed tool results back (logic unchanged except
-            #               for the same item_id fix in the inner loop)
-            # ------------------------------------------------------------------
-            if function_calls_made and input_for_second_call:
-                yield f"data: {json.dumps({'type':'status','message':'Processing function results...'})}\n\n"
-
-                final_response = client.responses.create(
-                    model=model_name,
-                    previous_response_id=response.id if hasattr(response, 'id') else None,
-                    input=input_for_second_call,
-                    reasoning=reasoning_config,
-                    stream=True
-                )
-
-                accumulated_final_args: dict[str, dict] = {}
-
-                for event in final_response:
-                    logger.info(f"[FINAL STREAM DEBUG] Event type: {event.type}")
-                    if hasattr(event, '__dict__'):
-                        logger.info(f"[FINAL STREAM DEBUG] Event attributes: {event.__dict__}")
-
-                    if event.type == 'response.output_item.added':
-                        output_item = getattr(event, 'output_item', None)
-                        if output_item and getattr(output_item, 'type', None) == 'function_call':
-                            item_id = getattr(output_item, 'id', None)
-                            accumulated_final_args[item_id] = {"name": output_item.name, "arguments": ""}
-                            yield f"data: {json.dumps({'type':'final_function_call_added','function':output_item.name,'call_id':item_id})}\n\n"
-
-                    elif event.type == 'response.function_call_arguments.delta':
-                        item_id = getattr(event, 'item_id', None)
-                        delta = getattr(event, 'delta', '')
-                        accumulated_final_args.setdefault(item_id, {"name": 'unknown_function', "arguments": ""})
-                        accumulated_final_args[item_id]['arguments'] += delta
-                        yield f"data: {json.dumps({'type':'function_args_delta','call_id':item_id,'delta':delta})}\n\n"
-
-                    elif event.type == 'response.function_call_arguments.done':
-                        item_id = getattr(event, 'item_id', None)
-                        meta = accumulated_final_args.get(item_id, {})
-                        meta['arguments'] = getattr(event, 'arguments', meta.get('arguments', ''))
-                        yield f"data: {json.dumps({'type':'function_args_complete','call_id':item_id,'function':meta.get('name')})}\n\n"
-
-                    elif event.type == 'response.output_text.delta':
-                        yield f"data: {json.dumps({'type':'content','content':event.delta})}\n\n"
-                        await asyncio.sleep(0.01)
-
-                    elif event.type == 'response.reasoning_summary_text.delta':
-                        yield f"data: {json.dumps({'type':'reasoning','content':event.delta})}\n\n"
-                        await asyncio.sleep(0.01)
-
-                    elif event.type == 'response.completed':
-                        yield f"data: {json.dumps({'type':'final_stream_completed'})}\n\n"
-                        break
-
-                    elif event.type == 'response.done':
-                        break
-
-            # ------------------------------------------------------------------
-            # All done
-            # ------------------------------------------------------------------
-            yield f"data: {json.dumps({'type':'done','done':True})}\n\n"
+            async def answer() -> AsyncGenerator[dict, None]:
+                events = conversation_turn("/api/chat/stream", conversation, [prompt.user_item], prompt.items,
+                                           request.scenario or "default", tools=get_all_tools(),
+                                           reasoning=reasoning, budget=get_turn_budget(request.limits),
+                                           prefix_key=prompt.prefix_key)
+                async for payload in presenter.present(events):
+                    yield payload
+                yield {'type':'done','done':True}
+
+            async for payload in cached_stream("/api/chat/stream", cache_key, conversation, answer,
+                                               lambda: presenter.finished.response_id):
+                yield payload
 
         except Exception as e:
             logger.error(f"Error in streaming chat: {e}")
-            yield f"data: {json.dumps({'error':str(e)})}\n\n"
+            yield {'error':str(e)}
 
-    return StreamingResponse(
-        generate_response(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-        }
-    )
+    return event_stream_response(http_request, generate_response)
 
 # ---------------------------------------------------------------------------
 #  /chat/cot-stream – Chain-of-Thought streaming endpoint
 # ---------------------------------------------------------------------------
 
 @app.post("/chat/cot-stream")
-async def chain_of_thought_stream(request: ChatRequest):
+async def chain_of_thought_stream(request: ChatRequest, http_request: Request):
     """
     Streams chain-of-thought, executes tools, feeds results back for a second
     turn, and streams the final answer.
     """
 
-    async def generate_cot_response() -> AsyncGenerator[str, None]:
+    conversation = open_conversation(request.conversation_id, request.scenario)
+
+    async def generate_cot_response() -> AsyncGenerator[dict, None]:
         try:
             # ── 0. Prompt & config ───────────────────────────────────────
-            tools       = get_all_tools()
-            sys_prompt  = SYSTEM_PROMPTS.get(request.scenario, SYSTEM_PROMPTS["default"])
-            input_msgs  = [
-                {"role": "system", "content": sys_prompt},
-                {"role": "user",   "content": request.message},
-            ]
-            for m in request.messages:
-                input_msgs.append({
-                    "role": "user" if m.agent == "user" else "assistant",
-                    "content": m.content,
-                })
-
-            reasoning_cfg = get_reasoning_config()
-            yield f"data: {json.dumps({'type':'reasoning_config', **reasoning_cfg})}\n\n"
-
-            first_stream = client.responses.create(
-                model     = model_name,
-                tools     = tools,
-                input     = input_msgs,
-                reasoning = reasoning_cfg,
-                stream    = True,
-            )
-
-            # ── 1. Stream-state vars ────────────────────────────────────
-            first_response_id: str | None = None
-            reasoning_started = content_started = False
-            tool_meta: dict[str, dict] = {}      # item_id ➜ {name, call_id, arguments}
-            tool_outputs: list          = []     # payload for second turn
-            tool_invoked: bool          = False
-
-            # ── 2. FIRST stream loop ────────────────────────────────────
-            for ev in first_stream:
-                logger.info(f"[COT STREAM DEBUG] {ev.type}")
-
-                # lifecycle
-                if ev.type == "response.created":
-                    first_response_id = getattr(ev, "response_id", None) or getattr(ev.response, "id", None)
-                    yield f"data: {json.dumps({'type':'stream_created'})}\n\n"
-                    continue
-                if ev.type == "response.in_progress":
-                    yield f"data: {json.dumps({'type':'stream_progress'})}\n\n"
-                    continue
-
-                # new tool-calls
-                if ev.type == "response.output_item.added":
-                    itm = getattr(ev, "item", None) or getattr(ev, "output_item", None)
-                    if itm and getattr(itm, "type", None) == "function_call":
-                        tool_meta[itm.id] = {"name": itm.name,
-                                             "call_id": itm.call_id,
-                                             "arguments": ""}
-                        yield f"data: {json.dumps({'type':'cot_function_call_added','function':itm.name,'call_id':itm.call_id})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type':'output_item_added'})}\n\n"
-                    continue
-
-                if ev.type == "response.output_item.done":
-                    itm = getattr(ev, "item", None) or getattr(ev, "output_item", None)
-                    if itm and getattr(itm, "type", None) == "function_call":
-                        yield f"data: {json.dumps({'type':'cot_function_call_done','function':itm.name,'call_id':itm.call_id})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type':'output_item_done'})}\n\n"
-                    continue
-
-                # reasoning & answer text
-                if ev.type == "response.reasoning_summary_text.delta":
-                    if not reasoning_started:
-                        yield f"data: {json.dumps({'type':'reasoning_start'})}\n\n"
-                        reasoning_started = True
-                    yield f"data: {json.dumps({'type':'reasoning','content':ev.delta})}\n\n"
-                    await asyncio.sleep(0.01)
-                    continue
-
-                if ev.type == "response.output_text.delta":
-                    if not content_started:
-                        if reasoning_started:
-                            yield f"data: {json.dumps({'type':'reasoning_end'})}\n\n"
-                        yield f"data: {json.dumps({'type':'content_start'})}\n\n"
-                        content_started = True
-                    yield f"data: {json.dumps({'type':'content','content':ev.delta})}\n\n"
-                    await asyncio.sleep(0.01)
-                    continue
-
-                # argument chunks
-                if ev.type == "response.function_call_arguments.delta":
-                    iid, delta = ev.item_id, ev.delta
-                    meta = tool_meta.setdefault(iid, {"name":"unknown_function",
-                                                      "call_id":"unknown",
-                                                      "arguments":""})
-                    meta["arguments"] += delta
-                    yield f"data: {json.dumps({'type':'function_args_delta','call_id':iid,'delta':delta,'function':meta['name']})}\n\n"
-                    continue
-
-                if ev.type == "response.function_call_arguments.done":
-                    iid  = ev.item_id
-                    meta = tool_meta.get(iid, {})
-                    meta["arguments"] = getattr(ev, "arguments", meta.get("arguments", ""))
-                    yield f"data: {json.dumps({'type':'function_args_complete','call_id':iid,'function':meta.get('name')})}\n\n"
-
-                    # run tool
-                    try:
-                        args_dict = json.loads(meta["arguments"]) if meta["arguments"] else {}
-                        result    = call_function(meta["name"], **args_dict)
-                        tool_invoked = True
-                        tool_outputs.append({
-                            "type":  "function_call_output",
-                            "call_id": meta["call_id"],      # ★ use real call_id
-                            "output": json.dumps(result),
-                        })                                   # ★
-                        yield f"data: {json.dumps({'type':'function_result','function':meta['name'],'status':'completed'})}\n\n"
-                    except Exception as err:
-                        logger.error(f"{meta['name']} failed: {err}")
-                        tool_invoked = True
-                        tool_outputs.append({
-                            "type":  "function_call_output",
-                            "call_id": meta["call_id"],      # ★ use real call_id
-                            "output": json.dumps({"error": str(err)}),
-                        })                                   # ★
-                        yield f"data: {json.dumps({'type':'function_result','function':meta['name'],'status':'error','error':str(err)})}\n\n"
-                    continue
-
-                # legacy single-chunk call (already correct)
-                if ev.type == "response.function_call":
-                    tool_invoked = True
-                    try:
-                        args = json.loads(ev.arguments) if isinstance(ev.arguments, str) else ev.arguments
-                        result = call_function(ev.name, **args)
-                        tool_outputs.append({
-                            "type": "function_call_output",
-                            "call_id": ev.call_id,
-                            "output": json.dumps(result),
-                        })
-                        yield f"data: {json.dumps({'type':'function_result','function':ev.name,'status':'completed'})}\n\n"
-                    except Exception as err:
-                        logger.error(f"{ev.name} failed: {err}")
-                        tool_outputs.append({
-                            "type": "function_call_output",
-                            "call_id": ev.call_id,
-                            "output": json.dumps({"error": str(err)}),
-                        })
-                        yield f"data: {json.dumps({'type':'function_result','function':ev.name,'status':'error','error':str(err)})}\n\n"
-                    continue
-
-                if ev.type in ("response.completed", "response.done"):
-                    break
-
-            # ── 3. SECOND stream ─────────────────────────────────────────
-            if tool_invoked and tool_outputs and first_response_id:
-                yield f"data: {json.dumps({'type':'status','message':'Generating final answer...'})}\n\n"
-
-                second = client.responses.create(
-                    model                = model_name,
-                    previous_response_id = first_response_id,
-                    input                = tool_outputs,
-                    reasoning            = reasoning_cfg,
-                    stream               = True,
-                )
-
-                for ev in second:
-                    logger.info(f"[COT STREAM FINAL DEBUG] {ev.type}")
-
-                    if ev.type == "response.output_text.delta":
-                        if not content_started:
-                            yield f"data: {json.dumps({'type':'content_start'})}\n\n"
-                            content_started = True
-                        yield f"data: {json.dumps({'type':'content','content':ev.delta})}\n\n"
-                        await asyncio.sleep(0.01)
-                        continue
-
-                    if ev.type == "response.reasoning_summary_text.delta":
-                        yield f"data: {json.dumps({'type':'reasoning','content':ev.delta})}\n\n"
-                        await asyncio.sleep(0.01)
-                        continue
-
-                    if ev.type in ("response.completed", "response.done"):
-                        break
-
-            # ── 4. Fallback & closing ────────────────────────────────────
-            if not content_started:
-                yield f"data: {json.dumps({'type':'content_start'})}\n\n"
-                yield f"data: {json.dumps({'type':'content','content':'(no answer generated)'})}\n\n"
-
-            yield f"data: {json.dumps({'type':'content_end'})}\n\n"
-            yield f"data: {json.dumps({'type':'done','done':True})}\n\n"
+            # A continued conversation already holds the system prompt and history upstream
+            chained     = conversation.continued
+            history     = chat_history(request.messages, request.message)
+            prompt      = prompt_layout.build(request.scenario, request.message,
+                                              history=history_window(history).items)
+            yield {'type':'conversation','conversation_id':conversation.conversation_id,
+                   'continued':conversation.continued}
+
+            # Reported as used: a user over the daily token budget may get a lower effort (run_turn admits it)
+            requested_reasoning = get_reasoning_config()
+            reasoning_cfg, _ = usage_ledger.plan(current_user(), requested_reasoning)
+            cache_key = response_cache_key("/chat/cot-stream", request.message, request.scenario, conversation,
+                                           history=history, reasoning=reasoning_cfg)
+            presenter = TurnPresenter(call_prefix="cot_")
+
+            async def answer() -> AsyncGenerator[dict, None]:
+                yield {'type':'reasoning_config', **reasoning_cfg}
+
+                # ── 1. Stream the turn ──────────────────────────────────
+                events = conversation_turn("/chat/cot-stream", conversation, [prompt.user_item], prompt.items,
+                                           request.scenario, tools=get_all_tools(), reasoning=requested_reasoning,
+                                           budget=get_turn_budget(request.limits), prefix_key=prompt.prefix_key)
+                async for payload in presenter.present(events):
+                    yield payload
+                if not chained:
+                    refresh_history(history, request.message, presenter.finished)
+
+                # ── 2. Fallback & closing ────────────────────────────────
+                if not presenter.content_started:
+                    yield {'type':'content_start'}
+                    yield {'type':'content','content':'(no answer generated)'}
+
+                yield {'type':'content_end'}
+                yield {'type':'done','done':True}
+
+            # A repeated question is answered from the recorded stream
+            async for payload in cached_stream("/chat/cot-stream", cache_key, conversation, answer,
+                                               lambda: presenter.finished.response_id):
+                yield payload
 
         except Exception as e:
             logger.error(f"Error in CoT streaming chat: {e}")
-            yield f"data: {json.dumps({'type':'error','error':str(e)})}\n\n"
+            yield {'type':'error','error':str(e)}
 
     # return as SSE stream
-    return StreamingResponse(
-        generate_cot_response(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control":               "no-cache",
-            "Connection":                  "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-        },
-    )
+    return event_stream_response(http_request, generate_cot_response)
 
 @app.get("/api/user/{user_id}")
 async def get_user_info_endpoint():
@@ -1331,7 +953,8 @@ async def chat_completion_with_upload(
     file: UploadFile = File(...),
     message: str = Form(...),
     scenario: str = Form("default"),
-    messages: str = Form("[]")
+    messages: str = Form("[]"),
+    conversation_id: Optional[str] = Form(None),
 ):
     """
     Handle chat completion requests with PDF file upload
@@ -1341,100 +964,43 @@ async def chat_completion_with_upload(
         if file.content_type != "application/pdf":
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
         
-        # Read and extract text from PDF
-        pdf_content = await file.read()
-        extracted_text = extract_text_from_pdf(pdf_content)
-        
         # Parse messages from form data
         try:
             parsed_messages = json.loads(messages) if messages else []
         except json.JSONDecodeError:
             parsed_messages = []
-        
-        # Create enhanced message with PDF content
-        enhanced_message = f"""User message: {message}
-
-PDF Document Content:
-{extracted_text[:8000]}  # Limit to 8000 characters to stay within token limits
-{"... (content truncated due to length)" if len(extracted_text) > 8000 else ""}
 
-Please analyze the provided PDF document and respond to the user's message in the context of this document."""
-        
-        # Get system prompt based on scenario
-        system_prompt = SYSTEM_PROMPTS.get(scenario, SYSTEM_PROMPTS["default"])
-        
-        # Add PDF-specific instructions to system prompt
-        enhanced_system_prompt = f"""{system_prompt}
-
-You have been provided with a PDF document. Please analyze its content and provide responses that reference specific information from the document when relevant. If the user asks questions about the document, provide detailed answers based on the document content."""
-        
-        # Convert chat history to new Responses API input format
-        input_messages = [
-            {"role": "system", "content": enhanced_system_prompt},
-            {"role": "user", "content": enhanced_message}
-        ]
-        
-        # Get all available tools
-        tools = get_all_tools()
-        
-        # Create initial response with tools
-        response = client.responses.create(
-            model=model_name,
-            tools=tools,
-            input=input_messages
-        )
+        # A repeated question about the same document needs no extraction or model call
+        pdf_content = await file.read()
+        conversation = open_conversation(conversation_id, scenario)
+        cache_key = response_cache_key("/chat/upload", message, scenario, conversation, document=pdf_content)
+        cached = cached_response("/chat/upload", cache_key, conversation)
+        if cached is not None:
+            return ChatResponse(response=cached.text, success=True, conversation_id=conversation.conversation_id)
+
+        # Extract text from PDF
+        pages = await extract_pages_from_pdf(pdf_content, "/chat/upload")
+        document_context = build_document_context(pages, message)
+        prompt = build_upload_input(document_context, message, scenario)
         
-        # Check if function calls were made and handle them
-        input_for_second_call = []
-        for output in response.output:
-            if output.type == "function_call":
-                try:
-                    args = json.loads(output.arguments) if isinstance(output.arguments, str) else output.arguments
-                    function_result = call_function(output.name, **args)
-                    
-                    input_for_second_call.append({
-                        "type": "function_call_output",
-                        "call_id": output.call_id,
-                        "output": json.dumps(function_result)
-                    })
-                except Exception as e:
-                    logger.error(f"Error processing {output.name} call: {str(e)}")
-                    input_for_second_call.append({
-                        "type": "function_call_output",
-                        "call_id": output.call_id,
-                        "output": json.dumps({"error": f"Failed to execute {output.name}"})
-                    })
-          # If function calls were made, create a second response with the function outputs
-        if input_for_second_call:
-            second_response = client.responses.create(
-                model=model_name,
-                previous_response_id=response.id,
-                input=input_for_second_call
-            )
-            
-            # Extract the final response
-            assistant_response = ""
-            for output in second_response.output:
-                if output.type == "message":
-                    for content in output.content:
-                        if content.type == "output_text":
-                            assistant_response += content.text
-        else:
-            # No function calls, extract response directly
-            assistant_response = ""
-            for output in response.output:
-                if output.type == "message":
-                    for content in output.content:
-                        if content.type == "output_text":
-                            assistant_response += content.text
+        # Run the turn (tool calls and the follow-up response are handled by the engine);
+        # a continued conversation only needs the message with the document
+        finished = await complete_conversation_turn("/chat/upload", conversation, [prompt.user_item],
+                                                    prompt.items, scenario, tools=get_all_tools(),
+                                                    prefix_key=prompt.prefix_key)
+        if cache_key is not None:
+            response_cache.store_turn(cache_key, finished)
         
         return ChatResponse(
-            response=assistant_response,
-            success=True
+            response=finished.text,
+            success=True,
+            conversation_id=conversation.conversation_id,
         )
         
     except HTTPException:
         raise
+    except TokenBudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat completion with upload: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing chat request with file: {str(e)}")
@@ -1485,245 +1051,138 @@ async def get_cot_info():
 
 @app.post("/chat/upload-cot-stream")
 async def chat_upload_with_cot_stream(
+    http_request: Request,
     file: UploadFile = File(...),
     message: str = Form(...),
     scenario: str = Form("default"),
     messages: str = Form("[]"),
+    conversation_id: Optional[str] = Form(None),
 ):
     """
     Upload a PDF, let the model read it, run tools, stream chain-of-thought,
     then return a final answer that can use the tool results.
     """
+    # Read up front: the stream is produced in the background, beyond the request's lifetime
+    pdf_bytes = await file.read()
+    conversation = open_conversation(conversation_id, scenario)
 
-    async def generate_cot_upload_response() -> AsyncGenerator[str, None]:
+    async def generate_cot_upload_response() -> AsyncGenerator[dict, None]:
         try:
             # ── 0. Validate & read PDF ───────────────────────────────────
             if file.content_type != "application/pdf":
-                yield f"data: {json.dumps({'type':'error','error':'Only PDF files are supported'})}\n\n"
+                yield {'type':'error','error':'Only PDF files are supported'}
                 return
 
-            pdf_bytes      = await file.read()
-            extracted_text = extract_text_from_pdf(pdf_bytes)
-            yield f"data: {json.dumps({'type':'file_processed','filename':file.filename,'content_length':len(extracted_text)})}\n\n"
-
-            # ── 1. Build prompt & history ───────────────────────────────
+            # ── 1. History & cache lookup ───────────────────────────────
+            chained = conversation.continued
             history = []
             try:
-                history = json.loads(messages) if messages else []
-            except json.JSONDecodeError:
+                history = chat_history(json.loads(messages) if messages else [], message)
+            except (json.JSONDecodeError, AttributeError):
                 pass
 
-            user_plus_doc = (
-                f"User message: {message}\n\n"
-                f"PDF Document Content (truncated):\n"
-                f"{extracted_text[:8000]}"
-                f"{'... (truncated)' if len(extracted_text) > 8000 else ''}\n\n"
-                "Please analyse the document in answering the user."
-            )
-
-            sys_prompt  = SYSTEM_PROMPTS.get(scenario, SYSTEM_PROMPTS["default"])
-            sys_prompt += "\n\nYou have been provided with a PDF document. Reference it when relevant and show your reasoning."
-
-            input_messages = [
-                {"role": "system", "content": sys_prompt},
-                {"role": "user",   "content": user_plus_doc},
-            ]
-            for msg in history:
-                input_messages.append({
-                    "role": "user" if msg.get("agent") == "userAgent" else "assistant",
-                    "content": msg.get("content", "")
-                })
-
-            # ── 2. First streaming response ─────────────────────────────
-            tools            = get_all_tools()
-            reasoning_config = get_reasoning_config()
-            yield f"data: {json.dumps({'type':'reasoning_config', **reasoning_config, 'has_document':True})}\n\n"
-
-            first_stream = client.responses.create(
-                model     = model_name,
-                tools     = tools,
-                input     = input_messages,
-                reasoning = reasoning_config,
-                stream    = True,
-            )
-
-            # ── 3. Stream-state vars ────────────────────────────────────
-            first_response_id: str | None = None
-            reasoning_started = content_started = False
-            tool_meta: dict[str, dict] = {}      # item_id ➜ {name, call_id, arguments}
-            tool_outputs: list          = []     # payload for second call
-            tool_invoked: bool          = False
-
-            # ── 4. FIRST stream loop ────────────────────────────────────
-            for event in first_stream:
-                logger.info(f"[COT UPLOAD DEBUG] {event.type}")
-
-                # lifecycle
-                if event.type == "response.created":
-                    first_response_id = getattr(event, "response_id", None) or getattr(event.response, "id", None)
-                    yield f"data: {json.dumps({'type':'stream_created'})}\n\n"
-                    continue
-                if event.type == "response.in_progress":
-                    yield f"data: {json.dumps({'type':'stream_progress'})}\n\n"
-                    continue
-
-                # detect new tool-calls
-                if event.type == "response.output_item.added":
-                    itm = getattr(event, "item", None) or getattr(event, "output_item", None)
-                    if itm and getattr(itm, "type", None) == "function_call":
-                        tool_meta[itm.id] = {"name": itm.name,
-                                             "call_id": itm.call_id,
-                                             "arguments": ""}
-                        yield f"data: {json.dumps({'type':'document_function_call_added','function':itm.name,'call_id':itm.call_id})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type':'output_item_added'})}\n\n"
-                    continue
-
-                if event.type == "response.output_item.done":
-                    itm = getattr(event, "item", None) or getattr(event, "output_item", None)
-                    if itm and getattr(itm, "type", None) == "function_call":
-                        yield f"data: {json.dumps({'type':'document_function_call_done','function':itm.name,'call_id':itm.call_id})}\n\n"
-                    else:
-                        yield f"data: {json.dumps({'type':'output_item_done'})}\n\n"
-                    continue
-
-                # text & reasoning deltas
-                if event.type == "response.reasoning_summary_text.delta":
-                    if not reasoning_started:
-                        yield f"data: {json.dumps({'type':'reasoning_start'})}\n\n"
-                        reasoning_started = True
-                    yield f"data: {json.dumps({'type':'reasoning','content':event.delta})}\n\n"
-                    await asyncio.sleep(0.01)
-                    continue
-
-                if event.type == "response.output_text.delta":
-                    if not content_started:
-                        if reasoning_started:
-                            yield f"data: {json.dumps({'type':'reasoning_end'})}\n\n"
-                        yield f"data: {json.dumps({'type':'content_start'})}\n\n"
-                        content_started = True
-                    yield f"data: {json.dumps({'type':'content','content':event.delta})}\n\n"
-                    await asyncio.sleep(0.01)
-                    continue
-
-                # argument chunks
-                if event.type == "response.function_call_arguments.delta":
-                    iid, delta = event.item_id, event.delta
-                    meta = tool_meta.setdefault(iid, {"name":"unknown_function",
-                                                      "call_id":"unknown",
-                                                      "arguments":""})
-                    meta["arguments"] += delta
-                    yield f"data: {json.dumps({'type':'function_args_delta','call_id':iid,'delta':delta,'function':meta['name']})}\n\n"
-                    continue
-
-                if event.type == "response.function_call_arguments.done":
-                    iid  = event.item_id
-                    meta = tool_meta.get(iid, {})
-                    meta["arguments"] = getattr(event, "arguments", meta.get("arguments", ""))
-                    yield f"data: {json.dumps({'type':'function_args_complete','call_id':iid,'function':meta.get('name')})}\n\n"
-                    try:
-                        args_dict   = json.loads(meta["arguments"]) if meta["arguments"] else {}
-                        result      = call_function(meta["name"], **args_dict)
-                        tool_invoked = True
-                        tool_outputs.append({
-                            "type":  "function_call_output",
-                            "call_id": meta["call_id"],   # ★ use real call_id
-                            "output": json.dumps(result),
-                        })
-                        yield f"data: {json.dumps({'type':'function_result','function':meta['name'],'status':'completed'})}\n\n"
-                    except Exception as err:
-                        logger.error(f"Tool {meta['name']} failed: {err}")
-                        tool_invoked = True
-                        tool_outputs.append({
-                            "type":  "function_call_output",
-                            "call_id": meta["call_id"],   # ★ use real call_id
-                            "output": json.dumps({"error": str(err)}),
-                        })
-                        yield f"data: {json.dumps({'type':'function_result','function':meta['name'],'status':'error','error':str(err)})}\n\n"
-                    continue
-
-                # legacy single-chunk call
-                if event.type == "response.function_call":
-                    tool_invoked = True
-                    try:
-                        args = json.loads(event.arguments) if isinstance(event.arguments, str) else event.arguments
-                        result = call_function(event.name, **args)
-                        tool_outputs.append({
-                            "type":  "function_call_output",
-                            "call_id": event.call_id,
-                            "output": json.dumps(result),
-                        })
-                        yield f"data: {json.dumps({'type':'function_result','function':event.name,'status':'completed'})}\n\n"
-                    except Exception as err:
-                        logger.error(f"Tool {event.name} failed: {err}")
-                        tool_outputs.append({
-                            "type":  "function_call_output",
-                            "call_id": event.call_id,
-                            "output": json.dumps({"error": str(err)}),
-                        })
-                        yield f"data: {json.dumps({'type':'function_result','function':event.name,'status':'error','error':str(err)})}\n\n"
-                    continue
-
-                if event.type in ("response.completed", "response.done"):
-                    break
-
-            # ── 5. SECOND streaming call ─────────────────────────────────
-            if tool_invoked and tool_outputs and first_response_id:
-                yield f"data: {json.dumps({'type':'status','message':'Generating final answer...'})}\n\n"
-
-                second_stream = client.responses.create(
-                    model                 = model_name,
-                    previous_response_id  = first_response_id,
-                    input                 = tool_outputs,
-                    reasoning             = reasoning_config,
-                    stream                = True,
-                )
-
-                for ev in second_stream:
-                    logger.info(f"[COT UPLOAD FINAL DEBUG] {ev.type}")
-
-                    if ev.type == "response.output_text.delta":
-                        if not content_started:
-                            yield f"data: {json.dumps({'type':'content_start'})}\n\n"
-                            content_started = True
-                        yield f"data: {json.dumps({'type':'content','content':ev.delta})}\n\n"
-                        await asyncio.sleep(0.01)
-                        continue
-
-                    if ev.type == "response.reasoning_summary_text.delta":
-                        yield f"data: {json.dumps({'type':'reasoning','content':ev.delta})}\n\n"
-                        await asyncio.sleep(0.01)
-                        continue
-
-                    if ev.type in ("response.completed", "response.done"):
-                        break
-
-            # ── 6. Fallback & closing ───────────────────────────────────
-            if not content_started:
-                yield f"data: {json.dumps({'type':'content_start'})}\n\n"
-                fallback = f"I have analysed the document '{file.filename}' but need a more specific question."
-                yield f"data: {json.dumps({'type':'content','content':fallback})}\n\n"
-
-            if content_started:
-                yield f"data: {json.dumps({'type':'content_end'})}\n\n"
-
-            yield f"data: {json.dumps({'type':'analysis_summary','document_processed':True,'functions_called':len(tool_outputs),'filename':file.filename})}\n\n"
-            yield f"data: {json.dumps({'type':'done','done':True})}\n\n"
+            yield {'type':'conversation','conversation_id':conversation.conversation_id,
+                   'continued':conversation.continued}
+            requested_reasoning = get_reasoning_config()
+            reasoning_config, _ = usage_ledger.plan(current_user(), requested_reasoning)   # run_turn admits it
+            cache_key = response_cache_key("/chat/upload-cot-stream", message, scenario, conversation,
+                                           history=history, reasoning=reasoning_config, document=pdf_bytes)
+            presenter = TurnPresenter(call_prefix="document_")
+
+            async def answer() -> AsyncGenerator[dict, None]:
+                # ── 2. Read PDF & build prompt ──────────────────────────
+                pages            = await extract_pages_from_pdf(pdf_bytes, "/chat/upload-cot-stream")
+                document_context = build_document_context(pages, message)
+                yield {'type':'file_processed','filename':file.filename,
+                       'content_length':len(join_pages(pages)), **document_context.summary()}
+
+                prompt = build_upload_input(document_context, message, scenario, history_window(history).items)
+
+                # ── 3. Stream the turn ──────────────────────────────────
+                yield {'type':'reasoning_config', **reasoning_config, 'has_document':True}
+                events = conversation_turn("/chat/upload-cot-stream", conversation, [prompt.user_item],
+                                           prompt.items, scenario, tools=get_all_tools(),
+                                           reasoning=requested_reasoning, prefix_key=prompt.prefix_key)
+                async for payload in presenter.present(events):
+                    yield payload
+                if not chained:
+                    refresh_history(history, message, presenter.finished)
+
+                # ── 4. Fallback & closing ───────────────────────────────
+                if not presenter.content_started:
+                    yield {'type':'content_start'}
+                    fallback = f"I have analysed the document '{file.filename}' but need a more specific question."
+                    yield {'type':'content','content':fallback}
+
+                yield {'type':'content_end'}
+
+                functions_called = len(presenter.finished.tool_results)
+                yield {'type':'analysis_summary','document_processed':True,'functions_called':functions_called,'filename':file.filename}
+                yield {'type':'done','done':True}
+
+            # The same question about the same document is answered from the recorded stream
+            async for payload in cached_stream("/chat/upload-cot-stream", cache_key, conversation, answer,
+                                               lambda: presenter.finished.response_id):
+                yield payload
 
         except Exception as e:
             logger.error(f"Error in CoT upload streaming: {e}")
-            yield f"data: {json.dumps({'type':'error','error':str(e)})}\n\n"
+            yield {'type':'error','error':str(e)}
 
     # ── return as SSE stream ──────────────────────────────────────────────
-    return StreamingResponse(
-        generate_cot_upload_response(),
-        media_type="text/plain",
-        headers={
-            "Cache-Control":               "no-cache",
-            "Connection":                  "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-        },
+    return event_stream_response(http_request, generate_cot_upload_response)
+
+# ── Batch processing ─────────────────────────────────────────────────────
+BATCH_INPUT_DIR = os.getenv("BATCH_INPUT_DIR", "../Contoso_Request_Letters")   # the only tree /api/batch reads
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", "batch_output")
+batch_jobs: dict[str, BatchJob] = {}
+batch_tasks: dict[str, asyncio.Task] = {}
+
+@app.post("/api/batch")
+async def create_batch_job(request: BatchJobRequest):
+    """Start processing a set of request letters in the background"""
+    try:
+        files = resolve_letters(BATCH_INPUT_DIR, request.paths)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not files:
+        raise HTTPException(status_code=400, detail="No PDF files found")
+
+    if request.job_id in batch_tasks:
+        raise HTTPException(status_code=409, detail=f"Batch job {request.job_id} is still running")
+    job = BatchJob(files=files, output_path="", **({"job_id": request.job_id} if request.job_id else {}))
+    job.output_path = os.path.join(BATCH_OUTPUT_DIR, f"{job.job_id}.jsonl")   # a resumed job skips what succeeded
+
+    message = request.message or BATCH_DEFAULT_MESSAGE
+    runner = BatchRunner(
+        pdf_extractor,
+        lambda filename, pages: process_letter(filename, pages, message=message, scenario=request.scenario),
+        **({"concurrency": request.concurrency} if request.concurrency else {}),
     )
+    batch_jobs[job.job_id] = job
+    task = asyncio.create_task(runner.run(job))
+    batch_tasks[job.job_id] = task
+    task.add_done_callback(lambda _: batch_tasks.pop(job.job_id, None))
+    return job.progress()
+
+@app.get("/api/batch")
+async def list_batch_jobs():
+    """Progress of every batch job started by this process"""
+    return {"jobs": [job.progress() for job in batch_jobs.values()]}
+
+@app.get("/api/batch/{job_id}")
+async def get_batch_job(job_id: str):
+    """Progress of one batch job"""
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    return job.progress()
+
+@app.on_event("shutdown")
+async def cancel_batch_jobs():
+    """Stop running batch jobs; POST /api/batch with their job_id resumes them"""
+    for task in list(batch_tasks.values()):
+        task.cancel()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,270 @@
+# metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+A deliberately small counter / gauge / histogram implementation (no client
+library dependency) rendered by the ``/metrics`` endpoint. Metrics are
+updated from the event loop only.
+
+``observe_turn`` wraps a ``TurnEngine.run`` event stream and records the
+latency breakdown of a chat turn: time to the first ``response.created``,
+to the first reasoning and content deltas, the gap between the first and the
+follow-up ``responses.create``, per-tool execution time and the total turn
+duration.
+"""
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterable, Optional
+
+from tool_registry import registry as tool_registry
+from turn_engine import (
+    ContentDelta,
+    FunctionResult,
+    ReasoningDelta,
+    StreamCreated,
+    TurnEvent,
+    TurnFinished,
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """Exposition lines of every labelled series"""
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down (or be set at scrape time)"""
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: dict[tuple, list[int]] = {}
+        self._sums: dict[tuple, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * len(self.buckets)
+            self._sums[key] = 0.0
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        self._sums[key] += value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), []))
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        return "".join(metric.render() for metric in self._metrics.values())
+
+
+default_registry = MetricsRegistry()
+
+TURN_LABELS = ("endpoint", "scenario", "effort")
+
+TURNS = default_registry.counter(
+    "chat_turns_total", "Chat turns by outcome", TURN_LABELS + ("outcome",))
+TIME_TO_RESPONSE_CREATED = default_registry.histogram(
+    "chat_time_to_response_created_seconds", "Turn start to the first response.created event", TURN_LABELS)
+TIME_TO_FIRST_REASONING = default_registry.histogram(
+    "chat_time_to_first_reasoning_seconds", "Turn start to the first reasoning summary delta", TURN_LABELS)
+TIME_TO_FIRST_CONTENT = default_registry.histogram(
+    "chat_time_to_first_content_seconds", "Turn start to the first output text delta", TURN_LABELS)
+FOLLOW_UP_GAP = default_registry.histogram(
+    "chat_follow_up_gap_seconds", "Time between the first and the second responses.create", TURN_LABELS)
+TURN_DURATION = default_registry.histogram(
+    "chat_turn_duration_seconds", "Total duration of a chat turn including tool rounds", TURN_LABELS)
+TOOL_DURATION = default_registry.histogram(
+    "tool_execution_seconds", "Tool execution time (tools not in the registry count as \"unknown\")",
+    TURN_LABELS + ("tool", "status"))
+PDF_EXTRACTION = default_registry.histogram(
+    "pdf_extraction_seconds", "PDF text extraction time (including cache hits)", ("endpoint",))
+STREAM_DURATION = default_registry.histogram(
+    "stream_duration_seconds", "Lifetime of a streamed response", ("endpoint",))
+STREAM_BYTES = default_registry.counter(
+    "stream_bytes_total", "Bytes of SSE frames produced", ("endpoint",))
+STREAMS_CANCELLED = default_registry.counter(
+    "streams_cancelled_total", "Streams cancelled because the client disconnected", ("endpoint",))
+TOKENS = default_registry.counter(
+    "chat_tokens_total", "Tokens reported by response.completed, by kind (input, cached_input, reasoning, output)",
+    ("endpoint", "scenario", "round", "kind"))
+TOKEN_COST = default_registry.counter(
+    "chat_token_cost_usd_total", "Estimated token cost in USD from the configured prices", ("endpoint", "scenario"))
+PROMPT_CACHE_LOOKUPS = default_registry.counter(
+    "prompt_cache_lookups_total", "Responses by upstream prompt cache result (hit: some input tokens were cached, "
+    "ineligible: prompt below the provider's caching minimum)", ("endpoint", "result"))
+CONVERSATION_TURNS = default_registry.counter(
+    "conversation_turns_total", "Turns by history mode (chained from the last response, full input, or fallback "
+    "to full input after the upstream rejected previous_response_id)", ("endpoint", "mode"))
+MODEL_BACKEND_REQUESTS = default_registry.counter(
+    "model_backend_requests_total", "Response attempts per model backend (throttled: 429, error: 5xx or connection "
+    "error, rejected: other 4xx)", ("backend", "outcome"))
+RESPONSE_CACHE = default_registry.counter(
+    "response_cache_lookups_total", "Response cache lookups of stateless turns (hit: answer served without a "
+    "model call)", ("endpoint", "result"))
+TOKEN_BUDGET_ACTIONS = default_registry.counter(
+    "token_budget_actions_total", "Turns rejected or downgraded by the daily token budget", ("action",))
+
+
+def tool_label(name: str) -> str:
+    """The tool's name if it is registered, so model-invented names cannot grow the label set"""
+    return name if name in tool_registry else "unknown"
+
+
+def observe_stream(endpoint: str, duration: float, size: int, cancelled: bool) -> None:
+    """Record a finished stream session"""
+    STREAM_DURATION.observe(duration, endpoint=endpoint)
+    STREAM_BYTES.inc(size, endpoint=endpoint)
+    if cancelled:
+        STREAMS_CANCELLED.inc(endpoint=endpoint)
+
+
+async def observe_turn(
+    events: AsyncIterator[TurnEvent],
+    endpoint: str,
+    scenario: str = "default",
+    effort: str = "none",
+) -> AsyncIterator[TurnEvent]:
+    """Pass turn events through unchanged while recording the latency breakdown"""
+    labels = {"endpoint": endpoint, "scenario": scenario, "effort": effort}
+    started = time.monotonic()
+    first_request: Optional[float] = None
+    seen_created = seen_reasoning = seen_content = False
+    outcome = "cancelled"
+    try:
+        async for event in events:
+            if isinstance(event, StreamCreated):
+                if not seen_created:
+                    seen_created = True
+                    TIME_TO_RESPONSE_CREATED.observe(time.monotonic() - started, **labels)
+                if event.round == 0:
+                    first_request = event.requested_at
+                elif event.round == 1 and first_request is not None and event.requested_at is not None:
+                    FOLLOW_UP_GAP.observe(event.requested_at - first_request, **labels)
+            elif isinstance(event, ReasoningDelta) and not seen_reasoning:
+                seen_reasoning = True
+                TIME_TO_FIRST_REASONING.observe(time.monotonic() - started, **labels)
+            elif isinstance(event, ContentDelta) and not seen_content:
+                seen_content = True
+                TIME_TO_FIRST_CONTENT.observe(time.monotonic() - started, **labels)
+            elif isinstance(event, FunctionResult):
+                result = event.result
+                TOOL_DURATION.observe(result.duration, **labels, tool=tool_label(result.name),
+                                      status="ok" if result.ok else "error")
+            elif isinstance(event, TurnFinished):
+                outcome = event.stop_reason or "completed"
+            yield event
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        TURN_DURATION.observe(time.monotonic() - started, **labels)
+        TURNS.inc(**labels, outcome=outcome)
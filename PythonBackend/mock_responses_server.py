@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Azure OpenAI Responses streaming API
+
+Serves ``POST .../responses`` with realistic ``response.*`` event sequences -
+a reasoning summary phase, function calls on the first response when tools
+are offered, then output text - paced at a configurable token rate, so the
+backend can be load-tested and regression-tested without an Azure endpoint:
+
+    python mock_responses_server.py --port 8100 --tokens-per-second 80
+
+    # in another terminal
+    AZURE_OPENAI_ENDPOINT=http://localhost:8100/openai/v1/ AZURE_OPENAI_API_KEY=mock python main.py
+
+Requests that hand back tool results (``function_call_output`` items) and
+requests with ``tool_choice="none"`` always answer with text, like the real
+model after its tool results came back. A ``previous_response_id`` the mock
+did not issue is answered with 404, as for an expired upstream response.
+Throttling is simulated with 429 and a Retry-After header, either at random
+or once ``max_in_flight`` streams are open; run one mock per port
+to stand in for a pool of deployments.
+
+Usage reports simulated prompt caching: the tools and leading input items a
+previous request already sent count as cached input tokens (in 128-token
+blocks, from 1024 tokens on).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the request letter asks for records covering the period under review and the compliance team "
+    "has confirmed that the relevant policies were applied consistently across all affected accounts"
+).split()
+
+
+@dataclass
+class MockProfile:
+    """
+    Shape and pacing of the mock model's responses
+
+    Args:
+        tokens_per_second: Delta rate for reasoning and output text (0 = no pacing)
+        first_event_delay: Seconds before ``response.created`` (queueing / connection setup)
+        reasoning_tokens: Reasoning summary deltas per response (0 = no reasoning phase)
+        answer_tokens: Output text deltas per response
+        tool_call_rate: Fraction of first responses that call tools when tools are offered
+        tool_calls: Function calls per tool round
+        tool_name: Tool to call (falls back to the first offered function)
+        tool_arguments: JSON arguments sent with each call
+        error_rate: Fraction of requests answered with HTTP 500
+        throttle_rate: Fraction of requests answered with HTTP 429
+        max_in_flight: Open streams beyond which requests get HTTP 429 (0 = unlimited)
+        retry_after: Retry-After seconds sent with a 429
+    """
+    tokens_per_second: float = 100.0
+    first_event_delay: float = 0.2
+    reasoning_tokens: int = 30
+    answer_tokens: int = 120
+    tool_call_rate: float = 1.0
+    tool_calls: int = 1
+    tool_name: str = "get_user_info"
+    tool_arguments: str = "{}"
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    max_in_flight: int = 0
+    retry_after: float = 1.0
+
+
+class MockResponses:
+    """Builds the event sequence of one response and keeps serving counters"""
+
+    def __init__(self, profile: MockProfile, seed: Optional[int] = None):
+        self.profile = profile
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.in_flight = 0
+        self.errors = 0
+        self.throttled = 0
+        self.chained = 0
+        self._issued: "OrderedDict[str, None]" = OrderedDict()   # response ids for previous_response_id
+        self._prefixes: "OrderedDict[str, None]" = OrderedDict()  # digests of prompt prefixes seen
+
+    def issue(self, response_id: str) -> None:
+        self._issued[response_id] = None
+        if len(self._issued) > 100_000:
+            self._issued.popitem(last=False)
+
+    def knows(self, response_id: str) -> bool:
+        return response_id in self._issued
+
+    def cached_tokens(self, request: dict) -> int:
+        """Tokens of the longest prompt prefix (tools, then input items) sent before"""
+        input_items = request.get("input", "")
+        parts = [json.dumps(request.get("tools", []))]
+        parts += [json.dumps(item) for item in input_items] if isinstance(input_items, list) else [json.dumps(input_items)]
+        digest, tokens, cached = hashlib.sha256(), 0, 0
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            tokens += len(part) // 4
+            key = digest.hexdigest()
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                cached = tokens
+            else:
+                self._prefixes[key] = None
+                if len(self._prefixes) > 100_000:
+                    self._prefixes.popitem(last=False)
+        return cached // 128 * 128 if cached >= 1024 else 0
+
+    def _pick_tool(self, request: dict) -> Optional[str]:
+        input_items = request.get("input")
+        tool_results = isinstance(input_items, list) and any(
+            isinstance(item, dict) and item.get("type") == "function_call_output" for item in input_items)
+        if not request.get("tools") or tool_results or request.get("tool_choice") == "none":
+            return None
+        if self.random.random() >= self.profile.tool_call_rate:
+            return None
+        names = [tool.get("name") for tool in request["tools"] if tool.get("type") == "function"]
+        if not names:
+            return None
+        return self.profile.tool_name if self.profile.tool_name in names else names[0]
+
+    def _words(self, count: int) -> list[str]:
+        return [(" " if i else "") + self.random.choice(WORDS) for i in range(count)]
+
+    async def events(self, request: dict) -> AsyncIterator[dict]:
+        """The ``response.*`` events of one streamed response"""
+        profile = self.profile
+        delay = 1 / profile.tokens_per_second if profile.tokens_per_second > 0 else 0
+        response_id = f"resp_{uuid.uuid4().hex}"
+        self.issue(response_id)
+        response = {
+            "id": response_id,
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "in_progress",
+            "model": request.get("model", "mock"),
+            "output": [],
+            "previous_response_id": request.get("previous_response_id"),
+            "usage": None,
+        }
+        seq = itertools.count()
+        tool = self._pick_tool(request)
+        cached_tokens = self.cached_tokens(request)
+        output: list[dict] = []
+
+        if profile.first_event_delay:
+            await asyncio.sleep(profile.first_event_delay)
+        yield {"type": "response.created", "sequence_number": next(seq), "response": response}
+        yield {"type": "response.in_progress", "sequence_number": next(seq), "response": response}
+
+        index = 0
+        effort = (request.get("reasoning") or {}).get("effort")
+        reasoning_tokens = profile.reasoning_tokens if effort else 0
+        if reasoning_tokens:
+            item = {"type": "reasoning", "id": f"rs_{uuid.uuid4().hex}", "summary": []}
+            yield {"type": "response.output_item.added", "sequence_number": next(seq), "output_index": index, "item": item}
+            text = []
+            for word in self._words(reasoning_tokens):
+                await asyncio.sleep(delay)
+                text.append(word)
+                yield {"type": "response.reasoning_summary_text.delta", "sequence_number": next(seq),
+                       "item_id": item["id"], "output_index": index, "summary_index": 0, "delta": word}
+            yield {"type": "response.reasoning_summary_text.done", "sequence_number": next(seq),
+                   "item_id": item["id"], "output_index": index, "summary_index": 0, "text": "".join(text)}
+            item = {**item, "summary": [{"type": "summary_text", "text": "".join(text)}]}
+            yield {"type": "response.output_item.done", "sequence_number": next(seq), "output_index": index, "item": item}
+            output.append(item)
+            index += 1
+
+        answer_tokens = 0
+        if tool:
+            for _ in range(profile.tool_calls):
+                item = {"type": "function_call", "id": f"fc_{uuid.uuid4().hex}", "call_id": f"call_{uuid.uuid4().hex[:24]}",
+                        "name": tool, "arguments": "", "status": "in_progress"}
+                yield {"type": "response.output_item.added", "sequence_number": next(seq), "output_index": index, "item": item}
+                await asyncio.sleep(delay)
+                yield {"type": "response.function_call_arguments.delta", "sequence_number": next(seq),
+                       "item_id": item["id"], "output_index": index, "delta": profile.tool_arguments}
+                yield {"type": "response.function_call_arguments.done", "sequence_number": next(seq),
+                       "item_id": item["id"], "output_index": index, "arguments": profile.tool_arguments}
+                item = {**item, "arguments": profile.tool_arguments, "status": "completed"}
+                yield {"type": "response.output_item.done", "sequence_number": next(seq), "output_index": index, "item": item}
+                output.append(item)
+                index += 1
+        else:
+            item = {"type": "message", "id": f"msg_{uuid.uuid4().hex}", "role": "assistant", "status": "in_progress", "content": []}
+            yield {"type": "response.output_item.added", "sequence_number": next(seq), "output_index": index, "item": item}
+            part = {"type": "output_text", "text": "", "annotations": []}
+            yield {"type": "response.content_part.added", "sequence_number": next(seq), "item_id": item["id"],
+                   "output_index": index, "content_index": 0, "part": part}
+            text = []
+            for word in self._words(profile.answer_tokens):
+                await asyncio.sleep(delay)
+                text.append(word)
+                yield {"type": "response.output_text.delta", "sequence_number": next(seq), "item_id": item["id"],
+                       "output_index": index, "content_index": 0, "delta": word}
+            answer_tokens = len(text)
+            part = {**part, "text": "".join(text)}
+            yield {"type": "response.output_text.done", "sequence_number": next(seq), "item_id": item["id"],
+                   "output_index": index, "content_index": 0, "text": part["text"]}
+            yield {"type": "response.content_part.done", "sequence_number": next(seq), "item_id": item["id"],
+                   "output_index": index, "content_index": 0, "part": part}
+            item = {**item, "status": "completed", "content": [part]}
+            yield {"type": "response.output_item.done", "sequence_number": next(seq), "output_index": index, "item": item}
+            output.append(item)
+
+        input_tokens = len(json.dumps(request.get("input", ""))) // 4 + len(json.dumps(request.get("tools", []))) // 4
+        output_tokens = reasoning_tokens + answer_tokens + (profile.tool_calls * 10 if tool else 0)
+        usage = {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": min(cached_tokens, input_tokens)},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": reasoning_tokens},
+            "total_tokens": input_tokens + output_tokens,
+        }
+        yield {"type": "response.completed", "sequence_number": next(seq),
+               "response": {**response, "status": "completed", "output": output, "usage": usage}}
+
+    async def frames(self, request: dict) -> AsyncIterator[str]:
+        self.in_flight += 1
+        try:
+            async for event in self.events(request):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.in_flight -= 1
+
+    async def complete(self, request: dict) -> dict:
+        """Non-streaming request: the response object of the final event"""
+        final = {}
+        async for event in self.events(request):
+            final = event
+        return final["response"]
+
+
+def create_app(profile: Optional[MockProfile] = None, seed: Optional[int] = None) -> FastAPI:
+    """ASGI app answering ``POST <any prefix>/responses`` like the Responses API"""
+    mock = MockResponses(profile or MockProfile(), seed)
+    app = FastAPI(title="Mock Responses API")
+    app.state.mock = mock
+
+    async def create_response(request: Request):
+        body = await request.json()
+        mock.requests += 1
+        if mock.random.random() < mock.profile.error_rate:
+            mock.errors += 1
+            return JSONResponse({"error": {"message": "Injected mock failure", "type": "server_error"}}, status_code=500)
+        if (mock.random.random() < mock.profile.throttle_rate
+                or 0 < mock.profile.max_in_flight <= mock.in_flight):
+            mock.throttled += 1
+            return JSONResponse({"error": {"message": "Rate limit exceeded", "type": "rate_limit_exceeded",
+                                           "code": "429"}},
+                                status_code=429, headers={"Retry-After": f"{mock.profile.retry_after:g}"})
+        previous = body.get("previous_response_id")
+        if previous:
+            if not mock.knows(previous):
+                return JSONResponse({"error": {"message": f"Previous response with id '{previous}' not found.",
+                                               "type": "invalid_request_error", "param": "previous_response_id",
+                                               "code": "previous_response_not_found"}}, status_code=404)
+            mock.chained += 1
+        if not body.get("stream"):
+            return JSONResponse(await mock.complete(body))
+        return StreamingResponse(mock.frames(body), media_type="text/event-stream")
+
+    app.add_api_route("/responses", create_response, methods=["POST"])
+    app.add_api_route("/{prefix:path}/responses", create_response, methods=["POST"])
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": mock.requests, "in_flight": mock.in_flight, "errors": mock.errors,
+                "throttled": mock.throttled, "chained": mock.chained}
+
+    return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = MockProfile()
+    parser = argparse.ArgumentParser(description="Serve a mock Responses streaming API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second,
+                        help="Delta rate for reasoning and output text (0 = unpaced)")
+    parser.add_argument("--first-event-delay", type=float, default=defaults.first_event_delay,
+                        help="Seconds before response.created")
+    parser.add_argument("--reasoning-tokens", type=int, default=defaults.reasoning_tokens,
+                        help="Reasoning summary deltas when the request asks for reasoning")
+    parser.add_argument("--answer-tokens", type=int, default=defaults.answer_tokens)
+    parser.add_argument("--tool-call-rate", type=float, default=defaults.tool_call_rate,
+                        help="Fraction of first responses that call tools when tools are offered")
+    parser.add_argument("--tool-calls", type=int, default=defaults.tool_calls, help="Function calls per tool round")
+    parser.add_argument("--tool-name", default=defaults.tool_name)
+    parser.add_argument("--tool-arguments", default=defaults.tool_arguments)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate,
+                        help="Fraction of requests answered with 429")
+    parser.add_argument("--max-in-flight", type=int, default=defaults.max_in_flight,
+                        help="Open streams beyond which requests get 429 (0 = unlimited)")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    profile = MockProfile(
+        tokens_per_second=args.tokens_per_second,
+        first_event_delay=args.first_event_delay,
+        reasoning_tokens=args.reasoning_tokens,
+        answer_tokens=args.answer_tokens,
+        tool_call_rate=args.tool_call_rate,
+        tool_calls=args.tool_calls,
+        tool_name=args.tool_name,
+        tool_arguments=args.tool_arguments,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        max_in_flight=args.max_in_flight,
+        retry_after=args.retry_after,
+    )
+    print(f"🧪 Mock Responses API on http://{args.host}:{args.port}/openai/v1/ ({profile})")
+    uvicorn.run(create_app(profile, args.seed), host=args.host, port=args.port, log_level="warning")
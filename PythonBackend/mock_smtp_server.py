@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Minimal local SMTP server for testing the e-mail outbox
+
+Speaks enough SMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT; no STARTTLS or AUTH), records every accepted message and can inject
+failures:
+
+    python mock_smtp_server.py --port 8025
+
+    # in another terminal
+    EMAIL_MODE=production SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_STARTTLS=false python main.py
+"""
+
+import argparse
+import socketserver
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class ReceivedMessage:
+    mail_from: str
+    rcpt_tos: list[str]
+    data: str
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "_Server"
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self) -> None:
+        mock = self.server.mock
+        with mock.lock:
+            mock.connections += 1
+        self.reply("220 mock-smtp ready")
+        mail_from, rcpt_tos = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode("utf-8", "replace").rstrip("\r\n")
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-mock-smtp")
+                self.reply("250 8BITMIME")
+            elif verb == "HELO":
+                self.reply("250 mock-smtp")
+            elif verb == "MAIL":
+                mail_from, rcpt_tos = command.split(":", 1)[1].strip().strip("<>"), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_tos.append(command.split(":", 1)[1].strip().strip("<>"))
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                code, drop = mock._next_outcome()
+                if drop:
+                    return  # close the connection without answering
+                if code == 250:
+                    with mock.lock:
+                        mock.messages.append(ReceivedMessage(mail_from, rcpt_tos, b"".join(lines).decode("utf-8", "replace")))
+                    self.reply("250 OK: queued")
+                else:
+                    self.reply(f"{code} Injected failure")
+                mail_from, rcpt_tos = None, []
+            elif verb in ("RSET", "NOOP"):
+                mail_from, rcpt_tos = (None, []) if verb == "RSET" else (mail_from, rcpt_tos)
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    mock: "MockSMTPServer"
+
+
+class MockSMTPServer:
+    """
+    Threaded SMTP stand-in
+
+    Args:
+        host, port: Address to listen on (port 0 picks a free port)
+        failures: Reply codes for the next DATA commands, in order (e.g. [451, 451]),
+            or "drop" to close the connection instead of answering
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, failures: Optional[list] = None):
+        self.messages: list[ReceivedMessage] = []
+        self.connections = 0
+        self.failures = list(failures or [])
+        self.lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.mock = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self._server.server_address[:2]
+
+    def _next_outcome(self) -> tuple[int, bool]:
+        with self.lock:
+            outcome = self.failures.pop(0) if self.failures else 250
+        return (0, True) if outcome == "drop" else (int(outcome), False)
+
+    def start(self) -> "MockSMTPServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockSMTPServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local SMTP stand-in that accepts and prints mail")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    server = MockSMTPServer(args.host, args.port)
+    print(f"📮 Mock SMTP server on {args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📬 {len(server.messages)} message(s) received over {server.connections} connection(s)")
+        for message in server.messages:
+            print(f"  {message.mail_from} ➜ {message.rcpt_tos}")
@@ -0,0 +1,361 @@
+# model_pool.py
+"""
+Pool of model backends with least-outstanding-requests routing and failover.
+
+A single deployment that is throttled (429) or failing makes every user wait.
+``ModelPool`` spreads responses over several backends - each an endpoint and
+deployment with a weight and a capacity - and stands in for the client's
+``responses`` resource, so ``TurnEngine`` runs against it unchanged:
+
+    pool = ModelPool([Backend("east", east_client, "o3", weight=2), Backend("west", west_client, "o3")])
+    stream = await pool.responses.create(model="o3", input=..., stream=True)
+
+Each request goes to the available backend with the fewest outstanding
+requests relative to its weight. A 429 ejects the backend for its
+Retry-After (at least the cool-down); 5xx and connection errors eject it
+after ``eject_after`` consecutive failures, with the cool-down doubling on
+each repeated ejection. When a cool-down ends the backend is probed with a
+single request before it takes traffic again. Failures before the first
+event of a stream are retried transparently on another backend; once an
+event was delivered, errors surface to the caller.
+
+Responses chained with ``previous_response_id`` only exist on the backend
+that created them, so such requests go back to that backend first. When it
+is unavailable the request goes elsewhere and the upstream's 404 lets the
+conversation fall back to resending its history.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Optional
+from urllib.parse import urlparse
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_COOLDOWN = float(os.getenv("MODEL_POOL_COOLDOWN_SECONDS", "10"))
+DEFAULT_POOL_MAX_COOLDOWN = float(os.getenv("MODEL_POOL_MAX_COOLDOWN_SECONDS", "300"))
+DEFAULT_POOL_EJECT_AFTER = int(os.getenv("MODEL_POOL_EJECT_AFTER", "3"))      # consecutive 5xx / connection errors
+DEFAULT_POOL_MAX_ATTEMPTS = int(os.getenv("MODEL_POOL_MAX_ATTEMPTS", "3"))    # backends tried per request
+DEFAULT_POOL_AFFINITY_ENTRIES = int(os.getenv("MODEL_POOL_AFFINITY_ENTRIES", "100000"))
+
+
+@dataclass
+class BackendConfig:
+    """One entry of the ``MODEL_POOL`` setting"""
+    endpoint: str
+    deployment: str
+    name: str = ""
+    weight: float = 1.0
+    capacity: int = 0                 # max outstanding requests (0 = unbounded)
+    api_key: Optional[str] = None     # None uses the shared Azure Identity credential
+    max_retries: int = 0              # SDK retries on the same backend before failing over
+
+
+def parse_backends(raw: str) -> list[BackendConfig]:
+    """
+    Backends from a JSON list, e.g.
+    MODEL_POOL='[{"endpoint": "https://east.openai.azure.com/openai/v1/", "deployment": "o3", "weight": 2}]'
+
+    Raises:
+        ValueError: If the setting is not a non-empty list of valid backends
+    """
+    try:
+        entries = json.loads(raw)
+        if not isinstance(entries, list) or not entries:
+            raise ValueError("expected a non-empty JSON list")
+        configs = [BackendConfig(**entry) for entry in entries]
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid MODEL_POOL setting: {e}") from e
+    for config in configs:
+        if not config.endpoint or not config.deployment:
+            raise ValueError("Invalid MODEL_POOL setting: every backend needs an endpoint and a deployment")
+        if config.weight <= 0 or config.capacity < 0:
+            raise ValueError(f"Invalid MODEL_POOL setting: bad weight or capacity for {config.endpoint}")
+        config.name = config.name or f"{urlparse(config.endpoint).hostname}/{config.deployment}"
+    names = [config.name for config in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Invalid MODEL_POOL setting: duplicate backend names {names}")
+    return configs
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the upstream asked us to wait (Retry-After headers), if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers.get(header)) * scale
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether another backend may succeed where this one failed (throttling, server or network errors)"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, asyncio.TimeoutError))
+
+
+@dataclass(eq=False)
+class Backend:
+    """A deployment requests can be routed to, and its health"""
+    name: str
+    client: Any                       # AsyncAzureOpenAI (or compatible)
+    deployment: str
+    weight: float = 1.0
+    capacity: int = 0
+    outstanding: int = 0
+    failures: int = 0                 # consecutive retryable failures
+    ejected_until: float = 0.0        # cool-down end; > 0 while ejected or being probed
+    ejection_streak: int = 0          # ejections since the last success (doubles the cool-down)
+    requests: int = 0
+    errors: int = 0
+    throttled: int = 0
+    ejections: int = 0
+
+    def load(self) -> float:
+        return (self.outstanding + 1) / self.weight
+
+    def state(self, now: float) -> str:
+        if not self.ejected_until:
+            return "healthy"
+        return "ejected" if now < self.ejected_until else "probing"
+
+    def available(self, now: float) -> bool:
+        state = self.state(now)
+        if state == "ejected" or (state == "probing" and self.outstanding):
+            return False   # one probe at a time after a cool-down
+        return not self.capacity or self.outstanding < self.capacity
+
+    def stats(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "deployment": self.deployment,
+            "weight": self.weight,
+            "capacity": self.capacity or None,
+            "state": self.state(now),
+            "ejected_for_seconds": round(max(self.ejected_until - now, 0), 1),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throttled": self.throttled,
+            "ejections": self.ejections,
+        }
+
+
+class _PooledStream:
+    """A backend's response stream, releasing the backend once closed"""
+
+    def __init__(self, pool: "ModelPool", backend: Backend, stream, first: Any):
+        self._pool = pool
+        self._backend = backend
+        self._stream = stream
+        self._first = first
+        self._closed = False
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._events()
+
+    async def _events(self) -> AsyncIterator[Any]:
+        if self._first is not None:
+            first, self._first = self._first, None
+            yield first
+        try:
+            async for event in self._stream:
+                self._pool._observe(self._backend, event)
+                yield event
+        except Exception as e:
+            if is_retryable(e):
+                self._pool._failed(self._backend, e)   # too late to fail over, but the backend is unhealthy
+            raise
+
+    async def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._pool._release(self._backend)
+            await self._stream.close()
+
+
+class _PoolResponses:
+    def __init__(self, pool: "ModelPool"):
+        self._pool = pool
+
+    async def create(self, **request):
+        return await self._pool.create(**request)
+
+
+class ModelPool:
+    """
+    Routes Responses API requests over several backends
+
+    Must be used from a single event loop.
+
+    Args:
+        backends: Backends to route over (at least one)
+        cooldown: Seconds a backend is ejected for (at least; doubles on repeats)
+        max_cooldown: Upper bound on the doubled cool-down
+        eject_after: Consecutive 5xx / connection errors that eject a backend
+        max_attempts: Backends tried per request before the error surfaces
+        affinity_entries: LRU bound on response ids remembered for routing chained requests
+        on_outcome: Told ``(backend name, outcome)`` for every attempt, with
+            outcome "ok", "throttled", "error" or "rejected" (a non-retryable 4xx)
+        clock: Monotonic time source (injectable for tests)
+    """
+
+    def __init__(
+        self,
+        backends: list[Backend],
+        cooldown: float = DEFAULT_POOL_COOLDOWN,
+        max_cooldown: float = DEFAULT_POOL_MAX_COOLDOWN,
+        eject_after: int = DEFAULT_POOL_EJECT_AFTER,
+        max_attempts: int = DEFAULT_POOL_MAX_ATTEMPTS,
+        affinity_entries: int = DEFAULT_POOL_AFFINITY_ENTRIES,
+        on_outcome: Optional[Callable[[str, str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not backends:
+            raise ValueError("A model pool needs at least one backend")
+        self.backends = backends
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.eject_after = eject_after
+        self.max_attempts = max_attempts
+        self.affinity_entries = affinity_entries
+        self.on_outcome = on_outcome
+        self.clock = clock
+        self.responses = _PoolResponses(self)   # drop-in for ``client.responses``
+        self._by_name = {backend.name: backend for backend in backends}
+        self._affinity: "OrderedDict[str, str]" = OrderedDict()   # response id -> backend name
+        self.failovers = 0
+
+    # -- routing ------------------------------------------------------------
+
+    def candidates(self, previous_response_id: Optional[str] = None) -> list[Backend]:
+        """Backends to try for a request, best first"""
+        now = self.clock()
+        ranked = sorted(self.backends, key=lambda b: (not b.available(now), b.state(now) == "ejected",
+                                                      b.load(), b.requests / b.weight))
+        owner = self._by_name.get(self._affinity.get(previous_response_id)) if previous_response_id else None
+        if owner is not None and owner.state(now) != "ejected":
+            ranked.remove(owner)
+            ranked.insert(0, owner)
+        return ranked[:max(self.max_attempts, 1)]
+
+    def _remember(self, response_id: Optional[str], backend: Backend) -> None:
+        if not response_id:
+            return
+        self._affinity[response_id] = backend.name
+        self._affinity.move_to_end(response_id)
+        while len(self._affinity) > self.affinity_entries:
+            self._affinity.popitem(last=False)
+
+    def _observe(self, backend: Backend, event: Any) -> None:
+        if getattr(event, "type", None) == "response.created":
+            self._remember(getattr(getattr(event, "response", None), "id", None), backend)
+
+    # -- health -------------------------------------------------------------
+
+    def _outcome(self, backend: Backend, outcome: str) -> None:
+        if self.on_outcome:
+            self.on_outcome(backend.name, outcome)
+
+    def _release(self, backend: Backend) -> None:
+        backend.outstanding = max(backend.outstanding - 1, 0)
+
+    def _succeeded(self, backend: Backend) -> None:
+        if backend.ejected_until:
+            logger.info(f"Model backend {backend.name} is healthy again")
+        backend.failures = 0
+        backend.ejected_until = 0.0
+        backend.ejection_streak = 0
+        self._outcome(backend, "ok")
+
+    def _eject(self, backend: Backend, seconds: float, reason: str) -> None:
+        backend.ejected_until = self.clock() + seconds
+        backend.ejection_streak += 1
+        backend.ejections += 1
+        backend.failures = 0
+        logger.warning(f"Ejecting model backend {backend.name} for {seconds:.1f}s: {reason}")
+
+    def _failed(self, backend: Backend, error: Exception) -> None:
+        cooldown = min(self.cooldown * 2 ** backend.ejection_streak, self.max_cooldown)
+        probing = backend.state(self.clock()) == "probing"
+        if getattr(error, "status_code", None) == 429:
+            backend.throttled += 1
+            self._outcome(backend, "throttled")
+            self._eject(backend, max(retry_after(error) or 0, cooldown), "throttled (429)")
+            return
+        backend.errors += 1
+        backend.failures += 1
+        self._outcome(backend, "error")
+        if probing or backend.failures >= self.eject_after:
+            self._eject(backend, cooldown, f"{type(error).__name__}: {error}")
+
+    # -- requests -----------------------------------------------------------
+
+    async def create(self, **request):
+        """``responses.create`` on the best backend, failing over before the first event"""
+        last_error: Optional[Exception] = None
+        for attempt, backend in enumerate(self.candidates(request.get("previous_response_id"))):
+            if attempt:
+                self.failovers += 1
+                logger.warning(f"Retrying response on model backend {backend.name} (attempt {attempt + 1})")
+            backend.outstanding += 1
+            backend.requests += 1
+            try:
+                result = await backend.client.responses.create(**{**request, "model": backend.deployment})
+                if not request.get("stream"):
+                    self._release(backend)
+                    self._remember(getattr(result, "id", None), backend)
+                    self._succeeded(backend)
+                    return result
+                try:
+                    first = await result.__anext__()
+                except StopAsyncIteration:
+                    first = None
+                except BaseException:
+                    await result.close()
+                    raise
+            except Exception as e:
+                self._release(backend)
+                if not is_retryable(e):
+                    self._outcome(backend, "rejected")
+                    raise
+                self._failed(backend, e)
+                last_error = e
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+            self._observe(backend, first)
+            self._succeeded(backend)
+            return _PooledStream(self, backend, result, first)
+        raise last_error
+
+    async def close(self) -> None:
+        """Close every backend's HTTP pool exactly once (backends may share one)"""
+        for backend in self.backends:
+            # The SDK client holds nothing but its HTTP pool, which the next backend may share
+            if not backend.client.is_closed():
+                await backend.client.close()
+
+    def available(self) -> int:
+        now = self.clock()
+        return sum(backend.state(now) != "ejected" for backend in self.backends)
+
+    def stats(self) -> dict:
+        now = self.clock()
+        return {
+            "backends": [backend.stats(now) for backend in self.backends],
+            "available": self.available(),
+            "failovers": self.failovers,
+            "affinity_entries": len(self._affinity),
+        }
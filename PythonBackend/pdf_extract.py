@@ -0,0 +1,151 @@
+# pdf_extract.py
+"""
+Off-loop PDF text extraction.
+
+PyPDF2 is pure Python and CPU bound, so extraction runs in a process pool
+with the pages of large documents split across workers. Results are cached by
+the SHA-256 of the PDF bytes: users re-upload the same letter constantly
+while iterating on a prompt, and a cache hit returns without touching PyPDF2.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import PyPDF2
+
+DEFAULT_PDF_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+DEFAULT_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+DEFAULT_PDF_CACHE_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", "128"))
+
+
+class PDFExtractionError(ValueError):
+    """Raised when a PDF cannot be parsed"""
+
+
+def _open(pdf_bytes: bytes) -> PyPDF2.PdfReader:
+    return PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+
+
+def extract_leading_pages(pdf_bytes: bytes, stop: int) -> tuple[int, list[str]]:
+    """Page count plus the text of the first ``stop`` pages (runs inside a worker process)"""
+    reader = _open(pdf_bytes)
+    page_count = len(reader.pages)
+    return page_count, [reader.pages[index].extract_text() or "" for index in range(min(stop, page_count))]
+
+
+def extract_page_range(pdf_bytes: bytes, start: int, stop: int) -> list[str]:
+    """Extract the text of pages [start, stop) (runs inside a worker process)"""
+    reader = _open(pdf_bytes)
+    return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+def extract_pages(pdf_bytes: bytes) -> list[str]:
+    """Extract every page in the current process"""
+    reader = _open(pdf_bytes)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def join_pages(pages: list[str]) -> str:
+    return "\n".join(pages).strip()
+
+
+def pdf_digest(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+class PDFTextExtractor:
+    """
+    Extract PDF text in a process pool with a content-hash cache
+
+    Args:
+        max_workers: Worker processes (the pool is created on first use)
+        pages_per_task: Pages handled by one worker task; larger documents are split
+        cache_size: Number of documents kept in the LRU cache
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_PDF_WORKERS,
+        pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+        cache_size: int = DEFAULT_PDF_CACHE_ENTRIES,
+    ):
+        self.max_workers = max_workers
+        self.pages_per_task = max(pages_per_task, 1)
+        self.cache_size = cache_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, list[str]]" = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    async def _extract_uncached(self, pdf_bytes: bytes) -> list[str]:
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        # The first task also reports the page count, so short documents (the
+        # common case) cost a single round trip to the pool
+        page_count, first = await loop.run_in_executor(pool, extract_leading_pages, pdf_bytes, self.pages_per_task)
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(self.pages_per_task, page_count, self.pages_per_task)
+        ]
+        rest = await asyncio.gather(*(
+            loop.run_in_executor(pool, extract_page_range, pdf_bytes, start, stop)
+            for start, stop in ranges
+        ))
+        return [page for chunk in (first, *rest) for page in chunk]
+
+    async def extract_pages(self, pdf_bytes: bytes) -> list[str]:
+        """Text of every page, from the cache when these exact bytes were seen before"""
+        digest = pdf_digest(pdf_bytes)
+        cached = self._cache.get(digest)
+        if cached is not None:
+            self._cache.move_to_end(digest)
+            self.hits += 1
+            return cached
+
+        pending = self._in_flight.get(digest)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[digest] = future
+        try:
+            pages = await self._extract_uncached(pdf_bytes)
+        except BaseException as e:
+            # Waiters get an extraction error even if the leading call was cancelled
+            error = PDFExtractionError(str(e) if isinstance(e, Exception) else "PDF extraction was cancelled")
+            future.set_exception(error)
+            future.exception()  # mark retrieved when nobody else is waiting
+            if isinstance(e, Exception):
+                raise error from e
+            raise
+        finally:
+            self._in_flight.pop(digest, None)
+
+        self._cache[digest] = pages
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        future.set_result(pages)
+        return pages
+
+    async def extract_text(self, pdf_bytes: bytes) -> str:
+        """Full document text, pages separated by newlines"""
+        return join_pages(await self.extract_pages(pdf_bytes))
+
+    def stats(self) -> dict:
+        return {"size": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,88 @@
+# prompt_layout.py
+"""
+Canonical prompt layout for upstream prompt caching.
+
+Providers cache the longest previously seen prefix of a request (in blocks,
+from about 1024 tokens on), so a prefix only pays off if it is byte-identical
+across requests. Every endpoint therefore assembles its input the same way:
+
+    1. the scenario's system prompt, exactly as in ``SYSTEM_PROMPTS``
+    2. the tool schemas (sent as the ``tools`` parameter; the same frozen list
+       from the registry for every endpoint)
+    3. scenario additions, e.g. the document instructions of the upload
+       endpoints, as separate system messages with fixed text
+    4. dynamic content: history summary, recent history, then the user message
+       (document excerpts included)
+
+Everything before the dynamic part is identified by a ``prefix_key``, which
+is used to book cached-token hit rates per prefix and can be passed upstream
+as ``prompt_cache_key``.
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Iterable, Optional, Union
+
+
+@dataclass
+class PromptInput:
+    """Input items of one turn in canonical order"""
+    items: list[dict] = field(default_factory=list)
+    prefix_key: str = ""       # identifies the static prefix (system prompt, tools, additions)
+    static_items: int = 0      # leading items that belong to the static prefix
+
+    @property
+    def user_item(self) -> dict:
+        """The new user message (all a continued conversation needs to send)"""
+        return self.items[-1]
+
+
+class PromptLayout:
+    """
+    Builds turn input with a byte-stable prefix per scenario and set of additions
+
+    Args:
+        system_prompts: Scenario name -> system prompt ("default" is the fallback)
+        additions: Addition name -> fixed instruction text
+        tools_version: Version of the tool schemas sent with every turn
+    """
+
+    def __init__(self, system_prompts: dict[str, str], additions: dict[str, str], tools_version: str = ""):
+        self.system_prompts = system_prompts
+        self.additions = additions
+        self.tools_version = tools_version
+        self._prefixes: dict[tuple, tuple[list[dict], str]] = {}
+
+    def scenario_name(self, scenario: Optional[str]) -> str:
+        return scenario if scenario in self.system_prompts else "default"
+
+    def prefix(self, scenario: Optional[str], additions: Iterable[str] = ()) -> tuple[list[dict], str]:
+        """The static items and prefix key (built once per combination; do not mutate)"""
+        key = (self.scenario_name(scenario), tuple(additions))
+        cached = self._prefixes.get(key)
+        if cached is None:
+            name, names = key
+            unknown = [addition for addition in names if addition not in self.additions]
+            if unknown:
+                raise KeyError(f"Unknown prompt additions: {unknown}")
+            items = [{"role": "system", "content": self.system_prompts[name]}]
+            items += [{"role": "system", "content": self.additions[addition]} for addition in names]
+            digest = hashlib.sha256()
+            for item in items:
+                digest.update(item["content"].encode("utf-8") + b"\x1e")
+            digest.update(self.tools_version.encode("utf-8"))
+            cached = self._prefixes[key] = (items, "+".join((name,) + names) + ":" + digest.hexdigest()[:12])
+        return cached
+
+    def build(
+        self,
+        scenario: Optional[str],
+        user_content: Union[str, list],
+        additions: Iterable[str] = (),
+        history: Iterable[dict] = (),
+    ) -> PromptInput:
+        """Static prefix, then ``history`` items, then the user message"""
+        static, prefix_key = self.prefix(scenario, additions)
+        items = list(static)
+        items.extend(history)
+        items.append({"role": "user", "content": user_content})
+        return PromptInput(items=items, prefix_key=prefix_key, static_items=len(static))
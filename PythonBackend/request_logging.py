@@ -0,0 +1,134 @@
+# request_logging.py
+"""
+Structured logging with per-request correlation ids.
+
+``CorrelationIdMiddleware`` assigns every HTTP request an id (taken from an
+incoming ``X-Request-ID`` header or generated) and stores it in a context
+variable, so every log record written while serving the request - including
+from background stream producers, which inherit the context - carries it.
+Records are rendered as ``key=value`` text or as one JSON object per line
+(``LOG_FORMAT=json``).
+
+Hot paths log through ``log_event``, which checks the level before building
+anything, and per-event debug output is sampled per stream with
+``debug_sampled`` instead of being written for every token.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Any
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar("correlation_id", default="-")
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamp the current correlation id on every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable lines with structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(correlation_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={json.dumps(value, default=str)}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, for the log pipeline"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> None:
+    """Install the structured handler on the root logger (replaces logging.basicConfig)"""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+    handler.addFilter(CorrelationIdFilter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+
+def log_event(logger: logging.Logger, level: int, message: str, **fields: Any) -> None:
+    """Log a message with structured fields; free when the level is disabled"""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+def debug_sampled(logger: logging.Logger, rate: float = DEBUG_SAMPLE_RATE) -> bool:
+    """Decide once (e.g. per stream) whether to write per-event debug records"""
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < rate
+
+
+class CorrelationIdMiddleware:
+    """
+    ASGI middleware binding a correlation id to each HTTP request
+
+    Implemented as plain ASGI rather than ``BaseHTTPMiddleware`` so streaming
+    responses and client-disconnect handling pass through untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(REQUEST_ID_HEADER.lower().encode())
+        request_id = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex[:16]
+        token = correlation_id.set(request_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            log_event(logging.getLogger("access"), logging.INFO, "request",
+                      method=scope.get("method"), path=scope.get("path"), status=status,
+                      duration_ms=round((time.perf_counter() - started) * 1000, 1))
+            correlation_id.reset(token)
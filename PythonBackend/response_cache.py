@@ -0,0 +1,286 @@
+# response_cache.py
+"""
+Opt-in cache of complete chat answers for repeated questions.
+
+Canned compliance questions ("show vendor risk ratings for X", "summarise
+this letter") are asked again and again, and each one pays the full
+reasoning latency. ``ResponseCache`` stores the answer of a stateless turn
+(no history, new conversation) under a key built from the normalised
+message, scenario, reasoning config, tool-set version and the hash of an
+uploaded document. Non-streaming endpoints get the answer text back; streaming
+endpoints replay the recorded payload sequence at full speed.
+
+Answers of turns that ran a tool with side effects (``cacheable=False`` in
+the registry, e.g. ``send_email``), that failed a tool call or that were cut
+short by a budget are never stored. Entries expire after a TTL, memory is an
+LRU and an optional directory keeps entries across restarts (one JSON file
+per key, bounded in number).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Callable, Optional
+
+from turn_engine import TurnFinished
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+DEFAULT_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+DEFAULT_RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "")       # empty keeps the cache in memory only
+DEFAULT_RESPONSE_CACHE_DISK_ENTRIES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ENTRIES", "5000"))
+
+# Payload types that belong to one request rather than to the answer
+UNRECORDED_PAYLOADS = frozenset({"conversation", "cache_hit"})
+
+_PRUNE_EVERY = 50   # disk writes between expiry / size sweeps
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Case, whitespace and trailing punctuation do not change the question"""
+    text = unicodedata.normalize("NFKC", message).casefold()
+    return _WHITESPACE.sub(" ", text).strip().rstrip("?!.").rstrip()
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    text: str = ""
+    payloads: Optional[list[dict]] = None     # recorded SSE payloads of a streaming endpoint
+    response_id: Optional[str] = None         # last upstream response, to chain a conversation from
+    tools: list[str] = field(default_factory=list)
+    created_at: float = 0.0
+    expires_at: float = 0.0
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of chat answers with an optional on-disk tier
+
+    Must be used from a single event loop; disk entries are small JSON files
+    read only on a memory miss.
+
+    Args:
+        tool_is_cacheable: Whether a tool's results may be reused (False for
+            tools with side effects)
+        max_entries: LRU bound on entries held in memory
+        ttl: Lifetime of an entry in seconds
+        directory: Directory for the on-disk tier (empty for memory only)
+        max_disk_entries: Bound on files in the directory (oldest first out)
+        clock: Wall-clock time source (injectable for tests)
+    """
+
+    def __init__(
+        self,
+        tool_is_cacheable: Callable[[str], bool],
+        max_entries: int = DEFAULT_RESPONSE_CACHE_MAX_ENTRIES,
+        ttl: float = DEFAULT_RESPONSE_CACHE_TTL,
+        directory: str = DEFAULT_RESPONSE_CACHE_DIR,
+        max_disk_entries: int = DEFAULT_RESPONSE_CACHE_DISK_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.tool_is_cacheable = tool_is_cacheable
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._disk_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(endpoint: str, message: str, scenario: str = "default", reasoning: Optional[dict] = None,
+            tools_version: str = "", document_hash: Optional[str] = None, scope: str = "") -> str:
+        """Cache key of a stateless turn (``scope`` separates users unless the cache is shared)"""
+        parts = {
+            "endpoint": endpoint,
+            "message": normalize_message(message),
+            "scenario": scenario or "default",
+            "reasoning": reasoning or None,
+            "tools": tools_version,
+            "document": document_hash,
+            "scope": scope,
+        }
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # -- lookup -------------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[CachedResponse]:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                return CachedResponse(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable response cache entry {key}: {e}")
+            return None
+
+    def _remember(self, entry: CachedResponse) -> None:
+        self._entries[entry.key] = entry
+        self._entries.move_to_end(entry.key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key) or self._load(key)
+        if entry is not None and entry.expires_at <= self.clock():
+            self._delete(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._remember(entry)
+        self.hits += 1
+        return entry
+
+    # -- storing ------------------------------------------------------------
+
+    def storable(self, tools: list[str]) -> bool:
+        """False once the turn ran a tool with side effects"""
+        for name in tools:
+            try:
+                if not self.tool_is_cacheable(name):
+                    return False
+            except KeyError:
+                return False   # unknown tool: assume the worst
+        return True
+
+    def _store(self, key: str, tools: list[str], **values) -> bool:
+        if not self.storable(tools):
+            self.skipped += 1
+            return False
+        now = self.clock()
+        entry = CachedResponse(key=key, tools=sorted(set(tools)), created_at=now, expires_at=now + self.ttl, **values)
+        self._remember(entry)
+        self.stores += 1
+        if self.directory:
+            self._write(entry)
+        return True
+
+    def store_turn(self, key: str, finished: TurnFinished) -> bool:
+        """Store the answer of a completed turn unless it is not safe to reuse"""
+        if finished.stop_reason or not finished.text or any(not r.ok for r in finished.tool_results):
+            self.skipped += 1
+            return False
+        return self._store(key, [r.name for r in finished.tool_results], text=finished.text,
+                           response_id=finished.response_id)
+
+    async def record(
+        self, key: str, payloads: AsyncIterator[dict], response_id: Callable[[], Optional[str]] = lambda: None
+    ) -> AsyncIterator[dict]:
+        """Pass a stream's payloads through and store them once it completed cleanly"""
+        recorded: list[dict] = []
+        tools: list[str] = []
+        clean = True
+        async for payload in payloads:
+            kind = payload.get("type")
+            if kind not in UNRECORDED_PAYLOADS:
+                recorded.append(payload)
+            if "function" in payload:
+                tools.append(payload["function"])
+            if kind in ("error", "budget_exhausted") or "error" in payload:
+                clean = False
+            yield payload
+        completed = bool(recorded) and recorded[-1].get("type") == "done"
+        if not (clean and completed):
+            self.skipped += 1
+            return
+        text = "".join(p.get("content", "") for p in recorded if p.get("type") == "content")
+        self._store(key, tools, text=text, payloads=recorded, response_id=response_id())
+
+    # -- maintenance --------------------------------------------------------
+
+    def _write(self, entry: CachedResponse) -> None:
+        path = self._path(entry.key)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(asdict(entry), f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write response cache entry: {e}")
+            return
+        self._disk_writes += 1
+        if self._disk_writes % _PRUNE_EVERY == 0:
+            self._prune_disk()
+
+    def _delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _disk_files(self) -> list[tuple[float, str]]:
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                path = os.path.join(self.directory, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        return sorted(files)
+
+    def _prune_disk(self) -> int:
+        """Remove files past the TTL, then the oldest ones over the size bound"""
+        files = self._disk_files()
+        cutoff = self.clock() - self.ttl
+        stale = [path for mtime, path in files if mtime <= cutoff]
+        fresh = [path for mtime, path in files if mtime > cutoff]
+        stale += fresh[:max(len(fresh) - self.max_disk_entries, 0)]
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(stale)
+
+    def clear(self) -> int:
+        """Drop every entry (e.g. after the underlying data changed)"""
+        removed = len(self._entries)
+        self._entries.clear()
+        if self.directory:
+            files = self._disk_files()
+            for _, path in files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            removed = max(removed, len(files))
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "disk_entries": len(self._disk_files()) if self.directory else None,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+        }
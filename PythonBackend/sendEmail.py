@@ -1,12 +1,18 @@
 # sendEmail.py
-import smtplib
-import ssl
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional
+"""
+E-mail tools. Messages are handed to the outbox (email_outbox.py) and
+delivered in the background, so a tool call returns as soon as the message
+is queued.
+"""
+from typing import Callable, Literal, NamedTuple, Optional
+import hashlib
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import logging
+from email_outbox import DEFAULT_SPOOL_DIR, EmailOutbox, LoggingTransport, OutboundEmail, SMTPTransport
+from tool_registry import tool
 
 # Load environment variables
 load_dotenv()
@@ -14,14 +20,40 @@ load_dotenv()
 # Configure logging
 logger = logging.getLogger(__name__)
 
+RECIPIENT_EMAIL = "shayon.gupta@microsoft.com"
+EMAIL_MODE = os.getenv("EMAIL_MODE", "test").lower()
+
+def create_transport():
+    """One mail server connection per outbox worker (a logging stand-in in test mode)"""
+    if EMAIL_MODE == "test":
+        return LoggingTransport()
+    return SMTPTransport(
+        host=os.getenv("SMTP_SERVER", "smtp.gmail.com"),
+        port=int(os.getenv("SMTP_PORT", "587")),
+        username=os.getenv("SMTP_SENDER_EMAIL", "noreply@compliancecomms.com"),
+        password=os.getenv("SMTP_SENDER_PASSWORD", ""),
+        starttls=os.getenv("SMTP_STARTTLS", "true").lower() == "true",
+    )
+
+# Simulated mail is not spooled to disk; real mail survives restarts
+outbox = EmailOutbox(create_transport, spool_dir=None if EMAIL_MODE == "test" else DEFAULT_SPOOL_DIR)
+
+@tool(
+    "Send an email to shayon.gupta@microsoft.com with custom content",
+    cacheable=False,
+    subject="The email subject line",
+    content="The email content/body",
+    content_type="The content type - 'plain' or 'html'",
+    sender_name="The name to display as sender",
+)
 def send_email(
     subject: str,
     content: str,
-    content_type: str = "plain",
+    content_type: Literal["plain", "html"] = "plain",
     sender_name: str = "Compliance Communications System"
 ) -> dict:
     """
-    Send an email to shayon.gupta@microsoft.com with the specified content
+    Queue an email to shayon.gupta@microsoft.com with the specified content
     
     Args:
         subject (str): The email subject line
@@ -30,106 +62,66 @@ def send_email(
         sender_name (str): The name to display as sender (default: "Compliance Communications System")
     
     Returns:
-        dict: Success status and message details
+        dict: Success status, the outbox message id and message details
     """
+    return queue_email(subject, content, content_type, sender_name)
+
+def queue_email(
+    subject: str,
+    content: str,
+    content_type: str = "plain",
+    sender_name: str = "Compliance Communications System",
+    priority: str = "normal",
+) -> dict:
+    """Hand a message to the outbox; ``priority`` orders the outbound queue"""
     try:
-        # Email configuration
-        recipient_email = "shayon.gupta@microsoft.com"
-        sender_email = os.getenv("SMTP_SENDER_EMAIL", "noreply@compliancecomms.com")
-        sender_password = os.getenv("SMTP_SENDER_PASSWORD", "")
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = subject
-        message["From"] = f"{sender_name} <{sender_email}>"
-        message["To"] = recipient_email
-        
-        # Create the email content
-        if content_type.lower() == "html":
-            email_part = MIMEText(content, "html")
-        else:
-            email_part = MIMEText(content, "plain")
-        
-        message.attach(email_part)
-        
-        # For development/testing - log the email instead of actually sending it
-        # This prevents accidental spam and allows testing without SMTP setup
-        if os.getenv("EMAIL_MODE", "test").lower() == "test":
-            logger.info("EMAIL SIMULATION MODE - Email would be sent:")
-            logger.info(f"To: {recipient_email}")
-            logger.info(f"From: {sender_name} <{sender_email}>")
-            logger.info(f"Subject: {subject}")
-            logger.info(f"Content Type: {content_type}")
-            logger.info(f"Content: {content}")
-            
-            return {
-                "success": True,
-                "message": "Email simulated successfully (test mode)",
-                "recipient": recipient_email,
-                "subject": subject,
-                "content_preview": content[:100] + "..." if len(content) > 100 else content,
-                "mode": "simulation"
-            }
-        
-        # Production mode - actually send the email
-        else:
-            # Create secure connection and send email
-            context = ssl.create_default_context()
-            
-            with smtplib.SMTP(smtp_server, smtp_port) as server:
-                server.starttls(context=context)
-                if sender_password:
-                    server.login(sender_email, sender_password)
-                
-                text = message.as_string()
-                server.sendmail(sender_email, recipient_email, text)
-            
-            logger.info(f"Email sent successfully to {recipient_email}")
-            
-            return {
-                "success": True,
-                "message": "Email sent successfully",
-                "recipient": recipient_email,
-                "subject": subject,
-                "content_preview": content[:100] + "..." if len(content) > 100 else content,
-                "mode": "production"
-            }
+        email = OutboundEmail(
+            sender=os.getenv("SMTP_SENDER_EMAIL", "noreply@compliancecomms.com"),
+            recipients=[RECIPIENT_EMAIL],
+            subject=subject,
+            content=content,
+            content_type="html" if content_type.lower() == "html" else "plain",
+            sender_name=sender_name,
+            priority=priority,
+        )
+        message_id = outbox.submit(email)
+        logger.info(f"Email {message_id} queued for {RECIPIENT_EMAIL} ({priority} priority)")
+
+        return {
+            "success": True,
+            "message": "Email queued for delivery" + (" (test mode: it will be logged, not sent)" if EMAIL_MODE == "test" else ""),
+            "message_id": message_id,
+            "status": "queued",
+            "recipient": RECIPIENT_EMAIL,
+            "subject": subject,
+            "content_preview": content[:100] + "..." if len(content) > 100 else content,
+            "mode": "simulation" if EMAIL_MODE == "test" else "production"
+        }
     
     except Exception as e:
-        error_msg = f"Failed to send email: {str(e)}"
+        error_msg = f"Failed to queue email: {str(e)}"
         logger.error(error_msg)
         
         return {
             "success": False,
             "message": error_msg,
-            "recipient": "shayon.gupta@microsoft.com",
+            "recipient": RECIPIENT_EMAIL,
             "subject": subject,
             "error": str(e)
         }
 
-def send_compliance_notification(
-    notification_type: str,
-    details: str,
-    priority: str = "normal"
-) -> dict:
-    """
-    Send a compliance-specific notification email with predefined formatting
-    
-    Args:
-        notification_type (str): Type of notification (e.g., "policy_update", "training_due", "audit_alert")
-        details (str): Specific details about the notification
-        priority (str): Priority level - "low", "normal", "high", "urgent" (default: "normal")
-    
-    Returns:
-        dict: Success status and message details
-    """
-    # Map notification types to subjects and templates
-    notification_templates = {
-        "policy_update": {
-            "subject": "🔄 Compliance Policy Update Notification",
-            "template": """
+class NotificationTemplate(NamedTuple):
+    subject: str
+    head: str     # body text before the details
+    tail: str     # body text after the details
+
+def _compile_template(subject: str, body: str) -> NotificationTemplate:
+    head, tail = body.strip().split("{details}")
+    return NotificationTemplate(subject, head, tail)
+
+# Built once at import; rendering is plain concatenation around the details
+NOTIFICATION_TEMPLATES = {
+    "policy_update": _compile_template("🔄 Compliance Policy Update Notification", """
 Dear Shayon,
 
 A compliance policy has been updated that requires your attention.
@@ -141,11 +133,8 @@ Please review the updated policy and ensure your team is aware of any changes.
 
 Best regards,
 Compliance Communications System
-            """.strip()
-        },
-        "training_due": {
-            "subject": "📚 Compliance Training Due Notification",
-            "template": """
+"""),
+    "training_due": _compile_template("📚 Compliance Training Due Notification", """
 Dear Shayon,
 
 This is a reminder about upcoming compliance training requirements.
@@ -157,11 +146,8 @@ Please ensure completion by the specified deadline to maintain compliance status
 
 Best regards,
 Compliance Communications System
-            """.strip()
-        },
-        "audit_alert": {
-            "subject": "🔍 Audit Alert Notification",
-            "template": """
+"""),
+    "audit_alert": _compile_template("🔍 Audit Alert Notification", """
 Dear Shayon,
 
 An audit-related item requires your immediate attention.
@@ -173,11 +159,8 @@ Please review and take appropriate action as soon as possible.
 
 Best regards,
 Compliance Communications System
-            """.strip()
-        },
-        "general": {
-            "subject": "ℹ️ Compliance Notification",
-            "template": """
+"""),
+    "general": _compile_template("ℹ️ Compliance Notification", """
 Dear Shayon,
 
 A compliance-related notification has been generated.
@@ -189,27 +172,101 @@ Please review and take any necessary action.
 
 Best regards,
 Compliance Communications System
-            """.strip()
-        }
-    }
-    
-    # Get the template or default to general
-    template_info = notification_templates.get(notification_type, notification_templates["general"])
-    
-    # Add priority indicator to subject if high or urgent
-    subject = template_info["subject"]
-    if priority.lower() == "high":
-        subject = f"🟡 HIGH PRIORITY - {subject}"
-    elif priority.lower() == "urgent":
-        subject = f"🔴 URGENT - {subject}"
+"""),
+}
+
+PRIORITY_PREFIXES = {"high": "🟡 HIGH PRIORITY - ", "urgent": "🔴 URGENT - "}
+
+def render_notification(notification_type: str, details: str, priority: str = "normal") -> tuple[str, str]:
+    """Subject and body of a compliance notification"""
+    template = NOTIFICATION_TEMPLATES.get(notification_type, NOTIFICATION_TEMPLATES["general"])
+    subject = PRIORITY_PREFIXES.get(priority.lower(), "") + template.subject
+    return subject, template.head + details + template.tail
+
+class NotificationDeduplicator:
+    """
+    Collapse identical notifications sent within a time window
+
+    The key is a hash of (notification_type, details, priority); the first
+    send inside the window wins and repeats get its message id back.
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window = window_seconds
+        self._sent: dict[str, tuple[float, str]] = {}    # key -> (expires_at, message_id)
+        self._lock = threading.Lock()                     # tools run on worker threads
+        self.suppressed = 0
+
+    @staticmethod
+    def key(notification_type: str, details: str, priority: str) -> str:
+        raw = "\x1f".join((notification_type, details.strip(), priority.lower()))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def send_once(self, key: str, send: Callable[[], dict]) -> tuple[Optional[str], Optional[dict]]:
+        """
+        Call ``send`` unless an identical notification is inside the window
+
+        Returns:
+            (message id of the earlier notification, None) for a duplicate,
+            otherwise (None, result of ``send``)
+        """
+        now = time.monotonic()
+        # Held while queueing (a spool write) so parallel identical calls cannot both pass
+        with self._lock:
+            for stale in [k for k, (expires, _) in self._sent.items() if expires <= now]:
+                del self._sent[stale]
+            entry = self._sent.get(key)
+            if entry is not None:
+                self.suppressed += 1
+                return entry[1], None
+            result = send()
+            if self.window > 0 and result.get("success"):
+                self._sent[key] = (now + self.window, result["message_id"])
+            return None, result
+
+notification_dedup = NotificationDeduplicator(float(os.getenv("NOTIFICATION_DEDUP_MINUTES", "10")) * 60)
+
+@tool(
+    "Send a compliance-specific notification email with predefined formatting",
+    cacheable=False,
+    notification_type="Type of notification",
+    details="Specific details about the notification",
+    priority="Priority level",
+)
+def send_compliance_notification(
+    notification_type: Literal["policy_update", "training_due", "audit_alert", "general"],
+    details: str,
+    priority: Literal["low", "normal", "high", "urgent"] = "normal"
+) -> dict:
+    """
+    Send a compliance-specific notification email with predefined formatting
     
-    # Format the email content
-    content = template_info["template"].format(details=details)
+    Args:
+        notification_type (str): Type of notification (e.g., "policy_update", "training_due", "audit_alert")
+        details (str): Specific details about the notification
+        priority (str): Priority level - "low", "normal", "high", "urgent" (default: "normal")
     
-    # Send the email
-    return send_email(
-        subject=subject,
-        content=content,
-        content_type="plain",
-        sender_name="Compliance Communications System"
+    Returns:
+        dict: Success status and message details
+    """
+    subject, content = render_notification(notification_type, details, priority)
+    duplicate_of, result = notification_dedup.send_once(
+        notification_dedup.key(notification_type, details, priority),
+        lambda: queue_email(
+            subject=subject,
+            content=content,
+            content_type="plain",
+            sender_name="Compliance Communications System",
+            priority=priority.lower(),
+        ),
     )
+    if duplicate_of is not None:
+        logger.info(f"Duplicate {notification_type} notification suppressed (already queued as {duplicate_of})")
+        return {
+            "success": True,
+            "message": "An identical notification was already sent recently; it was not sent again",
+            "message_id": duplicate_of,
+            "status": "duplicate",
+            "recipient": RECIPIENT_EMAIL,
+        }
+    return result
@@ -0,0 +1,270 @@
+# sse.py
+"""
+Server-sent-event framing for the chat streaming endpoints.
+
+``TurnPresenter`` maps the typed events of ``turn_engine.TurnEngine`` to the
+JSON payloads the React frontend already understands. The endpoints differ
+only in a few event names, which are passed in as configuration.
+
+Text deltas are not forwarded one token at a time: ``DeltaCoalescer`` merges
+consecutive deltas of the same kind and flushes them after a short time window
+or once a byte threshold is reached, and immediately before any structural
+event (content_start, function calls, results, ...).
+"""
+import asyncio
+import contextlib
+import json
+import os
+from typing import AsyncIterator, Optional
+
+from turn_engine import (
+    BudgetExhausted,
+    ContentDelta,
+    FunctionArgsComplete,
+    FunctionArgsDelta,
+    FunctionCallAdded,
+    FunctionCallDone,
+    FunctionResult,
+    OutputItemAdded,
+    OutputItemDone,
+    ReasoningDelta,
+    ResponseCompleted,
+    StreamCreated,
+    StreamProgress,
+    ToolsStarted,
+    TurnEvent,
+    TurnFinished,
+)
+
+
+DEFAULT_COALESCE_WINDOW = float(os.getenv("SSE_COALESCE_MS", "20")) / 1000
+DEFAULT_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "512"))
+
+# Payload types whose text field can be concatenated across consecutive deltas
+_DELTA_FIELDS = {"content": "content", "reasoning": "content", "function_args_delta": "delta"}
+
+
+def format_sse(payload: dict, event_id: Optional[str] = None, event: Optional[str] = None) -> str:
+    """Frame one JSON payload as an SSE message, optionally with ``id:`` and ``event:`` fields"""
+    frame = f"data: {json.dumps(payload)}\n\n"
+    if event:
+        frame = f"event: {event}\n{frame}"
+    if event_id:
+        frame = f"id: {event_id}\n{frame}"
+    return frame
+
+
+class DeltaCoalescer:
+    """
+    Merge consecutive text deltas into fewer, larger payloads
+
+    A buffered delta is flushed when ``window`` seconds have passed since it
+    was started, when it reaches ``max_bytes``, or when any other payload
+    arrives (which is then forwarded right after it). A window of 0 disables
+    coalescing.
+
+    Args:
+        window: Maximum time in seconds a delta is held back
+        max_bytes: Flush once the buffered text reaches this size (UTF-8)
+    """
+
+    def __init__(self, window: float = DEFAULT_COALESCE_WINDOW, max_bytes: int = DEFAULT_COALESCE_BYTES):
+        self.window = window
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.emitted = 0
+
+    @staticmethod
+    def merge_key(payload: dict) -> Optional[tuple]:
+        """Payloads with equal keys can be merged; None for structural payloads"""
+        kind = payload.get("type")
+        if kind not in _DELTA_FIELDS:
+            return None
+        return kind, payload.get("call_id")
+
+    async def coalesce(self, payloads: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        if self.window <= 0:
+            async for payload in payloads:
+                self.received += 1
+                self.emitted += 1
+                yield payload
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = payloads.__aiter__()
+        # The next upstream item is awaited as a task so a window can expire
+        # while it is still pending, without cancelling the upstream stream
+        pending: Optional[asyncio.Future] = None
+        buffered: Optional[dict] = None
+        buffered_key: Optional[tuple] = None
+        parts: list[str] = []
+        size = 0
+        deadline = 0.0
+
+        def flush() -> dict:
+            nonlocal buffered, buffered_key, parts, size
+            payload = buffered
+            payload[_DELTA_FIELDS[buffered_key[0]]] = "".join(parts)
+            buffered, buffered_key, parts, size = None, None, [], 0
+            self.emitted += 1
+            return payload
+
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                if buffered is not None:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0 or not (await asyncio.wait({pending}, timeout=timeout))[0]:
+                        yield flush()
+                        continue
+                try:
+                    payload = await pending
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+                self.received += 1
+
+                key = self.merge_key(payload)
+                if buffered is not None and key != buffered_key:
+                    yield flush()
+                if key is None:
+                    self.emitted += 1
+                    yield payload
+                    continue
+
+                text = payload.get(_DELTA_FIELDS[key[0]]) or ""
+                if buffered is None:
+                    buffered, buffered_key = dict(payload), key
+                    deadline = loop.time() + self.window
+                parts.append(text)
+                size += len(text.encode("utf-8"))
+                if self.max_bytes and size >= self.max_bytes:
+                    yield flush()
+
+            if buffered is not None:
+                yield flush()
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+                with contextlib.suppress(BaseException):
+                    await pending
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class TurnPresenter:
+    """
+    Convert turn-engine events into frontend payloads
+
+    Args:
+        call_prefix: Prefix for function_call_added/done events ("", "cot_", "document_")
+        result_type: Event type used for tool results ("function_call" or "function_result")
+        status_message: Status text sent before the follow-up response starts
+        phase_markers: Emit reasoning_start/reasoning_end/content_start markers
+        coalescer: Delta coalescing for the output (a default one when omitted)
+    """
+
+    def __init__(
+        self,
+        call_prefix: str = "",
+        result_type: str = "function_result",
+        status_message: str = "Generating final answer...",
+        phase_markers: bool = True,
+        coalescer: Optional[DeltaCoalescer] = None,
+    ):
+        self.call_prefix = call_prefix
+        self.result_type = result_type
+        self.status_message = status_message
+        self.phase_markers = phase_markers
+        self.coalescer = coalescer or DeltaCoalescer()
+        self.reasoning_started = False
+        self.reasoning_ended = False
+        self.content_started = False
+        self.finished: TurnFinished = TurnFinished()
+
+    def present(self, events: AsyncIterator[TurnEvent]) -> AsyncIterator[dict]:
+        """Frontend payloads for a turn, with text deltas coalesced"""
+        return self.coalescer.coalesce(self._all_payloads(events))
+
+    async def _all_payloads(self, events: AsyncIterator[TurnEvent]) -> AsyncIterator[dict]:
+        async for event in events:
+            for payload in self.payloads(event):
+                yield payload
+
+    def payloads(self, event: TurnEvent) -> list[dict]:
+        """Payloads for a single event (possibly none, possibly several)"""
+        first_round = event.round == 0
+
+        if isinstance(event, StreamCreated):
+            return [{"type": "stream_created"}] if first_round else []
+
+        if isinstance(event, StreamProgress):
+            return [{"type": "stream_progress"}] if first_round else []
+
+        if isinstance(event, FunctionCallAdded):
+            if first_round:
+                return [{"type": f"{self.call_prefix}function_call_added", "function": event.name, "call_id": event.call_id}]
+            return [{"type": "final_function_call_added", "function": event.name, "call_id": event.call_id}]
+
+        if isinstance(event, FunctionCallDone):
+            if first_round:
+                return [{"type": f"{self.call_prefix}function_call_done", "function": event.name, "call_id": event.call_id}]
+            return []
+
+        if isinstance(event, OutputItemAdded):
+            return [{"type": "output_item_added"}] if first_round else []
+
+        if isinstance(event, OutputItemDone):
+            return [{"type": "output_item_done"}] if first_round else []
+
+        if isinstance(event, ReasoningDelta):
+            payloads = []
+            if self.phase_markers and not self.reasoning_started:
+                payloads.append({"type": "reasoning_start"})
+            self.reasoning_started = True
+            payloads.append({"type": "reasoning", "content": event.text})
+            return payloads
+
+        if isinstance(event, ContentDelta):
+            payloads = []
+            if not self.content_started:
+                if self.phase_markers:
+                    if self.reasoning_started and not self.reasoning_ended:
+                        payloads.append({"type": "reasoning_end"})
+                        self.reasoning_ended = True
+                    payloads.append({"type": "content_start"})
+                self.content_started = True
+            payloads.append({"type": "content", "content": event.text})
+            return payloads
+
+        if isinstance(event, FunctionArgsDelta):
+            return [{"type": "function_args_delta", "call_id": event.call_id, "delta": event.delta, "function": event.name}]
+
+        if isinstance(event, FunctionArgsComplete):
+            return [{"type": "function_args_complete", "call_id": event.call_id, "function": event.name}]
+
+        if isinstance(event, ToolsStarted):
+            return [{"type": "status", "message": self.status_message}]
+
+        if isinstance(event, FunctionResult):
+            result = event.result
+            payload = {"type": self.result_type, "function": result.name,
+                       "status": "completed" if result.ok else "error", "call_id": result.call_id}
+            if not result.ok:
+                payload["error"] = result.error
+            return [payload]
+
+        if isinstance(event, BudgetExhausted):
+            return [{"type": "budget_exhausted", "reason": event.reason, "limit": event.limit}]
+
+        if isinstance(event, ResponseCompleted):
+            return [{"type": "stream_completed" if first_round else "final_stream_completed"}]
+
+        if isinstance(event, TurnFinished):
+            self.finished = event
+            return []
+
+        return []
@@ -0,0 +1,317 @@
+# stream_sessions.py
+"""
+Resumable server-sent-event streams.
+
+Each streaming response is backed by a ``StreamSession``: a producer task
+drains the endpoint's payload generator into a bounded replay buffer of framed
+events with monotonically increasing ids (``<stream_id>:<seq>``), and the HTTP
+response just reads from that buffer. Idle periods are filled with heartbeat
+comments so proxies do not drop the connection during long reasoning phases.
+If the connection drops anyway, a reconnect carrying ``Last-Event-ID``
+attaches to the same session and continues after the last event it saw,
+without starting a new model request.
+
+When the last reader disconnects and nobody re-attaches within a short grace
+period, the producer is cancelled. Cancellation runs down through the turn
+engine, which closes the upstream model stream, cancels in-flight tool tasks
+and skips any follow-up response.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import Counter, deque
+from typing import AsyncIterator, Callable, Optional
+
+from request_logging import log_event
+from sse import format_sse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLAY_EVENTS = int(os.getenv("SSE_REPLAY_EVENTS", "2048"))
+DEFAULT_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+DEFAULT_RESUME_TTL = float(os.getenv("SSE_RESUME_TTL_SECONDS", "300"))
+DEFAULT_MAX_SESSIONS = int(os.getenv("SSE_MAX_SESSIONS", "1000"))
+DEFAULT_DISCONNECT_GRACE = float(os.getenv("SSE_DISCONNECT_GRACE_SECONDS", "10"))
+
+HEARTBEAT_FRAME = ": keepalive\n\n"
+
+
+class StreamGoneError(LookupError):
+    """Raised when a stream cannot be resumed (unknown, expired or out of the replay window)"""
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[tuple[str, int]]:
+    """Split a ``<stream_id>:<seq>`` event id; None when absent or malformed"""
+    if not event_id:
+        return None
+    stream_id, _, seq = event_id.strip().rpartition(":")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class StreamSession:
+    """
+    One stream's producer task and replay buffer
+
+    Args:
+        stream_id: Identifier embedded in every event id
+        payloads: The endpoint's payload generator
+        replay_size: Number of framed events kept for resuming
+        disconnect_grace: Seconds without any reader before the producer is cancelled
+        on_cancel: Called once if the producer is cancelled for lack of readers
+        on_finish: Called once when the producer ends, however it ends
+        label: Name used in the stream summary record (e.g. the endpoint path)
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        payloads: AsyncIterator[dict],
+        replay_size: int = DEFAULT_REPLAY_EVENTS,
+        disconnect_grace: float = DEFAULT_DISCONNECT_GRACE,
+        on_cancel: Optional[Callable[["StreamSession"], None]] = None,
+        on_finish: Optional[Callable[["StreamSession"], None]] = None,
+        label: str = "",
+    ):
+        self.stream_id = stream_id
+        self.label = label
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.disconnect_grace = disconnect_grace
+        self.on_cancel = on_cancel
+        self.on_finish = on_finish
+        self.cancelled = False
+        self._readers = 0
+        self.event_counts: Counter = Counter()
+        self.bytes = 0
+        self.writes = 0
+        self.heartbeats = 0
+        self.first_content_at: Optional[float] = None
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+        self._events: deque[tuple[int, str]] = deque(maxlen=replay_size)
+        self._next_seq = 1
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._produce(payloads))
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    def _append(self, payload: dict) -> None:
+        seq = self._next_seq
+        self._next_seq += 1
+        event_id = f"{self.stream_id}:{seq}"
+        kind = payload.get("type")
+        frame = format_sse(payload, event_id=event_id, event=kind)
+        self._events.append((seq, frame))
+        self.event_counts[kind or "untyped"] += 1
+        self.bytes += len(frame)
+        if kind == "content" and self.first_content_at is None:
+            self.first_content_at = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _produce(self, payloads: AsyncIterator[dict]) -> None:
+        try:
+            async for payload in payloads:
+                self._append(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stream {self.stream_id} failed: {str(e)}")
+            self._append({"type": "error", "error": str(e)})
+        finally:
+            self.finished_at = time.monotonic()
+            if self._abandon_timer is not None:
+                self._abandon_timer.cancel()
+            self._notify()
+            log_event(logger, logging.INFO, "stream summary", **self.summary())
+            if self.on_finish is not None:
+                self.on_finish(self)
+
+    def summary(self) -> dict:
+        """One record per stream instead of one log line per delta"""
+        end = self.finished_at or time.monotonic()
+        first_content = self.first_content_at
+        return {
+            "stream_id": self.stream_id,
+            "endpoint": self.label,
+            "events": self.last_seq,
+            "event_counts": dict(self.event_counts),
+            "bytes": self.bytes,
+            "writes": self.writes,
+            "heartbeats": self.heartbeats,
+            "first_content_ms": round((first_content - self.created_at) * 1000, 1) if first_content else None,
+            "duration_ms": round((end - self.created_at) * 1000, 1),
+            "cancelled": self.cancelled,
+        }
+
+    def _attach(self) -> None:
+        self._readers += 1
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+
+    def _detach(self) -> None:
+        self._readers -= 1
+        if self._readers == 0 and not self.done:
+            # The task's loop, not the running one: a dropped reader may be finalised by the GC
+            self._abandon_timer = self._task.get_loop().call_later(self.disconnect_grace, self._abandon)
+
+    def _abandon(self) -> None:
+        """Nobody came back for this stream: stop spending tokens on it"""
+        self._abandon_timer = None
+        if self._readers or self.done:
+            return
+        log_event(logger, logging.INFO, "stream abandoned by client", stream_id=self.stream_id, last_event=self.last_seq)
+        self.cancelled = True
+        self._task.cancel()
+        if self.on_cancel is not None:
+            self.on_cancel(self)
+
+    def can_resume_after(self, seq: int) -> bool:
+        """True when every event after ``seq`` is still in the replay buffer"""
+        if seq > self.last_seq:
+            return False
+        first = self._events[0][0] if self._events else self._next_seq
+        return seq + 1 >= first
+
+    def _events_after(self, seq: int) -> list[tuple[int, str]]:
+        if not self._events:
+            return []
+        offset = seq + 1 - self._events[0][0]
+        return list(self._events)[max(offset, 0):]
+
+    async def frames(self, after: int = 0, heartbeat: float = DEFAULT_HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+        """
+        Framed events after ``after``, then live events until the producer ends
+
+        Everything already buffered is written as one chunk. Heartbeat
+        comments are sent whenever nothing arrives for ``heartbeat`` seconds.
+        Leaving early (the client disconnected) detaches this reader.
+        """
+        cursor = after
+        self._attach()
+        try:
+            while True:
+                changed = self._changed
+                if not self.can_resume_after(cursor):
+                    # This reader fell further behind than the replay buffer holds
+                    yield format_sse({"type": "error", "error": "Stream replay window exceeded"})
+                    return
+                pending = self._events_after(cursor)
+                if pending:
+                    cursor = pending[-1][0]
+                    self.writes += 1
+                    yield "".join(frame for _, frame in pending)
+                    continue
+                if self.done:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    self.heartbeats += 1
+                    yield HEARTBEAT_FRAME
+        finally:
+            self._detach()
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+
+class StreamSessionStore:
+    """
+    Live and recently finished stream sessions, for Last-Event-ID resume
+
+    Args:
+        replay_size: Framed events kept per stream
+        resume_ttl: Seconds a finished stream stays resumable
+        max_sessions: Upper bound on stored sessions (oldest finished ones are dropped first)
+        heartbeat: Idle seconds between heartbeat comments
+        disconnect_grace: Seconds a stream keeps running with no reader attached
+        on_finish: Called with each session when its producer ends (e.g. for metrics)
+    """
+
+    def __init__(
+        self,
+        replay_size: int = DEFAULT_REPLAY_EVENTS,
+        resume_ttl: float = DEFAULT_RESUME_TTL,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        heartbeat: float = DEFAULT_HEARTBEAT_SECONDS,
+        disconnect_grace: float = DEFAULT_DISCONNECT_GRACE,
+        on_finish: Optional[Callable[[StreamSession], None]] = None,
+    ):
+        self.replay_size = replay_size
+        self.resume_ttl = resume_ttl
+        self.max_sessions = max_sessions
+        self.heartbeat = heartbeat
+        self.disconnect_grace = disconnect_grace
+        self.on_finish = on_finish
+        self._sessions: dict[str, StreamSession] = {}
+        self.started = 0
+        self.resumed = 0
+        self.cancelled = 0
+
+    def _count_cancel(self, session: StreamSession) -> None:
+        self.cancelled += 1
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for stream_id, session in list(self._sessions.items()):
+            if session.done and now - session.finished_at > self.resume_ttl:
+                del self._sessions[stream_id]
+        if len(self._sessions) >= self.max_sessions:
+            finished = sorted((s for s in self._sessions.values() if s.done), key=lambda s: s.finished_at)
+            for session in finished[: len(self._sessions) - self.max_sessions + 1]:
+                del self._sessions[session.stream_id]
+
+    def start(self, payloads: AsyncIterator[dict], label: str = "") -> StreamSession:
+        """Start producing a new stream in the background"""
+        self._prune()
+        session = StreamSession(uuid.uuid4().hex, payloads, self.replay_size,
+                                disconnect_grace=self.disconnect_grace, on_cancel=self._count_cancel,
+                                on_finish=self.on_finish, label=label)
+        self._sessions[session.stream_id] = session
+        self.started += 1
+        return session
+
+    def resume(self, last_event_id: str) -> tuple[StreamSession, int]:
+        """
+        Find the session and position for a ``Last-Event-ID`` value
+
+        Raises:
+            StreamGoneError: If the stream is unknown, expired or the events
+                after that id have left the replay buffer
+        """
+        self._prune()
+        parsed = parse_event_id(last_event_id)
+        session = self._sessions.get(parsed[0]) if parsed else None
+        if session is None:
+            raise StreamGoneError(f"Unknown or expired stream: {last_event_id}")
+        if not session.can_resume_after(parsed[1]):
+            raise StreamGoneError(f"Events after {last_event_id} are no longer available")
+        self.resumed += 1
+        return session, parsed[1]
+
+    def get(self, stream_id: str) -> Optional[StreamSession]:
+        return self._sessions.get(stream_id)
+
+    def stats(self) -> dict:
+        live = sum(1 for session in self._sessions.values() if not session.done)
+        return {"sessions": len(self._sessions), "live": live, "started": self.started,
+                "resumed": self.resumed, "cancelled_on_disconnect": self.cancelled}
+
+    def close(self) -> None:
+        for session in self._sessions.values():
+            session.cancel()
+        self._sessions.clear()
@@ -0,0 +1,113 @@
+# test_batch_jobs.py
+"""
+Offline tests for batch letter processing, checkpoints and concurrency bounds
+"""
+import asyncio
+import json
+import shutil
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from batch_jobs import BatchJob, BatchRunner, discover_letters, load_checkpoint, resolve_letters
+from pdf_extract import PDFTextExtractor
+
+LETTERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Contoso_Request_Letters")
+
+
+class FakeFlow:
+    """Stands in for main.process_letter and records peak concurrency"""
+
+    def __init__(self, fail_on: str = ""):
+        self.fail_on = fail_on
+        self.active = 0
+        self.peak = 0
+        self.calls: list[str] = []
+
+    async def __call__(self, filename: str, pages: list[str]) -> dict:
+        self.calls.append(filename)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if filename == self.fail_on:
+                raise RuntimeError("model unavailable")
+            return {"response": f"processed {filename}", "pages": len(pages)}
+        finally:
+            self.active -= 1
+
+
+def read_records(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_discover_letters_recurses_into_subdirectories():
+    files = discover_letters([LETTERS_DIR])
+    assert len(files) > 10
+    assert any("Multiple EE_Letters" in path for path in files)
+    assert files == sorted(set(files))
+
+
+def test_resolve_letters_stays_inside_the_input_directory():
+    assert resolve_letters(LETTERS_DIR, ["."]) == discover_letters([LETTERS_DIR])
+    for path in ("..", "../PythonBackend", os.path.abspath(LETTERS_DIR), "/etc/passwd"):
+        try:
+            resolve_letters(LETTERS_DIR, [path])
+            assert False, f"accepted {path}"
+        except ValueError:
+            pass
+    workdir = tempfile.mkdtemp()
+    try:
+        os.symlink(LETTERS_DIR, os.path.join(workdir, "outside"))
+        assert resolve_letters(workdir, ["."]) == []
+        try:
+            resolve_letters(workdir, ["outside"])
+            assert False, "followed a link out of the input directory"
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(workdir)
+
+
+def test_batch_run_bounds_concurrency_and_resumes():
+    workdir = tempfile.mkdtemp()
+    try:
+        files = discover_letters([LETTERS_DIR])[:6]
+        output = os.path.join(workdir, "out", "results.jsonl")
+        failing = os.path.basename(files[2])
+        extractor = PDFTextExtractor(max_workers=2)
+
+        flow = FakeFlow(fail_on=failing)
+        job = asyncio.run(BatchRunner(extractor, flow, concurrency=2, prefetch=1).run(BatchJob(files, output)))
+
+        assert job.status == "completed"
+        assert (job.succeeded, job.failed, job.skipped) == (5, 1, 0)
+        assert flow.peak <= 2
+        records = read_records(output)
+        assert len(records) == 6
+        failed = [record for record in records if record["status"] == "error"]
+        assert [record["filename"] for record in failed] == [failing]
+        ok = [record for record in records if record["status"] == "ok"]
+        assert all(record["pages"] >= 1 and "model_seconds" in record["timing"] for record in ok)
+        assert all("total_seconds" in record["timing"] for record in records)
+        assert len(load_checkpoint(output)) == 5
+
+        # Second run only retries the failed letter
+        flow = FakeFlow()
+        job = asyncio.run(BatchRunner(extractor, flow, concurrency=2).run(BatchJob(files, output)))
+        extractor.shutdown()
+
+        assert (job.succeeded, job.failed, job.skipped) == (1, 0, 5)
+        assert flow.calls == [failing]
+        assert len(load_checkpoint(output)) == 6
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    test_discover_letters_recurses_into_subdirectories()
+    test_resolve_letters_stays_inside_the_input_directory()
+    test_batch_run_bounds_concurrency_and_resumes()
+    print("✅ Batch job tests passed")
@@ -0,0 +1,42 @@
+# test_benchmarks.py
+"""
+Offline tests for the microbenchmark runner and regression comparison
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks import compare, pdf_benchmarks, run_suite, sse_benchmarks
+
+
+def test_run_suite_reports_per_call_timings():
+    report = run_suite(sse_benchmarks(), pattern=r"format_sse\.content", rounds=3,
+                       min_round_time=0.001, progress=False)
+    assert [r["name"] for r in report["results"]] == ["sse.format_sse.content_delta"]
+    result = report["results"][0]
+    assert result["rounds"] == 3
+    assert 0 < result["min"] <= result["median"]
+    assert result["ops_per_second"] > 0
+    assert report["python"]
+
+
+def test_compare_flags_only_slowdowns_above_threshold():
+    baseline = {"results": [{"name": "a", "median": 1.0}, {"name": "b", "median": 1.0},
+                            {"name": "c", "median": 1.0}]}
+    current = {"results": [{"name": "a", "median": 1.1}, {"name": "b", "median": 1.5},
+                           {"name": "c", "median": 0.5}, {"name": "new", "median": 9.0}]}
+    regressions = compare(current, baseline, threshold=1.15)
+    assert [(r["name"], r["ratio"]) for r in regressions] == [("b", 1.5)]
+
+
+def test_every_request_letter_is_benchmarked():
+    names = [name for name, _, _ in pdf_benchmarks()]
+    assert "pdf.extract_pages.Request_01_Sales_to_Compliance.pdf" in names
+    assert any(name.startswith("pdf.extract_pages.Multiple EE_Letters/") for name in names)
+
+
+if __name__ == "__main__":
+    test_run_suite_reports_per_call_timings()
+    test_compare_flags_only_slowdowns_above_threshold()
+    test_every_request_letter_is_benchmarked()
+    print("✅ Benchmark runner tests passed")
@@ -0,0 +1,56 @@
+# test_consolidated_data.py
+"""
+Offline tests for the concurrent, projectable consolidated-data tool
+"""
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from functions import CONSOLIDATED_CATEGORIES, get_consolidated_data_multiple_people, iter_consolidated_data
+from tool_registry import registry
+
+
+def test_full_consolidation_keeps_every_section_in_order():
+    result = get_consolidated_data_multiple_people(["alice", "bob"])
+    assert result["total_users"] == 2
+    assert list(result["user_data"]) == ["alice", "bob"]
+    assert list(result["user_data"]["alice"]) == list(CONSOLIDATED_CATEGORIES)
+    assert result["user_data"]["bob"]["training_gaps"]["user"] == "bob"
+
+
+def test_categories_projection_shrinks_payload():
+    full = json.dumps(get_consolidated_data_multiple_people(["alice"]))
+    projected = get_consolidated_data_multiple_people(["alice"], categories=["nda_archive", "training_gaps"])
+    assert list(projected["user_data"]["alice"]) == ["nda_archive", "training_gaps"]
+    assert len(json.dumps(projected)) < len(full) / 5
+
+
+def test_iterator_yields_each_user_once():
+    users = [f"user{i}" for i in range(25)]
+    seen = dict(iter_consolidated_data(users + ["user0"], categories=["kpi_deltas"]))
+    assert sorted(seen) == sorted(users)
+    assert all(list(sections) == ["kpi_deltas"] for sections in seen.values())
+
+
+def test_unknown_category_is_rejected():
+    try:
+        list(iter_consolidated_data(["alice"], categories=["not_a_section"]))
+    except ValueError as e:
+        assert "not_a_section" in str(e)
+    else:
+        raise AssertionError("unknown category accepted")
+
+
+def test_schema_enum_lists_every_section():
+    parameters = registry.spec("get_consolidated_data_multiple_people").parameters
+    assert parameters["properties"]["categories"]["items"]["enum"] == list(CONSOLIDATED_CATEGORIES)
+
+
+if __name__ == "__main__":
+    test_full_consolidation_keeps_every_section_in_order()
+    test_categories_projection_shrinks_payload()
+    test_iterator_yields_each_user_once()
+    test_unknown_category_is_rejected()
+    test_schema_enum_lists_every_section()
+    print("✅ Consolidated data tests passed")
@@ -0,0 +1,155 @@
+# test_conversation_store.py
+"""
+Tests for the conversation store: LRU eviction, TTL expiry, the SQLite tier,
+ownership, and chaining turns through previous_response_id against the mock
+Responses API (including the fallback when the upstream forgot a response)
+"""
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conversation_store import ConversationStore, continue_conversation, track_conversation
+from mock_responses_server import MockProfile
+from test_helpers import FakeClock, mock_client
+from tool_executor import ToolExecutor
+from turn_engine import TurnEngine, TurnFinished
+
+
+def test_lru_evicts_least_recently_used():
+    store = ConversationStore(max_conversations=2)
+    a, b, c = (store.open(cid, "alice") for cid in ("a", "b", "c"))
+    store.record(a, "resp_a")
+    store.record(b, "resp_b")
+    assert store.get("a").last_response_id == "resp_a"   # a is now the most recent
+    store.record(c, "resp_c")
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert store.stats()["evictions"] == 1
+
+
+def test_ttl_expires_idle_conversations():
+    clock = FakeClock(1_000_000.0)
+    store = ConversationStore(ttl=60, clock=clock)
+    conversation = store.open("c1", "alice")
+    store.record(conversation, "resp_1")
+    clock.now += 59
+    assert store.get("c1").continued
+    clock.now += 1
+    assert store.get("c1") is None
+    assert not store.open("c1", "alice").continued
+    assert store.stats()["expirations"] == 1
+
+
+def test_open_respects_ownership_and_client_ids():
+    store = ConversationStore()
+    fresh = store.open(None, "alice")
+    assert len(fresh.conversation_id) == 32 and not fresh.continued
+    store.record(store.open("mine", "alice"), "resp_1")
+    assert store.open("mine", "alice").last_response_id == "resp_1"
+    other = store.open("mine", "mallory")
+    assert other.conversation_id != "mine" and not other.continued
+
+
+def test_sqlite_tier_survives_restart_and_is_bounded():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "conversations.db")
+        clock = FakeClock(1_000_000.0)
+        store = ConversationStore(path=path, max_rows=3, clock=clock)
+        for i in range(5):
+            clock.now += 1
+            store.record(store.open(f"c{i}", "alice"), f"resp_{i}")
+        store.close()
+
+        reopened = ConversationStore(path=path, max_rows=3, clock=clock)
+        assert reopened.get("c4").last_response_id == "resp_4"
+        assert reopened.get("c4").turns == 1
+        reopened.purge()
+        assert reopened.stats()["stored"] == 3
+        assert reopened.get("c0") is None
+        assert reopened.forget("c4")
+        assert reopened.get("c4") is None
+        reopened.close()
+
+
+def test_hard_budget_stop_forgets_the_chain():
+    store = ConversationStore()
+    conversation = store.open("c1", "alice")
+    store.record(conversation, "resp_1")
+
+    async def events(stop_reason):
+        yield TurnFinished(response_id="resp_2", stop_reason=stop_reason)
+
+    async def drain(stop_reason):
+        return [e async for e in track_conversation(events(stop_reason), store, conversation)]
+
+    asyncio.run(drain("max_rounds"))
+    assert store.get("c1").last_response_id == "resp_2"
+    asyncio.run(drain("max_seconds"))
+    assert store.get("c1") is None and not conversation.continued
+
+
+def mock_engine():
+    client, app = mock_client(MockProfile(tokens_per_second=0, first_event_delay=0, answer_tokens=3), seed=3,
+                              max_retries=0)
+    executor = ToolExecutor(lambda name: (lambda: {"name": "John Doe"}), timeouts={})
+    return TurnEngine(client, "mock-model", executor), app.state.mock
+
+
+def test_follow_up_turn_sends_only_the_new_message():
+    engine, mock = mock_engine()
+    store = ConversationStore()
+    sent, modes = [], []
+
+    def run(input_items, previous_response_id):
+        sent.append((input_items, previous_response_id))
+        return engine.run(input_items, previous_response_id=previous_response_id)
+
+    async def turn(conversation, message):
+        history = [{"role": "system", "content": "You are MORGAN"}, {"role": "user", "content": message}]
+        new = [{"role": "user", "content": message}]
+        return [e async for e in continue_conversation(store, conversation, run, new, history, modes.append)]
+
+    conversation = store.open(None, "alice")
+    events = asyncio.run(turn(conversation, "first"))
+    first_response = events[-1].response_id
+    assert store.get(conversation.conversation_id).last_response_id == first_response
+
+    asyncio.run(turn(store.open(conversation.conversation_id, "alice"), "second"))
+    assert sent[0] == ([{"role": "system", "content": "You are MORGAN"}, {"role": "user", "content": "first"}], None)
+    assert sent[1] == ([{"role": "user", "content": "second"}], first_response)
+    assert modes == ["full", "chained"]
+    assert mock.chained == 1
+
+
+def test_unknown_previous_response_falls_back_to_full_history():
+    engine, mock = mock_engine()
+    store = ConversationStore()
+    conversation = store.open("c1", "alice")
+    store.record(conversation, "resp_expired")
+    modes = []
+
+    async def turn():
+        run = lambda items, previous: engine.run(items, previous_response_id=previous)
+        return [e async for e in continue_conversation(
+            store, conversation, run, [{"role": "user", "content": "again"}],
+            [{"role": "system", "content": "You are MORGAN"}, {"role": "user", "content": "again"}], modes.append)]
+
+    events = asyncio.run(turn())
+    assert isinstance(events[-1], TurnFinished) and events[-1].text
+    assert modes == ["fallback"]
+    assert mock.requests == 2
+    assert store.get("c1").last_response_id == events[-1].response_id
+    assert store.get("c1").turns == 2
+
+
+if __name__ == "__main__":
+    test_lru_evicts_least_recently_used()
+    test_ttl_expires_idle_conversations()
+    test_open_respects_ownership_and_client_ids()
+    test_sqlite_tier_survives_restart_and_is_bounded()
+    test_hard_budget_stop_forgets_the_chain()
+    test_follow_up_turn_sends_only_the_new_message()
+    test_unknown_previous_response_falls_back_to_full_history()
+    print("✅ Conversation store tests passed")
@@ -0,0 +1,70 @@
+# test_doc_retrieval.py
+"""
+Offline tests for chunking and BM25 selection of uploaded document text
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from doc_retrieval import BM25Index, chunk_pages, estimate_tokens, select_context
+
+LETTERHEAD = (
+    "Finance Department – Memorandum\nTo: Compliance Department\nFrom: Finance Department\n"
+    "Subject: Cross-Functional Data Request: Hayden Nolan"
+)
+BOILERPLATE = "Contoso Corp is committed to excellence. " * 30
+
+
+def long_letter() -> list[str]:
+    pages = [LETTERHEAD + "\n\n" + BOILERPLATE]
+    pages += [BOILERPLATE + "\n\n" + BOILERPLATE for _ in range(20)]
+    pages.append("We require the following:\n- Quarter-end variance schedules\n- Invoices over $50k")
+    pages += [BOILERPLATE for _ in range(10)]
+    return pages
+
+
+def test_chunks_respect_size_and_pages():
+    pages = long_letter()
+    chunks = chunk_pages(pages, max_tokens=100)
+
+    assert all(chunk.tokens <= 100 for chunk in chunks)
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert {chunk.page for chunk in chunks} == set(range(1, len(pages) + 1))
+    assert sum(len(chunk.text.split()) for chunk in chunks) == sum(len(page.split()) for page in pages)
+
+
+def test_request_list_found_beyond_old_truncation_point():
+    pages = long_letter()
+    assert sum(len(page) for page in pages[:21]) > 8000
+
+    context = select_context(pages, "Which invoices and variance schedules are requested?", token_budget=400)
+
+    assert "Invoices over $50k" in context.text
+    assert "Hayden Nolan" in context.text          # opening chunk is always kept
+    assert context.tokens <= 400
+    assert not context.complete
+    assert context.tokens < estimate_tokens("\n".join(pages)) / 10
+
+
+def test_unmatched_query_falls_back_to_document_order():
+    pages = ["Alpha section text", "Beta section text", "Gamma section text"]
+    context = select_context(pages, "summarise", token_budget=1000)
+
+    assert context.complete
+    assert context.text.index("Alpha") < context.text.index("Beta") < context.text.index("Gamma")
+
+
+def test_bm25_prefers_rarer_terms():
+    chunks = chunk_pages(["invoice invoice report", "report report report", "summary report"], max_tokens=50)
+    results = BM25Index(chunks).search("invoice report", k=3)
+
+    assert results[0][0].page == 1
+    assert [chunk.page for chunk, _ in results] == [1, 2, 3]
+
+
+if __name__ == "__main__":
+    test_chunks_respect_size_and_pages()
+    test_request_list_found_beyond_old_truncation_point()
+    test_unmatched_query_falls_back_to_document_order()
+    test_bm25_prefers_rarer_terms()
+    print("✅ Document retrieval tests passed")
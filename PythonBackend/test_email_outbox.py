@@ -0,0 +1,152 @@
+# test_email_outbox.py
+"""
+Offline tests for the e-mail outbox against the local SMTP stand-in
+"""
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from email_outbox import EmailOutbox, OutboundEmail, SMTPTransport
+from mock_smtp_server import MockSMTPServer
+
+
+def make_email(subject: str = "Audit alert", priority: str = "normal") -> OutboundEmail:
+    return OutboundEmail(sender="noreply@example.com", recipients=["compliance@example.com"],
+                         subject=subject, content="Details", sender_name="Compliance", priority=priority)
+
+
+def make_outbox(server: MockSMTPServer, spool_dir=None, **kwargs) -> EmailOutbox:
+    host, port = server.address
+    return EmailOutbox(lambda: SMTPTransport(host, port, starttls=False, timeout=5), spool_dir=spool_dir,
+                       retry_base=0.01, **kwargs)
+
+
+def test_batches_share_one_persistent_connection():
+    with MockSMTPServer() as server:
+        outbox = make_outbox(server, workers=1, batch_size=10)
+
+        async def run():
+            ids = [outbox.submit(make_email(f"Message {i}")) for i in range(5)]
+            await outbox.start()
+            await outbox.join()
+            statuses = [outbox.status(message_id)["status"] for message_id in ids]
+            await outbox.stop()
+            return statuses
+
+        statuses = asyncio.run(run())
+
+    assert statuses == ["sent"] * 5
+    assert len(server.messages) == 5
+    assert server.connections == 1
+    assert outbox.stats()["batches"] == 1
+    assert "Subject: Message 0" in server.messages[0].data
+
+
+def test_transient_failures_are_retried_and_permanent_ones_fail():
+    with MockSMTPServer(failures=[451, "drop"]) as server:
+        outbox = make_outbox(server, workers=1, batch_size=1, max_attempts=4)
+
+        async def wait_settled(count: int) -> None:
+            for _ in range(200):
+                if outbox.counts["sent"] + outbox.counts["failed"] == count:
+                    return
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await outbox.start()
+            retried = outbox.submit(make_email("Retried"))
+            await wait_settled(1)
+            server.failures = [550]
+            rejected = outbox.submit(make_email("Rejected"))
+            await wait_settled(2)
+            result = outbox.status(retried), outbox.status(rejected)
+            await outbox.stop()
+            return result
+
+        retried, rejected = asyncio.run(run())
+
+    # 451 is retried with backoff; the dropped connection is re-opened within the same attempt
+    assert retried["status"] == "sent"
+    assert retried["attempts"] == 2
+    assert server.connections == 2
+    assert rejected["status"] == "failed"
+    assert rejected["attempts"] == 1
+    assert "550" in rejected["last_error"]
+    assert [m.data.count("Subject: Retried") for m in server.messages] == [1]
+
+
+def test_spooled_mail_survives_a_restart():
+    with tempfile.TemporaryDirectory() as spool, MockSMTPServer() as server:
+        before_restart = make_outbox(server, spool_dir=spool)
+        message_id = before_restart.submit(make_email("Queued before a crash"))
+        assert os.path.exists(os.path.join(spool, f"{message_id}.json"))
+
+        after_restart = make_outbox(server, spool_dir=spool)
+
+        async def run():
+            await after_restart.start()
+            await after_restart.join()
+            await after_restart.stop()
+
+        asyncio.run(run())
+
+        assert len(server.messages) == 1
+        assert after_restart.status(message_id)["status"] == "sent"
+        assert not [name for name in os.listdir(spool) if name.endswith(".json")]
+
+
+def test_urgent_mail_jumps_the_queue():
+    with MockSMTPServer() as server:
+        outbox = make_outbox(server, workers=1, batch_size=1)
+
+        async def run():
+            for i in range(3):
+                outbox.submit(make_email(f"Normal {i}"))
+            outbox.submit(make_email("Low", priority="low"))
+            outbox.submit(make_email("Urgent", priority="urgent"))
+            await outbox.start()
+            await outbox.join()
+            await outbox.stop()
+
+        asyncio.run(run())
+
+    subjects = [line.split(": ", 1)[1] for m in server.messages for line in m.data.splitlines()
+                if line.startswith("Subject: ")]
+    assert subjects == ["Urgent", "Normal 0", "Normal 1", "Normal 2", "Low"]
+
+
+def test_status_is_known_as_soon_as_submit_returns():
+    with MockSMTPServer() as server:
+        outbox = make_outbox(server, workers=1)
+
+        async def run():
+            await outbox.start()
+            # A tool worker thread submits while the loop is busy: the id must not 404 in between
+            state = await asyncio.to_thread(lambda: outbox.status(outbox.submit(make_email("From a thread"))))
+            await outbox.join()
+            await outbox.stop()
+            return state
+
+        state = asyncio.run(run())
+
+    assert state is not None and state["status"] == "queued"
+    assert outbox.counts["queued"] == 1 and len(server.messages) == 1
+
+
+def test_send_email_tool_returns_once_queued():
+    from sendEmail import outbox, send_email
+    result = send_email(subject="Queued", content="Body")
+    assert result["success"] and result["status"] == "queued"
+    assert outbox.status(result["message_id"])["status"] == "queued"
+
+
+if __name__ == "__main__":
+    test_batches_share_one_persistent_connection()
+    test_transient_failures_are_retried_and_permanent_ones_fail()
+    test_spooled_mail_survives_a_restart()
+    test_urgent_mail_jumps_the_queue()
+    test_status_is_known_as_soon_as_submit_returns()
+    test_send_email_tool_returns_once_queued()
+    print("✅ E-mail outbox tests passed")
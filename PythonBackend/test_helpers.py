@@ -0,0 +1,39 @@
+# test_helpers.py
+"""
+Shared fixtures for the offline tests: an injectable clock and an Azure
+OpenAI client wired in-process to the mock Responses API
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+from openai import DEFAULT_MAX_RETRIES, AsyncAzureOpenAI
+
+from mock_responses_server import MockProfile, create_app
+
+
+class FakeClock:
+    """Time source that only moves when a test advances ``now``"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def mock_client(
+    profile: MockProfile, seed: int, host: str = "mock", max_retries: int = DEFAULT_MAX_RETRIES
+) -> tuple[AsyncAzureOpenAI, FastAPI]:
+    """Real SDK client whose requests are served by a fresh mock app, without a socket"""
+    app = create_app(profile, seed=seed)
+    client = AsyncAzureOpenAI(
+        base_url=f"http://{host}/openai/v1/",
+        api_key="mock",
+        api_version="preview",
+        max_retries=max_retries,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)),
+    )
+    return client, app
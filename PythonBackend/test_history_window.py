@@ -0,0 +1,114 @@
+# test_history_window.py
+"""
+Tests for the token-aware history window and the background rolling summary
+"""
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from history_window import HistoryManager, message_tokens
+
+
+def conversation(turns: int, words: int = 40) -> list[dict]:
+    messages = []
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"question {i} " + "detail " * words})
+        messages.append({"role": "assistant", "content": f"answer {i} " + "finding " * words})
+    return messages
+
+
+class RecordingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, previous, messages):
+        self.calls.append((previous, len(messages)))
+        first = messages[0]["content"].split()[1]
+        last = messages[-1]["content"].split()[1]
+        return f"{previous or ''} [turns {first}-{last}]".strip()
+
+
+def test_short_history_is_sent_unchanged():
+    manager = HistoryManager(budget_tokens=1000)
+    messages = conversation(2)
+    window = manager.window(messages)
+    assert window.items == messages
+    assert (window.kept, window.summarized, window.dropped) == (4, 0, 0)
+
+
+def test_long_history_keeps_newest_messages_within_budget():
+    manager = HistoryManager(budget_tokens=300, min_recent=2)
+    messages = conversation(10)
+    window = manager.window(messages)
+    assert window.items == messages[-window.kept:]
+    assert window.tokens <= 300
+    assert window.dropped == len(messages) - window.kept > 0
+
+    # The newest messages are always kept, even when they alone exceed the budget
+    tight = HistoryManager(budget_tokens=10, min_recent=2).window(messages)
+    assert tight.items == messages[-2:]
+
+
+def test_summary_is_built_in_background_and_reused():
+    summarizer = RecordingSummarizer()
+    manager = HistoryManager(summarizer, budget_tokens=400, min_recent=2)
+
+    async def scenario():
+        messages = conversation(2)
+        assert manager.refresh(messages) is None          # still fits: nothing to summarise
+        messages = conversation(8)
+        before = manager.window(messages)
+        assert before.dropped and not before.summarized   # no summary yet: the turn is not kept waiting
+        task = manager.refresh(messages)
+        assert task is not None and manager.refresh(messages) is task   # single flight
+        await manager.drain()
+
+        after = manager.window(messages)
+        assert after.items[0]["role"] == "assistant" and "[turns 0-" in after.items[0]["content"]
+        assert after.dropped == 0 and after.summarized + after.kept == len(messages)
+        assert after.tokens <= 400
+
+        # Two more turns: the summary is extended from the previous one, not rebuilt
+        longer = conversation(12)
+        manager.refresh(longer)
+        await manager.drain()
+        return longer
+
+    longer = asyncio.run(scenario())
+    assert len(summarizer.calls) == 2
+    assert summarizer.calls[0][0] is None and summarizer.calls[1][0].startswith("[turns 0-")
+    window = manager.window(longer)
+    assert window.dropped == 0 and window.tokens <= 400
+    assert manager.stats()["summaries_built"] == 2
+
+
+def test_failed_summary_leaves_the_window_working():
+    async def failing(previous, messages):
+        raise RuntimeError("upstream unavailable")
+
+    manager = HistoryManager(failing, budget_tokens=300)
+    messages = conversation(10)
+
+    async def scenario():
+        manager.refresh(messages)
+        await manager.drain()
+
+    asyncio.run(scenario())
+    assert manager.stats()["summary_failures"] == 1
+    window = manager.window(messages)
+    assert window.summarized == 0 and window.items == messages[-window.kept:]
+
+
+def test_message_tokens_counts_overhead():
+    assert message_tokens({"role": "user", "content": ""}) > 0
+    assert message_tokens({"role": "user", "content": "x" * 400}) > message_tokens({"role": "user", "content": "x"})
+
+
+if __name__ == "__main__":
+    test_short_history_is_sent_unchanged()
+    test_long_history_keeps_newest_messages_within_budget()
+    test_summary_is_built_in_background_and_reused()
+    test_failed_summary_leaves_the_window_working()
+    test_message_tokens_counts_overhead()
+    print("✅ History window tests passed")
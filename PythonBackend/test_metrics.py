@@ -0,0 +1,69 @@
+# test_metrics.py
+"""
+Offline tests for the metrics registry and the turn latency observer
+"""
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import (
+    FOLLOW_UP_GAP,
+    TIME_TO_FIRST_CONTENT,
+    TOOL_DURATION,
+    TURNS,
+    MetricsRegistry,
+    observe_turn,
+)
+from test_turn_engine import answer_round, make_engine, tool_round
+
+
+def test_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("endpoint",))
+    latency = registry.histogram("latency_seconds", "Latency", ("endpoint",), buckets=(0.1, 1))
+    requests.inc(endpoint="/chat")
+    requests.inc(2, endpoint="/chat")
+    latency.observe(0.05, endpoint='/a"b')
+    latency.observe(0.5, endpoint='/a"b')
+
+    text = registry.render()
+    assert "# TYPE requests_total counter\n" in text
+    assert 'requests_total{endpoint="/chat"} 3\n' in text
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="0.1"} 1\n' in text
+    assert 'latency_seconds_bucket{endpoint="/a\\"b",le="+Inf"} 2\n' in text
+    assert 'latency_seconds_count{endpoint="/a\\"b"} 2\n' in text
+
+    try:
+        requests.inc(path="/chat")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("wrong label names must be rejected")
+
+
+def test_observe_turn_records_latency_breakdown():
+    engine, _ = make_engine([
+        tool_round("resp_1", [("call_a", "lookup", {"username": "alice"})]),
+        answer_round("resp_2", "Done"),
+    ])
+    labels = {"endpoint": "/test", "scenario": "default", "effort": "low"}
+
+    async def run():
+        events = engine.run([{"role": "user", "content": "hi"}], tools=[{"type": "function", "name": "lookup"}])
+        return [event async for event in observe_turn(events, **labels)]
+
+    asyncio.run(run())
+
+    assert TURNS.value(**labels, outcome="completed") == 1
+    assert FOLLOW_UP_GAP.count(**labels) == 1
+    assert TIME_TO_FIRST_CONTENT.count(**labels) == 1
+    # "lookup" is not a registered tool: counted as unknown rather than as a new label value
+    assert TOOL_DURATION.count(**labels, tool="unknown", status="ok") == 1
+    assert 'tool="lookup"' not in TOOL_DURATION.render()
+
+
+if __name__ == "__main__":
+    test_prometheus_text_format()
+    test_observe_turn_records_latency_breakdown()
+    print("✅ Metrics tests passed")
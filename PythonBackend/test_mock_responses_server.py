@@ -0,0 +1,99 @@
+# test_mock_responses_server.py
+"""
+Offline tests for the mock Responses API server and the load-test report,
+running the real OpenAI client and turn engine against the mock in-process
+"""
+import asyncio
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from load_test import LoadTest, percentile
+from mock_responses_server import MockProfile
+from test_helpers import mock_client
+from tool_executor import ToolExecutor
+from turn_engine import ContentDelta, FunctionResult, ReasoningDelta, ResponseCompleted, TurnEngine, TurnFinished
+
+TOOLS = [{"type": "function", "name": "get_user_info", "parameters": {"type": "object", "properties": {}}}]
+
+
+def mock_engine(profile: MockProfile) -> tuple[TurnEngine, FastAPI]:
+    client, app = mock_client(profile, seed=7)
+    executor = ToolExecutor(lambda name: (lambda: {"name": "John Doe"}), timeouts={})
+    return TurnEngine(client, "mock-model", executor), app
+
+
+def run_turn(engine: TurnEngine, **kwargs) -> list:
+    async def collect():
+        return [event async for event in engine.run([{"role": "user", "content": "hi"}], **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_tool_round_then_answer_through_openai_client():
+    profile = MockProfile(tokens_per_second=0, first_event_delay=0, reasoning_tokens=3, answer_tokens=5)
+    engine, app = mock_engine(profile)
+    events = run_turn(engine, tools=TOOLS, reasoning={"effort": "low", "summary": "auto"})
+
+    results = [e.result for e in events if isinstance(e, FunctionResult)]
+    assert [r.name for r in results] == ["get_user_info"]
+    assert results[0].ok
+    assert len([e for e in events if isinstance(e, ReasoningDelta)]) == 6   # both responses reason
+    assert {e.round for e in events if isinstance(e, ContentDelta)} == {1}
+    usages = [e.usage for e in events if isinstance(e, ResponseCompleted)]
+    assert [u.output_tokens_details.reasoning_tokens for u in usages] == [3, 3]
+    finished = events[-1]
+    assert isinstance(finished, TurnFinished)
+    assert len(finished.text.split(" ")) == 5
+    assert app.state.mock.requests == 2
+
+
+def test_no_tools_or_reasoning_answers_directly():
+    engine, _ = mock_engine(MockProfile(tokens_per_second=0, first_event_delay=0, answer_tokens=4))
+    events = run_turn(engine)
+    assert not [e for e in events if isinstance(e, (FunctionResult, ReasoningDelta))]
+    assert len([e for e in events if isinstance(e, ContentDelta)]) == 4
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_load_test_reports_ttft_and_errors():
+    app = FastAPI()
+
+    @app.post("/chat")
+    async def chat():
+        return {"response": "ok", "success": True}
+
+    @app.post("/api/chat/stream")
+    async def stream():
+        async def frames():
+            yield f"data: {json.dumps({'type': 'content', 'content': 'Hi'})}\n\n"
+            yield f"data: {json.dumps({'error': 'upstream failed'})}\n\n"
+        return StreamingResponse(frames(), media_type="text/event-stream")
+
+    test = LoadTest("http://backend", ["chat", "stream"], concurrency=3, requests=6)
+    report = asyncio.run(test.run(transport=httpx.ASGITransport(app=app)))
+
+    assert report["overall"]["requests"] == 6
+    assert report["endpoints"]["chat"]["errors"] == 0
+    assert report["endpoints"]["chat"]["ttft_ms"]["p50"] is not None
+    assert report["endpoints"]["stream"]["error_rate"] == 1.0
+    assert report["overall"]["error_breakdown"] == {"upstream failed": 3}
+
+
+if __name__ == "__main__":
+    test_tool_round_then_answer_through_openai_client()
+    test_no_tools_or_reasoning_answers_directly()
+    test_percentile_nearest_rank()
+    test_load_test_reports_ttft_and_errors()
+    print("✅ Mock server and load test tests passed")
@@ -0,0 +1,161 @@
+# test_model_pool.py
+"""
+Tests for the model backend pool against several mock Responses APIs:
+configuration, least-outstanding routing, 429/5xx ejection with cool-down
+and probing, transparent failover and backend affinity of chained responses
+"""
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from openai import AsyncAzureOpenAI
+
+from mock_responses_server import MockProfile, create_app
+from model_pool import Backend, ModelPool, parse_backends
+from test_helpers import FakeClock, mock_client
+from tool_executor import ToolExecutor
+from turn_engine import TurnEngine, TurnFinished
+
+TOOLS = [{"type": "function", "name": "get_user_info", "parameters": {"type": "object", "properties": {}}}]
+
+
+def mock_backend(name: str, weight: float = 1.0, capacity: int = 0, **profile) -> tuple[Backend, object]:
+    settings = {"tokens_per_second": 0, "first_event_delay": 0, "answer_tokens": 3, "tool_call_rate": 0, **profile}
+    client, app = mock_client(MockProfile(**settings), seed=4, host=name, max_retries=0)
+    return Backend(name, client, f"{name}-deployment", weight, capacity), app.state.mock
+
+
+def run_turns(pool: ModelPool, count: int = 1, **kwargs) -> list[TurnFinished]:
+    engine = TurnEngine(pool, "o3", ToolExecutor(lambda name: (lambda: {"name": "John Doe"}), timeouts={}))
+
+    async def turn():
+        finished = None
+        async for event in engine.run([{"role": "user", "content": "hi"}], **kwargs):
+            if isinstance(event, TurnFinished):
+                finished = event
+        return finished
+
+    async def turns():
+        return await asyncio.gather(*(turn() for _ in range(count)))
+    return asyncio.run(turns())
+
+
+def test_parse_backends():
+    configs = parse_backends('[{"endpoint": "https://east.example.com/openai/v1/", "deployment": "o3", "weight": 2},'
+                             ' {"endpoint": "http://localhost:8101/openai/v1/", "deployment": "o3", "api_key": "k"}]')
+    assert [c.name for c in configs] == ["east.example.com/o3", "localhost/o3"]
+    assert configs[0].weight == 2 and configs[1].api_key == "k" and configs[1].capacity == 0
+    for raw in ("", "{}", "[]", '[{"endpoint": "x"}]', '[{"endpoint": "x", "deployment": "d", "weight": 0}]',
+                '[{"endpoint": "x", "deployment": "d", "colour": "red"}]'):
+        try:
+            parse_backends(raw)
+            assert False, f"accepted {raw!r}"
+        except ValueError:
+            pass
+
+
+def test_least_outstanding_relative_to_weight_and_capacity():
+    big, small = Backend("big", None, "o3", weight=2), Backend("small", None, "o3", capacity=1)
+    pool = ModelPool([small, big])
+    big.outstanding, small.requests = 1, 1
+    assert pool.candidates()[0] is big          # (1 + 1) / 2 == (0 + 1) / 1, fewer requests per weight
+    big.outstanding = 3
+    assert pool.candidates()[0] is small
+    small.outstanding = 1                       # at capacity: only used when nothing else can take it
+    assert [b.name for b in pool.candidates()] == ["big", "small"]
+
+
+def test_concurrent_turns_spread_over_backends():
+    (a, mock_a), (b, mock_b) = mock_backend("a", first_event_delay=0.05), mock_backend("b", first_event_delay=0.05)
+    pool = ModelPool([a, b])
+    assert all(f.text for f in run_turns(pool, count=6))
+    assert mock_a.requests == mock_b.requests == 3
+    assert a.outstanding == b.outstanding == 0
+
+
+def test_throttled_backend_is_ejected_and_requests_fail_over():
+    (a, mock_a), (b, mock_b) = mock_backend("a", throttle_rate=1, retry_after=30), mock_backend("b")
+    clock = FakeClock(1000.0)
+    outcomes = []
+    pool = ModelPool([a, b], cooldown=5, clock=clock, on_outcome=lambda name, outcome: outcomes.append((name, outcome)))
+    assert run_turns(pool)[0].text
+    assert outcomes == [("a", "throttled"), ("b", "ok")] and pool.failovers == 1
+    assert a.state(clock()) == "ejected" and a.ejected_until == clock() + 30   # Retry-After beats the cool-down
+
+    run_turns(pool, count=2)
+    assert mock_a.requests == 1 and mock_b.requests == 3
+    clock.now += 30
+    assert a.state(clock()) == "probing"
+
+
+def test_probe_after_cool_down_heals_or_doubles_the_ejection():
+    (a, mock_a), (b, _) = mock_backend("a", error_rate=1), mock_backend("b")
+    clock = FakeClock(1000.0)
+    pool = ModelPool([a, b], cooldown=10, eject_after=2, clock=clock)
+    run_turns(pool)
+    assert a.state(clock()) == "healthy" and a.failures == 1     # one 5xx is not enough
+    run_turns(pool)
+    assert a.state(clock()) == "ejected" and a.ejected_until == clock() + 10
+
+    clock.now += 10                                              # probe fails: ejected again, for twice as long
+    run_turns(pool)
+    assert mock_a.requests == 3 and a.ejected_until == clock() + 20
+
+    clock.now += 20
+    mock_a.profile.error_rate = 0
+    a.requests = -10                                             # make a the first choice for the probe
+    run_turns(pool)
+    assert mock_a.requests == 4 and a.state(clock()) == "healthy" and a.ejection_streak == 0
+
+
+def test_chained_rounds_stay_on_the_backend_that_created_the_response():
+    (a, mock_a), (b, mock_b) = mock_backend("a", tool_call_rate=1), mock_backend("b", tool_call_rate=1)
+    pool = ModelPool([a, b])
+    finished = run_turns(pool, count=4, tools=TOOLS)
+    assert all(f.text and f.tool_results for f in finished)     # every follow-up found its previous response
+    assert mock_a.chained == mock_a.requests / 2 and mock_b.chained == mock_b.requests / 2
+    assert mock_a.requests and mock_b.requests
+
+
+def test_unknown_previous_response_is_not_retried():
+    (a, mock_a), (b, mock_b) = mock_backend("a"), mock_backend("b")
+    pool = ModelPool([a, b])
+    try:
+        run_turns(pool, previous_response_id="resp_unknown")
+        assert False, "404 swallowed"
+    except Exception as e:
+        assert getattr(e, "status_code", None) == 404
+    assert mock_a.requests + mock_b.requests == 1 and a.failures == b.failures == 0
+
+
+def test_close_shuts_a_shared_http_pool_once():
+    app = create_app(MockProfile(), seed=4)
+    shared, own = (httpx.AsyncClient(transport=httpx.ASGITransport(app=app)) for _ in range(2))
+    closes = []
+    for http_client in (shared, own):
+        aclose = http_client.aclose
+
+        async def counted(http_client=http_client, aclose=aclose):
+            closes.append(http_client)
+            await aclose()
+        http_client.aclose = counted
+    clients = [AsyncAzureOpenAI(base_url=f"http://{name}/openai/v1/", api_key="mock", api_version="preview",
+                                http_client=http_client)
+               for name, http_client in (("a", shared), ("b", shared), ("c", own))]
+    pool = ModelPool([Backend(name, client, "o3") for name, client in zip("abc", clients)])
+    asyncio.run(pool.close())
+    assert closes == [shared, own] and shared.is_closed and own.is_closed
+
+
+if __name__ == "__main__":
+    test_parse_backends()
+    test_least_outstanding_relative_to_weight_and_capacity()
+    test_concurrent_turns_spread_over_backends()
+    test_throttled_backend_is_ejected_and_requests_fail_over()
+    test_probe_after_cool_down_heals_or_doubles_the_ejection()
+    test_chained_rounds_stay_on_the_backend_that_created_the_response()
+    test_unknown_previous_response_is_not_retried()
+    test_close_shuts_a_shared_http_pool_once()
+    print("✅ Model pool tests passed")
@@ -0,0 +1,64 @@
+# test_notifications.py
+"""
+Offline tests for compliance notification rendering and de-duplication
+"""
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sendEmail import NotificationDeduplicator, outbox, render_notification, send_compliance_notification
+
+
+def test_render_keeps_the_template_text():
+    subject, body = render_notification("audit_alert", "Invoice {42} is missing", "urgent")
+    assert subject == "🔴 URGENT - 🔍 Audit Alert Notification"
+    assert body.startswith("Dear Shayon,\n\nAn audit-related item requires your immediate attention.")
+    assert "Audit Details:\nInvoice {42} is missing\n\nPlease review" in body
+    assert body.endswith("Compliance Communications System")
+    assert render_notification("unknown", "x")[0] == "ℹ️ Compliance Notification"
+
+
+def test_identical_notifications_collapse_within_the_window():
+    first = send_compliance_notification("audit_alert", "Vendor 17 failed its control test", "high")
+    repeat = send_compliance_notification("audit_alert", "Vendor 17 failed its control test", "high")
+    other_priority = send_compliance_notification("audit_alert", "Vendor 17 failed its control test", "urgent")
+
+    assert first["status"] == "queued"
+    assert repeat["status"] == "duplicate"
+    assert repeat["message_id"] == first["message_id"]
+    assert other_priority["status"] == "queued"
+    assert outbox.status(other_priority["message_id"]) is not None
+
+
+def test_parallel_identical_sends_queue_once():
+    dedup = NotificationDeduplicator(window_seconds=60)
+    sent = []
+
+    def send():
+        sent.append(1)
+        return {"success": True, "message_id": f"m{len(sent)}"}
+
+    key = dedup.key("training_due", "Annual AML training", "normal")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: dedup.send_once(key, send), range(8)))
+
+    assert len(sent) == 1
+    assert sorted(duplicate_of for duplicate_of, _ in results if duplicate_of) == ["m1"] * 7
+    assert dedup.suppressed == 7
+
+
+def test_zero_window_disables_deduplication():
+    dedup = NotificationDeduplicator(window_seconds=0)
+    send = lambda: {"success": True, "message_id": "m"}  # noqa: E731
+    key = dedup.key("general", "x", "low")
+    assert dedup.send_once(key, send)[0] is None
+    assert dedup.send_once(key, send)[0] is None
+
+
+if __name__ == "__main__":
+    test_render_keeps_the_template_text()
+    test_identical_notifications_collapse_within_the_window()
+    test_parallel_identical_sends_queue_once()
+    test_zero_window_disables_deduplication()
+    print("✅ Notification tests passed")
@@ -0,0 +1,122 @@
+# test_pdf_extract.py
+"""
+Offline tests for process-pool PDF extraction and its content-hash cache
+"""
+import asyncio
+import glob
+import io
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import PyPDF2
+
+from pdf_extract import PDFExtractionError, PDFTextExtractor, extract_pages, join_pages
+
+LETTERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Contoso_Request_Letters")
+
+
+def load_letters(count: int = 3) -> list[bytes]:
+    paths = sorted(glob.glob(os.path.join(LETTERS_DIR, "*.pdf")))[:count]
+    letters = []
+    for path in paths:
+        with open(path, "rb") as f:
+            letters.append(f.read())
+    return letters
+
+
+def merged_pdf(letters: list[bytes]) -> bytes:
+    writer = PyPDF2.PdfWriter()
+    for letter in letters:
+        for page in PyPDF2.PdfReader(io.BytesIO(letter)).pages:
+            writer.add_page(page)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_split_extraction_matches_sequential():
+    document = merged_pdf(load_letters())
+    expected = extract_pages(document)
+    assert len(expected) > 2
+
+    extractor = PDFTextExtractor(max_workers=2, pages_per_task=1)
+    try:
+        pages = asyncio.run(extractor.extract_pages(document))
+        text = asyncio.run(extractor.extract_text(document))
+    finally:
+        extractor.shutdown()
+
+    assert pages == expected
+    assert text == join_pages(expected)
+    assert extractor.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_concurrent_uploads_share_one_extraction():
+    letter = load_letters(1)[0]
+    extractor = PDFTextExtractor(max_workers=2)
+
+    async def scenario():
+        return await asyncio.gather(*(extractor.extract_text(letter) for _ in range(4)))
+
+    try:
+        texts = asyncio.run(scenario())
+    finally:
+        extractor.shutdown()
+
+    assert len(set(texts)) == 1 and texts[0]
+    assert extractor.misses == 1
+
+
+def test_invalid_pdf_raises_and_is_not_cached():
+    extractor = PDFTextExtractor(max_workers=1)
+    try:
+        for _ in range(2):
+            try:
+                asyncio.run(extractor.extract_text(b"not a pdf"))
+            except PDFExtractionError:
+                pass
+            else:
+                raise AssertionError("expected PDFExtractionError")
+    finally:
+        extractor.shutdown()
+
+    assert extractor.stats() == {"size": 0, "hits": 0, "misses": 2}
+
+
+def test_cancelled_leader_releases_waiting_uploads():
+    extractor = PDFTextExtractor(max_workers=1)
+
+    async def never_finishes(pdf_bytes: bytes) -> list[str]:
+        await asyncio.Event().wait()
+    extractor._extract_uncached = never_finishes
+
+    async def scenario():
+        leader = asyncio.create_task(extractor.extract_pages(b"%PDF"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(extractor.extract_pages(b"%PDF"))
+        await asyncio.sleep(0)
+        leader.cancel()         # e.g. the client of the first upload disconnected
+        try:
+            await asyncio.wait_for(waiter, timeout=5)
+        except PDFExtractionError:
+            pass
+        else:
+            raise AssertionError("expected PDFExtractionError")
+        try:
+            await leader
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("the leader must stay cancelled")
+
+    asyncio.run(scenario())
+    assert not extractor._in_flight and extractor.stats()["size"] == 0
+
+
+if __name__ == "__main__":
+    test_split_extraction_matches_sequential()
+    test_concurrent_uploads_share_one_extraction()
+    test_invalid_pdf_raises_and_is_not_cached()
+    test_cancelled_leader_releases_waiting_uploads()
+    print("✅ PDF extraction tests passed")
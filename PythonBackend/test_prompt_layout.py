@@ -0,0 +1,97 @@
+# test_prompt_layout.py
+"""
+Tests for the canonical prompt layout and cached-token accounting: every
+kind of turn shares a byte-identical prefix, and cache hits reported by the
+(mock) upstream show up in the usage ledger and metrics
+"""
+import asyncio
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import PROMPT_CACHE_LOOKUPS
+from mock_responses_server import MockProfile
+from prompt_layout import PromptLayout
+from test_helpers import mock_client
+from tool_executor import ToolExecutor
+from turn_engine import TurnEngine
+from usage_accounting import TokenUsage, UsageLedger, account_usage
+
+SYSTEM_PROMPTS = {"default": "You are MORGAN. " + "Follow the compliance directives. " * 200}
+ADDITIONS = {"document": "You have been provided with a PDF document."}
+TOOLS = [{"type": "function", "name": "get_user_info", "parameters": {"type": "object", "properties": {}}}]
+
+
+def serialized_prefix(items: list[dict], count: int) -> str:
+    return json.dumps(items[:count], ensure_ascii=False)
+
+
+def test_prefix_is_byte_identical_across_turn_kinds():
+    layout = PromptLayout(SYSTEM_PROMPTS, ADDITIONS, tools_version="v1")
+    chat = layout.build("default", "What is my training status?")
+    unknown_scenario = layout.build("Scenario1", "Hi")
+    with_history = layout.build("default", "And now?", history=[{"role": "user", "content": "earlier"},
+                                                                 {"role": "assistant", "content": "reply"}])
+    upload = layout.build("default", "User message: summarise\n\nPDF Document Content: ...", additions=("document",))
+
+    assert chat.prefix_key == unknown_scenario.prefix_key == with_history.prefix_key
+    assert serialized_prefix(chat.items, 1) == serialized_prefix(with_history.items, 1) == serialized_prefix(upload.items, 1)
+    assert upload.items[1] == {"role": "system", "content": ADDITIONS["document"]}
+    assert upload.static_items == 2 and upload.prefix_key != chat.prefix_key
+    assert with_history.items[1:3] == [{"role": "user", "content": "earlier"}, {"role": "assistant", "content": "reply"}]
+    assert with_history.user_item == {"role": "user", "content": "And now?"}
+
+
+def test_prefix_key_tracks_prompt_and_tools():
+    key = PromptLayout(SYSTEM_PROMPTS, ADDITIONS, tools_version="v1").prefix("default")[1]
+    assert key.startswith("default:")
+    assert PromptLayout(SYSTEM_PROMPTS, ADDITIONS, tools_version="v2").prefix("default")[1] != key
+    assert PromptLayout({"default": "Other prompt"}, ADDITIONS, tools_version="v1").prefix("default")[1] != key
+    try:
+        PromptLayout(SYSTEM_PROMPTS, ADDITIONS).prefix("default", ("unknown",))
+        assert False, "unknown addition accepted"
+    except KeyError:
+        pass
+
+
+def test_cache_hit_rate():
+    usage = TokenUsage(input_tokens=2000, cached_input_tokens=1536)
+    assert usage.to_dict()["cache_hit_rate"] == 0.768
+    assert TokenUsage().to_dict()["cache_hit_rate"] is None
+
+
+def test_shared_prefix_is_reported_as_cached():
+    client, app = mock_client(MockProfile(tokens_per_second=0, first_event_delay=0, answer_tokens=3, tool_call_rate=0),
+                              seed=5)
+    engine = TurnEngine(client, "mock-model", ToolExecutor(lambda name: None, timeouts={}))
+    layout = PromptLayout(SYSTEM_PROMPTS, ADDITIONS, tools_version="v1")
+    ledger = UsageLedger()
+    before = PROMPT_CACHE_LOOKUPS.value(endpoint="layout-test", result="hit")
+
+    async def turn(message: str):
+        prompt = layout.build("default", message)
+        events = account_usage(engine.run(prompt.items, tools=TOOLS), ledger, "alice",
+                               endpoint="layout-test", prefix=prompt.prefix_key)
+        async for _ in events:
+            pass
+        return prompt.prefix_key
+
+    async def scenario():
+        await turn("first question")
+        return await turn("a different second question")
+
+    prefix_key = asyncio.run(scenario())
+    by_prefix = ledger.snapshot()["by_prefix"][prefix_key]
+    assert by_prefix["responses"] == 2
+    assert by_prefix["cached_input_tokens"] >= 1024
+    assert 0 < by_prefix["cache_hit_rate"] < 1
+    assert PROMPT_CACHE_LOOKUPS.value(endpoint="layout-test", result="hit") == before + 1
+
+
+if __name__ == "__main__":
+    test_prefix_is_byte_identical_across_turn_kinds()
+    test_prefix_key_tracks_prompt_and_tools()
+    test_cache_hit_rate()
+    test_shared_prefix_is_reported_as_cached()
+    print("✅ Prompt layout tests passed")
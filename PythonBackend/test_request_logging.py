@@ -0,0 +1,95 @@
+# test_request_logging.py
+"""
+Offline tests for structured logging, correlation ids and sampled debug output
+"""
+import asyncio
+import json
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from request_logging import (
+    CorrelationIdFilter,
+    CorrelationIdMiddleware,
+    JsonFormatter,
+    correlation_id,
+    debug_sampled,
+    log_event,
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines: list[str] = []
+        self.setFormatter(JsonFormatter())
+        self.addFilter(CorrelationIdFilter())
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def make_logger(level=logging.INFO):
+    logger = logging.getLogger("test_request_logging")
+    logger.handlers = [ListHandler()]
+    logger.propagate = False
+    logger.setLevel(level)
+    return logger, logger.handlers[0]
+
+
+def test_json_records_carry_fields_and_correlation_id():
+    logger, handler = make_logger()
+    token = correlation_id.set("req-1")
+    try:
+        log_event(logger, logging.INFO, "stream summary", events=3, event_counts={"content": 2})
+    finally:
+        correlation_id.reset(token)
+
+    record = json.loads(handler.lines[0])
+    assert record["message"] == "stream summary"
+    assert record["correlation_id"] == "req-1"
+    assert record["events"] == 3 and record["event_counts"] == {"content": 2}
+
+
+def test_disabled_levels_cost_nothing():
+    logger, handler = make_logger(logging.INFO)
+
+    class Exploding:
+        def __repr__(self):
+            raise AssertionError("formatted a disabled record")
+
+    log_event(logger, logging.DEBUG, "upstream event", payload=Exploding())
+    assert handler.lines == []
+    assert not debug_sampled(logger, rate=1.0)
+
+    logger.setLevel(logging.DEBUG)
+    assert debug_sampled(logger, rate=1.0)
+    assert not debug_sampled(logger, rate=0.0)
+
+
+def test_middleware_propagates_and_echoes_request_id():
+    seen = []
+    sent = []
+
+    async def app(scope, receive, send):
+        seen.append(correlation_id.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"x-request-id", b"abc123")]}
+    asyncio.run(CorrelationIdMiddleware(app)(scope, None, send))
+
+    assert seen == ["abc123"]
+    assert (b"x-request-id", b"abc123") in sent[0]["headers"]
+    assert correlation_id.get() == "-"
+
+
+if __name__ == "__main__":
+    test_json_records_carry_fields_and_correlation_id()
+    test_disabled_levels_cost_nothing()
+    test_middleware_propagates_and_echoes_request_id()
+    print("✅ Request logging tests passed")
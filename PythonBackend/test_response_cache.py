@@ -0,0 +1,135 @@
+# test_response_cache.py
+"""
+Tests for the response cache: key normalisation, TTL and LRU bounds, the
+on-disk tier, refusing answers that ran write tools, and recording a
+streamed turn from the mock Responses API for replay
+"""
+import asyncio
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_responses_server import MockProfile
+from response_cache import ResponseCache, normalize_message
+from sse import TurnPresenter
+from test_helpers import FakeClock, mock_client
+from tool_executor import ToolExecutor, ToolResult
+from turn_engine import TurnEngine, TurnFinished
+
+CACHEABLE = {"get_user_info": True, "get_vendor_risk": True, "send_email": False}
+
+
+def new_cache(**kwargs) -> ResponseCache:
+    return ResponseCache(lambda name: CACHEABLE[name], **kwargs)
+
+
+def test_key_normalises_the_message_only():
+    assert normalize_message("  Show vendor   risk ratings for CONTOSO? ") == "show vendor risk ratings for contoso"
+    key = ResponseCache.key("/chat", "Show vendor risk ratings for Contoso", "default", {"effort": "medium"}, "v1")
+    assert ResponseCache.key("/chat", "show vendor risk ratings for contoso?", "default",
+                             {"effort": "medium"}, "v1") == key
+    variants = [
+        ResponseCache.key("/chat", "Show vendor risk ratings for Fabrikam", "default", {"effort": "medium"}, "v1"),
+        ResponseCache.key("/chat", "Show vendor risk ratings for Contoso", "Scenario1", {"effort": "medium"}, "v1"),
+        ResponseCache.key("/chat", "Show vendor risk ratings for Contoso", "default", {"effort": "high"}, "v1"),
+        ResponseCache.key("/chat", "Show vendor risk ratings for Contoso", "default", {"effort": "medium"}, "v2"),
+        ResponseCache.key("/chat", "Show vendor risk ratings for Contoso", "default", {"effort": "medium"}, "v1",
+                          document_hash="abc"),
+        ResponseCache.key("/chat", "Show vendor risk ratings for Contoso", "default", {"effort": "medium"}, "v1",
+                          scope="alice"),
+        ResponseCache.key("/chat/cot-stream", "Show vendor risk ratings for Contoso", "default",
+                          {"effort": "medium"}, "v1"),
+    ]
+    assert key not in variants and len(set(variants)) == len(variants)
+
+
+def test_ttl_and_lru_bound():
+    clock = FakeClock(1_000_000.0)
+    cache = new_cache(max_entries=2, ttl=60, clock=clock)
+    done = lambda text: TurnFinished(text=text, response_id=f"resp_{text}")
+    for key in ("a", "b"):
+        assert cache.store_turn(key, done(key))
+    assert cache.get("a").text == "a"            # a is now the most recent
+    cache.store_turn("c", done("c"))
+    assert cache.get("b") is None and cache.get("a") is not None
+    clock.now += 60
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["hits"] == 2
+
+
+def test_disk_tier_survives_restart_and_clear():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = FakeClock(1_000_000.0)
+        cache = new_cache(directory=tmp, clock=clock)
+        cache.store_turn("k", TurnFinished(text="Ratings: A", response_id="resp_1"))
+        reopened = new_cache(directory=tmp, clock=clock)
+        entry = reopened.get("k")
+        assert entry.text == "Ratings: A" and entry.response_id == "resp_1"
+        assert reopened.stats()["disk_entries"] == 1
+        assert reopened.clear() == 1
+        assert new_cache(directory=tmp, clock=clock).get("k") is None
+
+
+def test_write_tools_failures_and_budget_stops_are_not_stored():
+    cache = new_cache()
+    read = ToolResult(call_id="c1", name="get_vendor_risk", output={"rating": "A"})
+    write = ToolResult(call_id="c2", name="send_email", output={"queued": True})
+    failed = ToolResult(call_id="c3", name="get_user_info", error="timeout")
+    assert cache.store_turn("read", TurnFinished(text="ok", tool_results=[read]))
+    assert not cache.store_turn("write", TurnFinished(text="sent", tool_results=[read, write]))
+    assert not cache.store_turn("failed", TurnFinished(text="sorry", tool_results=[failed]))
+    assert not cache.store_turn("stopped", TurnFinished(text="partial", stop_reason="max_seconds"))
+    assert cache.get("write") is None and cache.get("failed") is None and cache.get("stopped") is None
+    assert cache.stats()["skipped"] == 3
+
+
+def test_record_refuses_streams_that_sent_email():
+    cache = new_cache()
+
+    async def stream(*payloads):
+        for payload in payloads:
+            yield payload
+
+    async def drain(key, *payloads):
+        return [p async for p in cache.record(key, stream(*payloads))]
+
+    email = {"type": "cot_function_call_added", "function": "send_email", "call_id": "c1"}
+    asyncio.run(drain("email", email, {"type": "content", "content": "Sent"}, {"type": "done", "done": True}))
+    asyncio.run(drain("unfinished", {"type": "content", "content": "Half"}))
+    asyncio.run(drain("error", {"type": "content", "content": "x"}, {"type": "error", "error": "boom"}))
+    assert cache.get("email") is None and cache.get("unfinished") is None and cache.get("error") is None
+
+
+def test_streamed_turn_is_recorded_and_replayed():
+    client, app = mock_client(MockProfile(tokens_per_second=0, first_event_delay=0, answer_tokens=5, tool_call_rate=0),
+                              seed=2)
+    engine = TurnEngine(client, "mock-model", ToolExecutor(lambda name: None, timeouts={}))
+    cache = new_cache()
+
+    async def first():
+        presenter = TurnPresenter(call_prefix="cot_")
+
+        async def answer():
+            yield {"type": "conversation", "conversation_id": "c1", "continued": False}
+            async for payload in presenter.present(engine.run([{"role": "user", "content": "Hi"}])):
+                yield payload
+            yield {"type": "done", "done": True}
+
+        return [p async for p in cache.record("k", answer(), lambda: presenter.finished.response_id)]
+
+    streamed = asyncio.run(first())
+    entry = cache.get("k")
+    assert entry.payloads == streamed[1:]             # the per-request conversation payload is not recorded
+    assert entry.text and entry.text == "".join(p["content"] for p in streamed if p.get("type") == "content")
+    assert entry.response_id and app.state.mock.requests == 1
+
+
+if __name__ == "__main__":
+    test_key_normalises_the_message_only()
+    test_ttl_and_lru_bound()
+    test_disk_tier_survives_restart_and_clear()
+    test_write_tools_failures_and_budget_stops_are_not_stored()
+    test_record_refuses_streams_that_sent_email()
+    test_streamed_turn_is_recorded_and_replayed()
+    print("✅ Response cache tests passed")
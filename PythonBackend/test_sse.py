@@ -0,0 +1,92 @@
+# test_sse.py
+"""
+Offline tests for SSE delta coalescing
+"""
+import asyncio
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sse import DeltaCoalescer
+
+
+async def scripted(items):
+    """Yield payloads; a float in the script is a pause in seconds"""
+    for item in items:
+        if isinstance(item, float):
+            await asyncio.sleep(item)
+        else:
+            yield item
+
+
+def collect(coalescer, items):
+    async def run():
+        return [payload async for payload in coalescer.coalesce(scripted(items))]
+    return asyncio.run(run())
+
+
+def content(text):
+    return {"type": "content", "content": text}
+
+
+def test_merges_deltas_and_flushes_before_structural_events():
+    items = [{"type": "reasoning", "content": "a"}, {"type": "reasoning", "content": "b"},
+             {"type": "content_start"}, content("Hel"), content("lo"),
+             {"type": "function_args_delta", "call_id": "c1", "delta": '{"a"'},
+             {"type": "function_args_delta", "call_id": "c1", "delta": ":1}"},
+             {"type": "function_args_delta", "call_id": "c2", "delta": "{}"},
+             {"type": "function_call", "function": "f"}]
+    coalescer = DeltaCoalescer(window=1.0, max_bytes=0)
+    out = collect(coalescer, items)
+
+    assert out == [{"type": "reasoning", "content": "ab"}, {"type": "content_start"}, content("Hello"),
+                   {"type": "function_args_delta", "call_id": "c1", "delta": '{"a":1}'},
+                   {"type": "function_args_delta", "call_id": "c2", "delta": "{}"},
+                   {"type": "function_call", "function": "f"}]
+    assert (coalescer.received, coalescer.emitted) == (9, 6)
+
+
+def test_byte_threshold_and_time_window_flush():
+    out = collect(DeltaCoalescer(window=1.0, max_bytes=4), [content("ab"), content("cd"), content("e")])
+    assert out == [content("abcd"), content("e")]
+
+    # An upstream pause longer than the window flushes what is buffered
+    started = time.perf_counter()
+    out = collect(DeltaCoalescer(window=0.02, max_bytes=0), [content("a"), content("b"), 0.2, content("c")])
+    assert out == [content("ab"), content("c")]
+    assert time.perf_counter() - started < 1.0
+
+
+def test_disabled_window_passes_payloads_through():
+    items = [content("a"), content("b")]
+    assert collect(DeltaCoalescer(window=0), items) == items
+
+
+def test_closing_early_closes_upstream():
+    closed = []
+
+    async def upstream():
+        try:
+            while True:
+                yield content("x")
+                await asyncio.sleep(0.005)
+        finally:
+            closed.append(True)
+
+    async def run():
+        stream = DeltaCoalescer(window=0.01, max_bytes=0).coalesce(upstream())
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run())["type"] == "content"
+    assert closed == [True]
+
+
+if __name__ == "__main__":
+    test_merges_deltas_and_flushes_before_structural_events()
+    test_byte_threshold_and_time_window_flush()
+    test_disabled_window_passes_payloads_through()
+    test_closing_early_closes_upstream()
+    print("✅ SSE coalescing tests passed")
@@ -0,0 +1,155 @@
+# test_stream_sessions.py
+"""
+Offline tests for resumable SSE stream sessions
+"""
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stream_sessions import HEARTBEAT_FRAME, StreamGoneError, StreamSessionStore, parse_event_id
+
+
+class CountingSource:
+    """Payload generator that records how often it was started"""
+
+    def __init__(self, count: int, pause: float = 0.0):
+        self.count = count
+        self.pause = pause
+        self.starts = 0
+
+    async def __call__(self):
+        self.starts += 1
+        for index in range(self.count):
+            if self.pause:
+                await asyncio.sleep(self.pause)
+            yield {"type": "content", "content": str(index)}
+
+
+def event_ids(chunks: list[str]) -> list[str]:
+    return [line[4:] for chunk in chunks for line in chunk.splitlines() if line.startswith("id: ")]
+
+
+def test_frames_carry_ids_and_event_names():
+    async def scenario():
+        store = StreamSessionStore()
+        session = store.start(CountingSource(3)())
+        return session.stream_id, [chunk async for chunk in session.frames()]
+
+    stream_id, chunks = asyncio.run(scenario())
+    assert event_ids(chunks) == [f"{stream_id}:{seq}" for seq in (1, 2, 3)]
+    text = "".join(chunks)
+    assert "event: content\n" in text and 'data: {"type": "content", "content": "2"}' in text
+
+
+def test_resume_continues_after_last_event_without_restarting():
+    source = CountingSource(5, pause=0.01)
+
+    async def scenario():
+        store = StreamSessionStore()
+        session = store.start(source())
+        seen = []
+        async for chunk in session.frames():
+            seen.extend(event_ids([chunk]))
+            if len(seen) >= 2:
+                break  # connection dropped
+        resumed, after = store.resume(seen[-1])
+        rest = event_ids([chunk async for chunk in resumed.frames(after)])
+        return seen, rest
+
+    seen, rest = asyncio.run(scenario())
+    assert [parse_event_id(i)[1] for i in seen + rest] == [1, 2, 3, 4, 5]
+    assert source.starts == 1
+
+
+def test_heartbeat_while_idle():
+    async def scenario():
+        store = StreamSessionStore(heartbeat=0.01)
+        session = store.start(CountingSource(1, pause=0.05)())
+        return [chunk async for chunk in session.frames(heartbeat=0.01)]
+
+    chunks = asyncio.run(scenario())
+    assert chunks[0] == HEARTBEAT_FRAME
+    assert len(event_ids(chunks)) == 1
+
+
+def test_resume_outside_replay_window_is_gone():
+    async def scenario():
+        store = StreamSessionStore(replay_size=2)
+        session = store.start(CountingSource(5)())
+        await session._task
+        errors = []
+        for event_id in (f"{session.stream_id}:1", "unknown:1", "garbage"):
+            try:
+                store.resume(event_id)
+            except StreamGoneError:
+                errors.append(event_id)
+        _, after = store.resume(f"{session.stream_id}:3")
+        return errors, after
+
+    errors, after = asyncio.run(scenario())
+    assert len(errors) == 3
+    assert after == 3
+
+
+def test_finished_sessions_expire():
+    async def scenario():
+        store = StreamSessionStore(resume_ttl=0)
+        first = store.start(CountingSource(1)())
+        await first._task
+        store.start(CountingSource(1)())
+        return store.get(first.stream_id)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_disconnect_cancels_turn_after_grace():
+    """A dropped client stops the upstream stream and skips the follow-up turn"""
+    from test_turn_engine import make_engine, tool_round, answer_round
+    from sse import TurnPresenter
+
+    engine, responses = make_engine([
+        tool_round("resp_1", [("call_a", "lookup", {"username": "alice"})]),
+        answer_round("resp_2", "never sent"),
+    ])
+    released = asyncio.Event()
+
+    async def slow_lookup(username: str) -> dict:
+        await released.wait()
+        return {"user": username}
+
+    engine.executor.resolver = lambda name: slow_lookup
+
+    async def scenario():
+        store = StreamSessionStore(disconnect_grace=0.01)
+        presenter = TurnPresenter()
+
+        async def payloads():
+            async for payload in presenter.present(engine.run([{"role": "user", "content": "hi"}], tools=[{}])):
+                yield payload
+
+        session = store.start(payloads())
+        frames = session.frames()
+        async for chunk in frames:
+            if '"status"' in chunk:       # tools are running
+                break
+        await frames.aclose()             # client disconnected
+        await asyncio.sleep(0.1)
+        return store, session
+
+    store, session = asyncio.run(scenario())
+    assert session.cancelled and session.done
+    assert store.stats()["cancelled_on_disconnect"] == 1
+    assert len(responses.requests) == 1
+    assert all(stream.closed for stream in responses.streams)
+    assert engine.cancelled_turns == 1
+
+
+if __name__ == "__main__":
+    test_frames_carry_ids_and_event_names()
+    test_resume_continues_after_last_event_without_restarting()
+    test_heartbeat_while_idle()
+    test_resume_outside_replay_window_is_gone()
+    test_finished_sessions_expire()
+    test_disconnect_cancels_turn_after_grace()
+    print("✅ Stream session tests passed")
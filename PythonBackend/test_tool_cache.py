@@ -0,0 +1,98 @@
+# test_tool_cache.py
+"""
+Offline tests for the tool result cache and its executor integration
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tool_cache import ToolResultCache
+from test_helpers import FakeClock
+from tool_executor import ToolCall, ToolExecutor
+
+
+def test_ttl_expiry_and_lru_bound():
+    clock = FakeClock()
+    cache = ToolResultCache(max_entries=2, default_ttl=10, clock=clock)
+    calls = []
+
+    async def scenario():
+        async def compute(value):
+            calls.append(value)
+            return value
+
+        await cache.get_or_call("t", {"u": "a"}, lambda: compute("a"))
+        await cache.get_or_call("t", {"u": "a"}, lambda: compute("a-again"))
+        clock.now = 11
+        await cache.get_or_call("t", {"u": "a"}, lambda: compute("a-expired"))
+        await cache.get_or_call("t", {"u": "b"}, lambda: compute("b"))
+        await cache.get_or_call("t", {"u": "c"}, lambda: compute("c"))
+
+    asyncio.run(scenario())
+    assert calls == ["a", "a-expired", "b", "c"]
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 4
+    assert stats["size"] == 2 and stats["evictions"] == 1
+
+
+def test_single_flight_and_invalidation():
+    cache = ToolResultCache(default_ttl=60)
+    runs = []
+
+    async def slow():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"ok": True}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_call("lookup", {"username": "x"}, slow) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert all(result == {"ok": True} for result in results)
+    assert cache.stats()["coalesced"] == 4
+
+    assert cache.invalidate_matching(lambda name, args: args.get("username") == "x") == 1
+    assert cache.stats()["size"] == 0
+
+
+def test_executor_skips_cache_for_write_tools():
+    counter = {"lookup": 0, "send": 0}
+
+    def lookup(username: str) -> dict:
+        counter["lookup"] += 1
+        time.sleep(0.01)
+        return {"user": username}
+
+    def send(subject: str) -> dict:
+        counter["send"] += 1
+        return {"sent": subject}
+
+    tools = {"lookup": lookup, "send": send}
+    executor = ToolExecutor(
+        tools.__getitem__,
+        timeouts={},
+        cache=ToolResultCache(default_ttl=60),
+        cache_ttl_for=lambda name: None if name == "send" else 60,
+    )
+    calls = [
+        ToolCall("1", "lookup", json.dumps({"username": "a"})),
+        ToolCall("2", "lookup", json.dumps({"username": "a"})),
+        ToolCall("3", "send", json.dumps({"subject": "hi"})),
+        ToolCall("4", "send", json.dumps({"subject": "hi"})),
+    ]
+    results = asyncio.run(executor.run_all(calls))
+    executor.shutdown()
+
+    assert all(result.ok for result in results)
+    assert counter == {"lookup": 1, "send": 2}
+
+
+if __name__ == "__main__":
+    test_ttl_expiry_and_lru_bound()
+    test_single_flight_and_invalidation()
+    test_executor_skips_cache_for_write_tools()
+    print("✅ Tool cache tests passed")
@@ -0,0 +1,88 @@
+# test_tool_executor.py
+"""
+Offline tests for the concurrent tool executor (no server or Azure access needed)
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tool_executor import ToolCall, ToolExecutor
+
+
+def slow_lookup(username: str) -> dict:
+    time.sleep(0.2)
+    return {"user": username}
+
+
+async def async_lookup(username: str) -> dict:
+    await asyncio.sleep(0.2)
+    return {"user": username, "async": True}
+
+
+def failing_tool() -> dict:
+    raise RuntimeError("backend unavailable")
+
+
+def hanging_tool() -> dict:
+    time.sleep(1)
+    return {}
+
+
+TOOLS = {
+    "slow_lookup": slow_lookup,
+    "async_lookup": async_lookup,
+    "failing_tool": failing_tool,
+    "hanging_tool": hanging_tool,
+}
+
+
+def resolve(name: str):
+    if name not in TOOLS:
+        raise ValueError(f"Unknown function: {name}")
+    return TOOLS[name]
+
+
+def test_fan_out_runs_concurrently():
+    """Five 200ms lookups should take about 200ms, not one second"""
+    executor = ToolExecutor(resolve, max_workers=8, timeouts={})
+    calls = [ToolCall(f"call_{i}", "slow_lookup", json.dumps({"username": f"user{i}"})) for i in range(4)]
+    calls.append(ToolCall("call_4", "async_lookup", json.dumps({"username": "user4"})))
+
+    started = time.perf_counter()
+    results = asyncio.run(executor.run_all(calls))
+    elapsed = time.perf_counter() - started
+    executor.shutdown()
+
+    assert elapsed < 0.6, f"tools ran serially ({elapsed:.2f}s)"
+    assert [r.call_id for r in results] == [c.call_id for c in calls]
+    assert results[4].output == {"user": "user4", "async": True}
+
+
+def test_errors_and_timeouts_are_captured():
+    executor = ToolExecutor(resolve, default_timeout=5, timeouts={"hanging_tool": 0.1})
+    calls = [
+        ToolCall("a", "failing_tool"),
+        ToolCall("b", "hanging_tool"),
+        ToolCall("c", "missing_tool"),
+    ]
+    results = asyncio.run(executor.run_all(calls))
+    executor.shutdown()
+
+    assert [r.ok for r in results] == [False, False, False]
+    assert "backend unavailable" in results[0].error
+    assert "timed out" in results[1].error
+    assert "Unknown function" in results[2].error
+
+    item = results[0].to_input_item()
+    assert item["type"] == "function_call_output"
+    assert item["call_id"] == "a"
+    assert json.loads(item["output"]) == {"error": "backend unavailable"}
+
+
+if __name__ == "__main__":
+    test_fan_out_runs_concurrently()
+    test_errors_and_timeouts_are_captured()
+    print("✅ Tool executor tests passed")
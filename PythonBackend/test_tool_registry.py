@@ -0,0 +1,88 @@
+# test_tool_registry.py
+"""
+Offline tests for the startup-compiled tool registry
+"""
+import sys
+import os
+from typing import Literal
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import functions  # noqa: F401  (registers the lookup tools)
+import sendEmail  # noqa: F401  (registers the e-mail tools)
+from tool_registry import ToolArgumentError, ToolRegistry, registry
+
+
+def test_schema_derived_from_signature():
+    local = ToolRegistry()
+
+    @local.tool("Notify someone", channel="Delivery channel", recipients="Who to notify")
+    def notify(recipients: list[str], channel: Literal["email", "sms"] = "email", retries: int = 1) -> dict:
+        return {}
+
+    local.freeze()
+    tool = local.tools[0]
+    assert tool == {
+        "type": "function",
+        "name": "notify",
+        "description": "Notify someone",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "recipients": {"type": "array", "items": {"type": "string"}, "description": "Who to notify"},
+                "channel": {"type": "string", "description": "Delivery channel", "enum": ["email", "sms"], "default": "email"},
+                "retries": {"type": "integer", "default": 1},
+            },
+            "required": ["recipients"],
+        },
+    }
+    assert len(local.version) == 16
+    assert local.function_map["notify"] is notify
+
+
+def test_registered_tools_cover_functions_and_email():
+    assert "get_vendor_risk_ratings_complete" in registry
+    assert "get_consolidated_data_multiple_people" in registry
+    assert registry.spec("send_email").cacheable is False
+    assert registry.spec("send_compliance_notification").cacheable is False
+    assert registry.spec("get_training_gap_analysis").cacheable is True
+
+    schema = registry.spec("send_compliance_notification").parameters
+    assert schema["properties"]["priority"]["enum"] == ["low", "normal", "high", "urgent"]
+    assert schema["required"] == ["notification_type", "details"]
+
+
+def test_arguments_validated_before_dispatch():
+    result = registry.call("get_training_gap_analysis", username="jdoe")
+    assert result["user"] == "jdoe"
+
+    for bad_args in ({}, {"username": 42}, {"username": "jdoe", "extra": True}):
+        try:
+            registry.validate("get_training_gap_analysis", bad_args)
+        except ToolArgumentError:
+            continue
+        raise AssertionError(f"accepted invalid arguments {bad_args}")
+
+    try:
+        registry.validate("get_consolidated_data_multiple_people", {"usernames": ["a", 3]})
+    except ToolArgumentError as e:
+        assert "usernames[1]" in str(e)
+    else:
+        raise AssertionError("accepted a non-string username")
+
+
+def test_frozen_registry_rejects_late_registration():
+    local = ToolRegistry()
+    local.freeze()
+    try:
+        local.register(lambda: None, name="late")
+    except RuntimeError:
+        return
+    raise AssertionError("registration after freeze() was accepted")
+
+
+if __name__ == "__main__":
+    test_schema_derived_from_signature()
+    test_registered_tools_cover_functions_and_email()
+    test_arguments_validated_before_dispatch()
+    test_frozen_registry_rejects_late_registration()
+    print("✅ Tool registry tests passed")
@@ -0,0 +1,188 @@
+# test_turn_engine.py
+"""
+Offline tests for the unified turn engine, driven by a scripted fake
+Responses API client (no server or Azure access needed)
+"""
+import asyncio
+import json
+import sys
+import os
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from tool_executor import ToolExecutor
+from turn_engine import BudgetExhausted, ContentDelta, FunctionResult, TurnBudget, TurnEngine, TurnFinished
+from sse import TurnPresenter
+
+
+def ev(event_type: str, **fields) -> SimpleNamespace:
+    return SimpleNamespace(type=event_type, **fields)
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for event in self.events:
+            yield event
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeResponses:
+    def __init__(self, scripts):
+        self.scripts = list(scripts)
+        self.requests = []
+        self.streams = []
+
+    async def create(self, **request):
+        self.requests.append(request)
+        stream = FakeStream(self.scripts.pop(0))
+        self.streams.append(stream)
+        return stream
+
+
+def tool_round(response_id: str, calls: list[tuple[str, str, dict]]) -> list:
+    events = [ev("response.created", response=SimpleNamespace(id=response_id))]
+    for call_id, name, args in calls:
+        item = SimpleNamespace(type="function_call", id=f"item_{call_id}", call_id=call_id, name=name)
+        events.append(ev("response.output_item.added", item=item))
+        events.append(ev("response.function_call_arguments.delta", item_id=item.id, delta=json.dumps(args)))
+        events.append(ev("response.function_call_arguments.done", item_id=item.id, arguments=json.dumps(args)))
+    events.append(ev("response.completed", response=SimpleNamespace(id=response_id, usage=None)))
+    return events
+
+
+def answer_round(response_id: str, text: str) -> list:
+    return [
+        ev("response.created", response=SimpleNamespace(id=response_id)),
+        ev("response.reasoning_summary_text.delta", delta="thinking"),
+        *[ev("response.output_text.delta", delta=word) for word in text.split(" ")],
+        ev("response.completed", response=SimpleNamespace(id=response_id, usage=None)),
+    ]
+
+
+def lookup(username: str) -> dict:
+    return {"user": username}
+
+
+def make_engine(scripts):
+    responses = FakeResponses(scripts)
+    client = SimpleNamespace(responses=responses)
+    executor = ToolExecutor(lambda name: {"lookup": lookup}[name], timeouts={})
+    return TurnEngine(client, "test-model", executor), responses
+
+
+async def collect(engine, **kwargs):
+    return [event async for event in engine.run([{"role": "user", "content": "hi"}], **kwargs)]
+
+
+def test_tool_round_feeds_results_back_with_real_call_ids():
+    engine, responses = make_engine([
+        tool_round("resp_1", [("call_a", "lookup", {"username": "alice"}), ("call_b", "lookup", {"username": "bob"})]),
+        answer_round("resp_2", "All done"),
+    ])
+    events = asyncio.run(collect(engine, tools=[{"type": "function", "name": "lookup"}]))
+
+    follow_up = responses.requests[1]
+    assert follow_up["previous_response_id"] == "resp_1"
+    assert [item["call_id"] for item in follow_up["input"]] == ["call_a", "call_b"]
+    assert json.loads(follow_up["input"][1]["output"]) == {"user": "bob"}
+    assert all(stream.closed for stream in responses.streams)
+
+    results = [e.result for e in events if isinstance(e, FunctionResult)]
+    assert [r.call_id for r in results] == ["call_a", "call_b"]
+    finished = events[-1]
+    assert isinstance(finished, TurnFinished)
+    assert finished.text == "Alldone"
+    assert finished.response_id == "resp_2"
+    assert [e.round for e in events if isinstance(e, ContentDelta)] == [1, 1]
+
+
+def test_agent_loop_chains_tool_rounds():
+    """A user lookup followed by a consolidated-data call runs in one turn"""
+    engine, responses = make_engine([
+        tool_round("resp_1", [("call_a", "lookup", {"username": "alice"})]),
+        tool_round("resp_2", [("call_b", "lookup", {"username": "bob"})]),
+        answer_round("resp_3", "Final answer"),
+    ])
+    events = asyncio.run(collect(engine, tools=[{"type": "function", "name": "lookup"}]))
+
+    assert len(responses.requests) == 3
+    assert responses.requests[2]["previous_response_id"] == "resp_2"
+    assert responses.requests[2]["input"][0]["call_id"] == "call_b"
+    assert "tool_choice" not in responses.requests[2]
+    results = [e for e in events if isinstance(e, FunctionResult)]
+    assert [(e.round, e.result.call_id) for e in results] == [(0, "call_a"), (1, "call_b")]
+    assert events[-1].text == "Finalanswer"
+    assert events[-1].stop_reason is None
+
+
+def test_round_budget_forces_final_answer():
+    engine, responses = make_engine([
+        tool_round("resp_1", [("call_a", "lookup", {"username": "alice"})]),
+        answer_round("resp_2", "Wrapped up"),
+    ])
+    budget = TurnBudget().narrowed(max_rounds=1)
+    events = asyncio.run(collect(engine, tools=[{"type": "function", "name": "lookup"}], budget=budget))
+
+    assert responses.requests[1]["tool_choice"] == "none"
+    exhausted = [e for e in events if isinstance(e, BudgetExhausted)]
+    assert [e.reason for e in exhausted] == ["max_rounds"]
+    assert events[-1].stop_reason == "max_rounds"
+    assert events[-1].text == "Wrappedup"
+
+
+def test_tool_call_budget_skips_extra_calls():
+    engine, responses = make_engine([
+        tool_round("resp_1", [("call_a", "lookup", {"username": "alice"}), ("call_b", "lookup", {"username": "bob"})]),
+        answer_round("resp_2", "Partial"),
+    ])
+    budget = TurnBudget(max_tool_calls=1)
+    events = asyncio.run(collect(engine, tools=[{"type": "function", "name": "lookup"}], budget=budget))
+
+    outputs = [json.loads(item["output"]) for item in responses.requests[1]["input"]]
+    assert outputs[0] == {"user": "alice"}
+    assert "budget exhausted" in outputs[1]["error"]
+    assert events[-1].stop_reason == "max_tool_calls"
+
+
+def test_budget_narrowing_only_tightens():
+    budget = TurnBudget(max_rounds=5, max_tool_calls=20, max_seconds=300, max_tokens=1000)
+    narrowed = budget.narrowed(max_rounds=2, max_tokens=5000, max_seconds=None)
+    assert narrowed.max_rounds == 2
+    assert narrowed.max_tokens == 1000
+    assert narrowed.max_seconds == 300
+
+
+def test_presenter_emits_frontend_payloads():
+    engine, _ = make_engine([answer_round("resp_1", "Hello world")])
+    presenter = TurnPresenter(call_prefix="cot_")
+
+    async def present():
+        return [p async for p in presenter.present(engine.run([{"role": "user", "content": "hi"}]))]
+
+    payloads = asyncio.run(present())
+    types = [payload["type"] for payload in payloads]
+    assert types[:3] == ["stream_created", "reasoning_start", "reasoning"]
+    assert types[3:5] == ["reasoning_end", "content_start"]
+    # Back-to-back deltas are coalesced into one payload
+    assert [p["content"] for p in payloads if p["type"] == "content"] == ["Helloworld"]
+    assert presenter.content_started
+    assert presenter.finished.text == "Helloworld"
+
+
+if __name__ == "__main__":
+    test_tool_round_feeds_results_back_with_real_call_ids()
+    test_agent_loop_chains_tool_rounds()
+    test_round_budget_forces_final_answer()
+    test_tool_call_budget_skips_extra_calls()
+    test_budget_narrowing_only_tightens()
+    test_presenter_emits_frontend_payloads()
+    print("✅ Turn engine tests passed")
@@ -0,0 +1,107 @@
+# test_usage_accounting.py
+"""
+Offline tests for token usage accounting and the daily token budget
+"""
+import asyncio
+import sys
+import os
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import functions  # noqa: F401 - registers the data tools
+from metrics import TOKEN_BUDGET_ACTIONS
+import sendEmail  # noqa: F401 - registers send_email
+from test_turn_engine import answer_round, make_engine, tool_round
+from usage_accounting import TokenBudgetExceeded, TokenUsage, UsageLedger, account_usage, tool_pattern
+
+
+def usage(input_tokens: int, output_tokens: int, cached: int = 0, reasoning: int = 0) -> SimpleNamespace:
+    return SimpleNamespace(
+        input_tokens=input_tokens,
+        input_tokens_details=SimpleNamespace(cached_tokens=cached),
+        output_tokens=output_tokens,
+        output_tokens_details=SimpleNamespace(reasoning_tokens=reasoning),
+        total_tokens=input_tokens + output_tokens,
+    )
+
+
+def with_usage(events: list, response_usage) -> list:
+    events[-1].response.usage = response_usage
+    return events
+
+
+def test_usage_is_booked_per_round_tool_pattern_and_user():
+    engine, _ = make_engine([
+        with_usage(tool_round("resp_1", [("call_a", "lookup", {"username": "alice"})]), usage(1000, 50, cached=800)),
+        with_usage(answer_round("resp_2", "Done"), usage(1200, 300, reasoning=200)),
+    ])
+    ledger = UsageLedger()
+
+    async def run():
+        events = engine.run([{"role": "user", "content": "hi"}], tools=[{"type": "function", "name": "lookup"}])
+        return [e async for e in account_usage(events, ledger, "alice@example.com", "/test", "default")]
+
+    asyncio.run(run())
+    snapshot = ledger.snapshot()
+
+    assert snapshot["total"]["total_tokens"] == 2550
+    assert snapshot["by_round"]["initial"]["cached_input_tokens"] == 800
+    assert snapshot["by_round"]["follow_up"]["reasoning_tokens"] == 200
+    # "lookup" is not a registered tool: booked as unknown rather than as a new bucket
+    assert snapshot["by_tools"]["unknown"]["responses"] == 2 and "lookup" not in snapshot["by_tools"]
+    assert snapshot["by_user"]["alice@example.com"]["output_tokens"] == 350
+    assert ledger.spent_today("alice@example.com") == 2550
+
+
+def test_tool_pattern_keeps_registered_names_only():
+    assert tool_pattern(["send_email", "get_asset_checkout_records", "send_email"]) == \
+        "get_asset_checkout_records+send_email"
+    assert tool_pattern(["send_email", "made_up_tool", "another_guess"]) == "send_email+unknown"
+    assert tool_pattern([]) == "none"
+
+
+def test_missing_usage_counts_as_zero():
+    assert TokenUsage.from_response(None).total_tokens == 0
+    partial = TokenUsage.from_response(SimpleNamespace(input_tokens=10, output_tokens=5))
+    assert (partial.total_tokens, partial.cached_input_tokens) == (15, 0)
+
+
+def test_daily_budget_downgrades_or_rejects():
+    downgrading = UsageLedger(daily_budget=100, action="downgrade", downgrade_effort="low")
+    reasoning = {"effort": "high", "summary": "auto"}
+    assert downgrading.admit("bob", reasoning) == reasoning
+    downgrading.charge("bob", TokenUsage(total_tokens=150))
+    assert downgrading.admit("bob", reasoning) == {"effort": "low", "summary": "auto"}
+    assert downgrading.admit("bob", {"effort": "minimal"}) == {"effort": "minimal"}
+    assert downgrading.admit("carol", reasoning) == reasoning
+
+    rejecting = UsageLedger(daily_budget=100, action="reject")
+    rejecting.charge("bob", TokenUsage(total_tokens=100))
+    try:
+        rejecting.admit("bob", None)
+    except TokenBudgetExceeded:
+        pass
+    else:
+        raise AssertionError("over-budget turn must be rejected")
+    assert rejecting.budget_status("bob")["remaining"] == 0
+
+
+def test_plan_previews_the_budget_without_booking_it():
+    ledger = UsageLedger(daily_budget=100, action="downgrade", downgrade_effort="low")
+    ledger.charge("bob", TokenUsage(total_tokens=150))
+    reasoning = {"effort": "high"}
+    before = TOKEN_BUDGET_ACTIONS.value(action="downgraded")
+    assert ledger.plan("bob", reasoning) == ({"effort": "low"}, "downgraded")
+    assert ledger.plan("carol", reasoning) == (reasoning, None)
+    assert TOKEN_BUDGET_ACTIONS.value(action="downgraded") == before
+    assert ledger.admit("bob", reasoning) == {"effort": "low"}
+    assert TOKEN_BUDGET_ACTIONS.value(action="downgraded") == before + 1
+
+
+if __name__ == "__main__":
+    test_usage_is_booked_per_round_tool_pattern_and_user()
+    test_tool_pattern_keeps_registered_names_only()
+    test_missing_usage_counts_as_zero()
+    test_daily_budget_downgrades_or_rejects()
+    test_plan_previews_the_budget_without_booking_it()
+    print("✅ Usage accounting tests passed")
@@ -0,0 +1,172 @@
+# tool_cache.py
+"""
+TTL + LRU cache for tool results.
+
+The lookup tools in functions.py are pure reads keyed by their arguments, so
+repeated calls within a short window can share one result. Entries expire
+after a per-tool TTL, the cache is bounded by an LRU entry limit, and
+concurrent identical calls are collapsed into a single execution
+(single-flight). Tools with side effects are never cached; the executor asks
+the registry whether a tool is cacheable before going through the cache.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "300"))
+DEFAULT_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+
+
+def load_cache_ttls() -> dict[str, float]:
+    """Per-tool TTL overrides, e.g. TOOL_CACHE_TTLS='{"get_user_info": 60}'"""
+    raw = os.getenv("TOOL_CACHE_TTLS", "")
+    if not raw:
+        return {}
+    try:
+        return {name: float(seconds) for name, seconds in json.loads(raw).items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid TOOL_CACHE_TTLS value: {e}")
+        return {}
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+
+
+class ToolResultCache:
+    """
+    Bounded cache of tool results with per-entry expiry
+
+    Must be used from a single event loop; results are shared between callers
+    and must be treated as read-only.
+
+    Args:
+        max_entries: LRU bound on the number of cached results
+        default_ttl: Lifetime in seconds for tools without their own TTL
+        clock: Monotonic time source (injectable for tests)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+        default_ttl: float = DEFAULT_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(name: str, arguments: dict) -> tuple:
+        return name, json.dumps(arguments, sort_keys=True, default=str)
+
+    def _lookup(self, key: tuple) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: tuple, value: Any, ttl: float) -> None:
+        self._entries[key] = _Entry(value, self.clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_call(
+        self,
+        name: str,
+        arguments: dict,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Return a cached result or compute it once
+
+        Concurrent callers with the same key wait for the first caller's
+        result. Exceptions are propagated to every waiter and never cached.
+        """
+        key = self.key(name, arguments)
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.value
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            # Waiters get an ordinary error even if the leading call was cancelled
+            error = e if isinstance(e, Exception) else RuntimeError(f"{name} was cancelled")
+            future.set_exception(error)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            self._store(key, value, self.default_ttl if ttl is None else ttl)
+            future.set_result(value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def invalidate(self, name: Optional[str] = None, arguments: Optional[dict] = None) -> int:
+        """
+        Drop cached results
+
+        Args:
+            name: Only drop results of this tool (all tools when omitted)
+            arguments: Only drop the entry for exactly these arguments
+
+        Returns:
+            Number of entries removed
+        """
+        if name is not None and arguments is not None:
+            return 1 if self._entries.pop(self.key(name, arguments), None) else 0
+        keys = [key for key in self._entries if name is None or key[0] == name]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def invalidate_matching(self, predicate: Callable[[str, dict], bool]) -> int:
+        """Drop every entry whose (tool name, arguments) satisfies the predicate"""
+        keys = [key for key in self._entries if predicate(key[0], json.loads(key[1]))]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
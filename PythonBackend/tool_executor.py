@@ -0,0 +1,160 @@
+# tool_executor.py
+"""
+Concurrent execution of model-issued function calls.
+
+All function calls from one model turn are gathered and run together instead
+of one by one inside the stream loop. Sync tools (most of functions.py, and
+send_email with its blocking SMTP I/O) run on a bounded thread pool; async
+tools run directly on the event loop. Every call has its own timeout, and the
+results are returned in the order the model issued the calls so the follow-up
+``responses.create`` turn always sees a stable input. Cacheable tools are
+served through an optional ``ToolResultCache``.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from tool_cache import ToolResultCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT_SECONDS", "30"))
+DEFAULT_TOOL_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "16"))
+
+
+def _load_tool_timeouts() -> dict[str, float]:
+    """Per-tool timeout overrides, e.g. TOOL_TIMEOUTS='{"send_email": 60}'"""
+    raw = os.getenv("TOOL_TIMEOUTS", "")
+    if not raw:
+        return {}
+    try:
+        return {name: float(seconds) for name, seconds in json.loads(raw).items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid TOOL_TIMEOUTS value: {e}")
+        return {}
+
+
+@dataclass
+class ToolCall:
+    """A function call issued by the model"""
+    call_id: str
+    name: str
+    arguments: str = ""          # raw JSON string as streamed by the model
+    item_id: Optional[str] = None
+
+    def parsed_arguments(self) -> dict:
+        if not self.arguments:
+            return {}
+        if isinstance(self.arguments, dict):
+            return self.arguments
+        return json.loads(self.arguments)
+
+
+@dataclass
+class ToolResult:
+    """Outcome of a single tool call"""
+    call_id: str
+    name: str
+    output: Any = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_input_item(self) -> dict:
+        """Format as a ``function_call_output`` item for the next model turn"""
+        payload = self.output if self.ok else {"error": self.error}
+        return {
+            "type": "function_call_output",
+            "call_id": self.call_id,
+            "output": json.dumps(payload, separators=(",", ":")),  # compact: this text goes into the prompt
+        }
+
+
+class ToolExecutor:
+    """
+    Run tool calls concurrently with per-tool timeouts
+
+    Args:
+        resolver: Maps a tool name to its callable; raises ValueError for unknown tools
+        validator: Optional check of (name, arguments) run before dispatch; raises on invalid input
+        max_workers: Size of the thread pool used for sync tools
+        default_timeout: Timeout in seconds applied to tools without an override
+        timeouts: Per-tool timeout overrides in seconds
+        cache: Optional result cache
+        cache_ttl_for: Returns the cache TTL for a tool, or None when it must not be cached
+    """
+
+    def __init__(
+        self,
+        resolver: Callable[[str], Callable],
+        validator: Optional[Callable[[str, dict], Any]] = None,
+        max_workers: int = DEFAULT_TOOL_WORKERS,
+        default_timeout: float = DEFAULT_TOOL_TIMEOUT,
+        timeouts: Optional[dict[str, float]] = None,
+        cache: Optional[ToolResultCache] = None,
+        cache_ttl_for: Optional[Callable[[str], Optional[float]]] = None,
+    ):
+        self.resolver = resolver
+        self.validator = validator
+        self.default_timeout = default_timeout
+        self.timeouts = _load_tool_timeouts() if timeouts is None else dict(timeouts)
+        self.cache = cache
+        self.cache_ttl_for = cache_ttl_for
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def timeout_for(self, name: str) -> float:
+        return self.timeouts.get(name, self.default_timeout)
+
+    async def _invoke(self, function: Callable, kwargs: dict) -> Any:
+        if asyncio.iscoroutinefunction(function):
+            return await function(**kwargs)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, lambda: function(**kwargs))
+
+    async def run(self, call: ToolCall) -> ToolResult:
+        """Execute one tool call; errors and timeouts are captured in the result"""
+        started = time.perf_counter()
+        try:
+            function = self.resolver(call.name)
+            kwargs = call.parsed_arguments()
+            if self.validator:
+                self.validator(call.name, kwargs)
+            timeout = self.timeout_for(call.name)
+            invoke = lambda: asyncio.wait_for(self._invoke(function, kwargs), timeout=timeout)
+            ttl = self.cache_ttl_for(call.name) if self.cache is not None and self.cache_ttl_for else None
+            if ttl is not None:
+                output = await self.cache.get_or_call(call.name, kwargs, invoke, ttl)
+            else:
+                output = await invoke()
+            return ToolResult(call.call_id, call.name, output=output, duration=time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            # A sync tool keeps running in its worker thread; we only stop waiting for it
+            error = f"{call.name} timed out after {self.timeout_for(call.name)}s"
+        except Exception as e:
+            error = str(e)
+        logger.error(f"Error processing {call.name}: {error}")
+        return ToolResult(call.call_id, call.name, error=error, duration=time.perf_counter() - started)
+
+    async def run_all(self, calls: list[ToolCall]) -> list[ToolResult]:
+        """
+        Execute every call from one model turn concurrently
+
+        Wall-clock time is that of the slowest tool. Results are ordered to
+        match the order in which the model issued the calls.
+        """
+        if not calls:
+            return []
+        results = await asyncio.gather(*(self.run(call) for call in calls))
+        order = {call.call_id: index for index, call in enumerate(calls)}
+        return sorted(results, key=lambda result: order.get(result.call_id, len(order)))
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,232 @@
+# tool_registry.py
+"""
+Tool registry built once at startup.
+
+Functions exposed to the model are decorated with ``@tool(...)`` where they are
+defined (functions.py, sendEmail.py, main.py). Their JSON schemas are derived
+from the signatures, and ``freeze()`` turns the registrations into an
+immutable dispatch table and the tool list sent to the model, together with a
+hash of that list's canonical JSON that identifies the tool-set version.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import types
+import typing
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", dict: "object"}
+
+
+class ToolArgumentError(ValueError):
+    """Raised when model-supplied arguments do not match a tool's schema"""
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """A registered tool and its compiled schema"""
+    name: str
+    function: Callable
+    description: str
+    parameters: Optional[dict]
+    cacheable: bool = True
+    cache_ttl: Optional[float] = None   # seconds; None uses the cache default
+
+    def to_tool(self) -> dict:
+        """Format as a Responses API function tool"""
+        tool = {"type": "function", "name": self.name, "description": self.description}
+        if self.parameters is not None:
+            tool["parameters"] = self.parameters
+        return tool
+
+
+def _schema_for(annotation: Any) -> dict:
+    """Derive a JSON schema fragment from a type annotation"""
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+
+    if origin is Literal:
+        schema = _schema_for(type(args[0]))
+        schema["enum"] = list(args)
+        return schema
+    if origin in (Union, getattr(types, "UnionType", Union)):
+        non_null = [arg for arg in args if arg is not type(None)]
+        if len(non_null) == 1:
+            return _schema_for(non_null[0])
+    if origin in (list, tuple, set):
+        schema = {"type": "array"}
+        if args:
+            schema["items"] = _schema_for(args[0])
+        return schema
+    if origin is dict:
+        return {"type": "object"}
+    if annotation in _JSON_TYPES:
+        return {"type": _JSON_TYPES[annotation]}
+    raise TypeError(f"Unsupported tool parameter type: {annotation!r}")
+
+
+def compile_parameters(function: Callable, descriptions: dict[str, str]) -> Optional[dict]:
+    """Build the ``parameters`` object schema from a function signature"""
+    signature = inspect.signature(function)
+    hints = typing.get_type_hints(function)
+    if not signature.parameters:
+        return None
+
+    properties: dict[str, dict] = {}
+    required: list[str] = []
+    for name, parameter in signature.parameters.items():
+        schema = _schema_for(hints.get(name, str))
+        # Keep key order stable: type, items, description, enum, default
+        ordered = {"type": schema["type"]}
+        if "items" in schema:
+            ordered["items"] = schema["items"]
+        if name in descriptions:
+            ordered["description"] = descriptions[name]
+        if "enum" in schema:
+            ordered["enum"] = schema["enum"]
+        if parameter.default is inspect.Parameter.empty:
+            required.append(name)
+        elif parameter.default is not None:
+            ordered["default"] = parameter.default
+        properties[name] = ordered
+
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def _check_value(name: str, value: Any, schema: dict) -> None:
+    expected = schema.get("type")
+    valid = {
+        "string": lambda v: isinstance(v, str),
+        "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "boolean": lambda v: isinstance(v, bool),
+        "array": lambda v: isinstance(v, list),
+        "object": lambda v: isinstance(v, dict),
+    }.get(expected, lambda v: True)
+    if not valid(value):
+        raise ToolArgumentError(f"Argument '{name}' must be of type {expected}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise ToolArgumentError(f"Argument '{name}' must be one of {schema['enum']}")
+    if expected == "array" and "items" in schema:
+        for index, item in enumerate(value):
+            _check_value(f"{name}[{index}]", item, schema["items"])
+
+
+class ToolRegistry:
+    """Collects tool registrations and freezes them into a dispatch table"""
+
+    def __init__(self):
+        self._specs: dict[str, ToolSpec] = {}
+        self._frozen = False
+        self.tools: list[dict] = []
+        self.version: str = ""
+        self.function_map: types.MappingProxyType = types.MappingProxyType({})
+
+    def tool(
+        self,
+        description: Optional[str] = None,
+        *,
+        name: Optional[str] = None,
+        cacheable: bool = True,
+        cache_ttl: Optional[float] = None,
+        **param_descriptions: str,
+    ) -> Callable:
+        """
+        Decorator registering a function as a model-callable tool
+
+        Args:
+            description: Tool description; defaults to the first docstring line
+            name: Tool name; defaults to the function name
+            cacheable: False for tools with side effects (e.g. sending e-mail)
+            cache_ttl: Result cache lifetime in seconds
+            **param_descriptions: Description for each parameter
+        """
+        def decorator(function: Callable) -> Callable:
+            self.register(function, description=description, name=name, cacheable=cacheable,
+                          cache_ttl=cache_ttl, param_descriptions=param_descriptions)
+            return function
+        return decorator
+
+    def register(
+        self,
+        function: Callable,
+        description: Optional[str] = None,
+        name: Optional[str] = None,
+        cacheable: bool = True,
+        cache_ttl: Optional[float] = None,
+        param_descriptions: Optional[dict[str, str]] = None,
+    ) -> ToolSpec:
+        if self._frozen:
+            raise RuntimeError("Tool registry is frozen; register tools at import time")
+        name = name or function.__name__
+        if name in self._specs:
+            raise ValueError(f"Tool already registered: {name}")
+        description = description or (inspect.getdoc(function) or name).splitlines()[0]
+        spec = ToolSpec(
+            name=name,
+            function=function,
+            description=description,
+            parameters=compile_parameters(function, param_descriptions or {}),
+            cacheable=cacheable,
+            cache_ttl=cache_ttl,
+        )
+        self._specs[name] = spec
+        return spec
+
+    def freeze(self) -> "ToolRegistry":
+        """Compile the tool list, its version hash and the dispatch table (idempotent)"""
+        if self._frozen:
+            return self
+        self.tools = [spec.to_tool() for spec in self._specs.values()]
+        encoded = json.dumps(self.tools, separators=(",", ":"), ensure_ascii=False)
+        self.version = hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+        self.function_map = types.MappingProxyType({name: spec.function for name, spec in self._specs.items()})
+        self._frozen = True
+        logger.info(f"Tool registry frozen: {len(self.tools)} tools, version {self.version}")
+        return self
+
+    def spec(self, name: str) -> ToolSpec:
+        try:
+            return self._specs[name]
+        except KeyError:
+            raise ValueError(f"Unknown function: {name}") from None
+
+    def get(self, name: str) -> Callable:
+        """Look up the callable behind a tool name"""
+        return self.spec(name).function
+
+    def validate(self, name: str, arguments: dict) -> dict:
+        """Check arguments against the compiled schema; returns them unchanged"""
+        parameters = self.spec(name).parameters or {"properties": {}, "required": []}
+        properties = parameters["properties"]
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f"Arguments for {name} must be an object")
+        unexpected = [key for key in arguments if key not in properties]
+        if unexpected:
+            raise ToolArgumentError(f"Unexpected argument(s) for {name}: {', '.join(unexpected)}")
+        missing = [key for key in parameters["required"] if key not in arguments]
+        if missing:
+            raise ToolArgumentError(f"Missing required argument(s) for {name}: {', '.join(missing)}")
+        for key, value in arguments.items():
+            _check_value(key, value, properties[key])
+        return arguments
+
+    def call(self, name: str, **kwargs) -> Any:
+        """Validate arguments and dispatch"""
+        self.validate(name, kwargs)
+        return self.get(name)(**kwargs)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+
+# Process-wide registry used by functions.py, sendEmail.py and main.py
+registry = ToolRegistry()
+tool = registry.tool
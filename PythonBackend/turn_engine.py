@@ -0,0 +1,403 @@
+# turn_engine.py
+"""
+Unified streaming turn engine for the Responses API.
+
+Every chat endpoint used to carry its own copy of the stream loop: event
+dispatch, function-call bookkeeping, tool execution, the follow-up
+``responses.create`` call and the SSE framing. ``TurnEngine`` owns the first
+four and yields typed events; endpoints only decide how to present them.
+
+A turn is an agent loop: as long as the model keeps asking for tools, they are
+executed and the response is continued with ``previous_response_id``, bounded
+by a ``TurnBudget`` (rounds, tool calls, wall-clock time and tokens).
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Optional
+
+from request_logging import debug_sampled, log_event
+from tool_executor import ToolCall, ToolExecutor, ToolResult
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Typed events
+# ---------------------------------------------------------------------------
+# ``round`` is 0 for the initial response and increases with every follow-up
+# response that feeds tool results back to the model.
+
+@dataclass
+class TurnEvent:
+    round: int = 0
+
+
+@dataclass
+class StreamCreated(TurnEvent):
+    response_id: Optional[str] = None
+    requested_at: Optional[float] = None   # time.monotonic() when responses.create was called
+
+
+@dataclass
+class StreamProgress(TurnEvent):
+    pass
+
+
+@dataclass
+class OutputItemAdded(TurnEvent):
+    item_type: Optional[str] = None
+
+
+@dataclass
+class OutputItemDone(TurnEvent):
+    item_type: Optional[str] = None
+
+
+@dataclass
+class FunctionCallAdded(TurnEvent):
+    name: str = ""
+    call_id: str = ""
+    item_id: Optional[str] = None
+
+
+@dataclass
+class FunctionCallDone(TurnEvent):
+    name: str = ""
+    call_id: str = ""
+    item_id: Optional[str] = None
+
+
+@dataclass
+class FunctionArgsDelta(TurnEvent):
+    name: str = ""
+    call_id: str = ""
+    item_id: Optional[str] = None
+    delta: str = ""
+
+
+@dataclass
+class FunctionArgsComplete(TurnEvent):
+    name: str = ""
+    call_id: str = ""
+    item_id: Optional[str] = None
+    arguments: str = ""
+
+
+@dataclass
+class ReasoningDelta(TurnEvent):
+    text: str = ""
+
+
+@dataclass
+class ContentDelta(TurnEvent):
+    text: str = ""
+
+
+@dataclass
+class ResponseCompleted(TurnEvent):
+    response_id: Optional[str] = None
+    usage: Any = None
+
+
+@dataclass
+class ToolsStarted(TurnEvent):
+    calls: list[ToolCall] = field(default_factory=list)
+
+
+@dataclass
+class FunctionResult(TurnEvent):
+    result: Optional[ToolResult] = None
+
+
+@dataclass
+class BudgetExhausted(TurnEvent):
+    reason: str = ""                     # max_rounds, max_tool_calls, max_seconds or max_tokens
+    limit: float = 0
+
+
+@dataclass
+class TurnFinished(TurnEvent):
+    text: str = ""                       # answer text of the last round that produced any
+    response_id: Optional[str] = None    # id of the last upstream response
+    tool_results: list[ToolResult] = field(default_factory=list)
+    total_tokens: int = 0
+    stop_reason: Optional[str] = None    # set when a budget cut the loop short
+
+
+# ---------------------------------------------------------------------------
+# Budget
+# ---------------------------------------------------------------------------
+
+DEFAULT_MAX_ROUNDS = int(os.getenv("AGENT_MAX_ROUNDS", "5"))
+DEFAULT_MAX_TOOL_CALLS = int(os.getenv("AGENT_MAX_TOOL_CALLS", "20"))
+DEFAULT_MAX_SECONDS = float(os.getenv("AGENT_MAX_SECONDS", "300"))
+DEFAULT_MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "200000"))
+
+
+@dataclass
+class TurnBudget:
+    """
+    Limits for one agent loop
+
+    max_rounds counts tool rounds: after that many rounds of tool execution the
+    model is asked for a final answer with tools disabled. The same wrap-up
+    happens when the tool-call allowance runs out. Exceeding the wall-clock or
+    token limit stops the loop without another model call.
+    """
+    max_rounds: int = DEFAULT_MAX_ROUNDS
+    max_tool_calls: int = DEFAULT_MAX_TOOL_CALLS
+    max_seconds: float = DEFAULT_MAX_SECONDS
+    max_tokens: int = DEFAULT_MAX_TOKENS
+
+    def narrowed(self, **overrides) -> "TurnBudget":
+        """Apply per-request limits; requests may only tighten the server defaults"""
+        values = {}
+        for name, default in vars(self).items():
+            override = overrides.get(name)
+            values[name] = default if override is None else min(default, override)
+        return TurnBudget(**values)
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _RoundState:
+    response_id: Optional[str] = None
+    calls_by_item: dict[str, ToolCall] = field(default_factory=dict)
+    calls: list[ToolCall] = field(default_factory=list)
+    text: list[str] = field(default_factory=list)
+    total_tokens: int = 0
+
+
+class TurnEngine:
+    """
+    Drive one user turn against the Responses API
+
+    Args:
+        client: AsyncAzureOpenAI (or compatible) client
+        model: Deployment name
+        executor: Executes the function calls of each round
+    """
+
+    def __init__(self, client, model: str, executor: ToolExecutor):
+        self.client = client
+        self.model = model
+        self.executor = executor
+        self.cancelled_turns = 0
+
+    async def run(
+        self,
+        input_items: list,
+        tools: Optional[list] = None,
+        reasoning: Optional[dict] = None,
+        budget: Optional[TurnBudget] = None,
+        previous_response_id: Optional[str] = None,
+        prompt_cache_key: Optional[str] = None,
+    ) -> AsyncIterator[TurnEvent]:
+        """
+        Stream a full turn: the initial response, then one round of tool
+        execution plus a follow-up response for as long as the model keeps
+        calling tools and the budget allows
+
+        With ``previous_response_id`` the initial response continues an
+        earlier conversation and ``input_items`` only carries the new input.
+        ``prompt_cache_key`` is sent with every response of the turn to help
+        the upstream route requests sharing a prompt prefix to its cache.
+
+        Yields typed ``TurnEvent`` objects and always ends with ``TurnFinished``.
+        """
+        budget = budget or TurnBudget()
+        started = time.monotonic()
+        debug = debug_sampled(logger)   # per-event debug records for a sample of turns only
+
+        request = {"model": self.model, "input": input_items, "stream": True}
+        if previous_response_id:
+            request["previous_response_id"] = previous_response_id
+        if prompt_cache_key:
+            request["prompt_cache_key"] = prompt_cache_key
+        if tools:
+            request["tools"] = tools
+        if reasoning:
+            request["reasoning"] = reasoning
+
+        round_index = 0
+        try:
+            state = _RoundState()
+            async for event in self._stream_round(request, 0, state, debug):
+                yield event
+
+            answer = "".join(state.text)
+            total_tokens = state.total_tokens
+            tool_calls_used = 0
+            tool_results: list[ToolResult] = []
+            stop_reason: Optional[str] = None
+
+            while state.calls and state.response_id:
+                # Hard limits: stop without spending another model call
+                if time.monotonic() - started >= budget.max_seconds:
+                    stop_reason, limit = "max_seconds", budget.max_seconds
+                elif total_tokens >= budget.max_tokens:
+                    stop_reason, limit = "max_tokens", budget.max_tokens
+                if stop_reason:
+                    logger.warning(f"Agent loop stopped after round {round_index}: {stop_reason} ({limit})")
+                    yield BudgetExhausted(round=round_index, reason=stop_reason, limit=limit)
+                    break
+
+                allowed = max(budget.max_tool_calls - tool_calls_used, 0)
+                to_run, skipped = state.calls[:allowed], state.calls[allowed:]
+
+                yield ToolsStarted(round=round_index, calls=list(to_run))
+                round_results = await self.executor.run_all(to_run)
+                round_results += [
+                    ToolResult(call.call_id, call.name, error="Tool call budget exhausted; answer with the data gathered so far")
+                    for call in skipped
+                ]
+                tool_calls_used += len(to_run)
+                tool_results.extend(round_results)
+                for result in round_results:
+                    yield FunctionResult(round=round_index, result=result)
+
+                # Soft limits: ask for a final answer with tools disabled
+                wrap_up = None
+                if skipped or tool_calls_used >= budget.max_tool_calls:
+                    wrap_up = ("max_tool_calls", budget.max_tool_calls)
+                elif round_index + 1 >= budget.max_rounds:
+                    wrap_up = ("max_rounds", budget.max_rounds)
+
+                follow_up = {
+                    "model": self.model,
+                    "previous_response_id": state.response_id,
+                    "input": [result.to_input_item() for result in round_results],
+                    "stream": True,
+                }
+                if tools:
+                    follow_up["tools"] = tools
+                    if wrap_up:
+                        follow_up["tool_choice"] = "none"
+                if reasoning:
+                    follow_up["reasoning"] = reasoning
+                if prompt_cache_key:
+                    follow_up["prompt_cache_key"] = prompt_cache_key
+                if wrap_up:
+                    stop_reason = wrap_up[0]
+                    yield BudgetExhausted(round=round_index, reason=wrap_up[0], limit=wrap_up[1])
+
+                round_index += 1
+                state = _RoundState()
+                async for event in self._stream_round(follow_up, round_index, state, debug):
+                    yield event
+                total_tokens += state.total_tokens
+                answer = "".join(state.text) or answer
+                if wrap_up:
+                    break
+
+            log_event(logger, logging.INFO, "turn finished", rounds=round_index + 1, tool_calls=len(tool_results),
+                      total_tokens=total_tokens, stop_reason=stop_reason,
+                      duration_ms=round((time.monotonic() - started) * 1000, 1))
+            yield TurnFinished(round=round_index, text=answer, response_id=state.response_id,
+                               tool_results=tool_results, total_tokens=total_tokens, stop_reason=stop_reason)
+        except (asyncio.CancelledError, GeneratorExit):
+            # The consumer went away (client disconnect): the open upstream
+            # stream is closed by _stream_round, in-flight tool tasks are
+            # cancelled with the gather in run_all, and no follow-up is sent
+            self.cancelled_turns += 1
+            log_event(logger, logging.INFO, "turn cancelled", round=round_index,
+                      duration_ms=round((time.monotonic() - started) * 1000, 1))
+            raise
+
+    async def complete(
+        self,
+        input_items: list,
+        tools: Optional[list] = None,
+        reasoning: Optional[dict] = None,
+        budget: Optional[TurnBudget] = None,
+        previous_response_id: Optional[str] = None,
+        prompt_cache_key: Optional[str] = None,
+    ) -> TurnFinished:
+        """Run a turn to completion and return only the final summary"""
+        finished = TurnFinished()
+        async for event in self.run(input_items, tools, reasoning, budget, previous_response_id, prompt_cache_key):
+            if isinstance(event, TurnFinished):
+                finished = event
+        return finished
+
+    async def _stream_round(
+        self, request: dict, round_index: int, state: _RoundState, debug: bool = False
+    ) -> AsyncIterator[TurnEvent]:
+        """Translate one upstream response stream into typed events"""
+        requested_at = time.monotonic()
+        stream = await self.client.responses.create(**request)
+        try:
+            async for event in stream:
+                event_type = event.type
+                if debug:
+                    log_event(logger, logging.DEBUG, "upstream event", round=round_index, type=event_type)
+
+                if event_type == "response.created":
+                    response = getattr(event, "response", None)
+                    state.response_id = getattr(event, "response_id", None) or getattr(response, "id", None)
+                    yield StreamCreated(round=round_index, response_id=state.response_id, requested_at=requested_at)
+
+                elif event_type == "response.in_progress":
+                    yield StreamProgress(round=round_index)
+
+                elif event_type == "response.output_item.added":
+                    item = getattr(event, "item", None) or getattr(event, "output_item", None)
+                    if item is not None and getattr(item, "type", None) == "function_call":
+                        state.calls_by_item[item.id] = ToolCall(call_id=item.call_id, name=item.name, item_id=item.id)
+                        yield FunctionCallAdded(round=round_index, name=item.name, call_id=item.call_id, item_id=item.id)
+                    else:
+                        yield OutputItemAdded(round=round_index, item_type=getattr(item, "type", None))
+
+                elif event_type == "response.output_item.done":
+                    item = getattr(event, "item", None) or getattr(event, "output_item", None)
+                    if item is not None and getattr(item, "type", None) == "function_call":
+                        yield FunctionCallDone(round=round_index, name=item.name, call_id=item.call_id, item_id=item.id)
+                    else:
+                        yield OutputItemDone(round=round_index, item_type=getattr(item, "type", None))
+
+                elif event_type == "response.reasoning_summary_text.delta":
+                    yield ReasoningDelta(round=round_index, text=event.delta)
+
+                elif event_type == "response.output_text.delta":
+                    state.text.append(event.delta)
+                    yield ContentDelta(round=round_index, text=event.delta)
+
+                elif event_type == "response.function_call_arguments.delta":
+                    item_id = getattr(event, "item_id", None)
+                    call = state.calls_by_item.setdefault(
+                        item_id, ToolCall(call_id=item_id, name="unknown_function", item_id=item_id))
+                    call.arguments += event.delta
+                    yield FunctionArgsDelta(round=round_index, name=call.name, call_id=call.call_id,
+                                            item_id=item_id, delta=event.delta)
+
+                elif event_type == "response.function_call_arguments.done":
+                    item_id = getattr(event, "item_id", None)
+                    call = state.calls_by_item.setdefault(
+                        item_id, ToolCall(call_id=item_id, name="unknown_function", item_id=item_id))
+                    call.arguments = getattr(event, "arguments", None) or call.arguments
+                    state.calls.append(call)
+                    yield FunctionArgsComplete(round=round_index, name=call.name, call_id=call.call_id,
+                                               item_id=item_id, arguments=call.arguments)
+
+                elif event_type == "response.function_call":
+                    # legacy single-chunk function call
+                    state.calls.append(ToolCall(call_id=event.call_id, name=event.name, arguments=event.arguments))
+
+                elif event_type == "response.completed":
+                    response = getattr(event, "response", None)
+                    usage = getattr(response, "usage", None)
+                    state.response_id = state.response_id or getattr(response, "id", None)
+                    state.total_tokens = getattr(usage, "total_tokens", 0) or 0
+                    yield ResponseCompleted(round=round_index, response_id=state.response_id, usage=usage)
+                    break
+
+                elif event_type == "response.done":
+                    break
+        finally:
+            await stream.close()
@@ -0,0 +1,260 @@
+# usage_accounting.py
+"""
+Token usage and cost accounting.
+
+Every ``response.completed`` event carries the usage of that response. The
+``account_usage`` wrapper picks it up for each round of a turn (the first
+response and every follow-up after tool execution) and books it in a
+``UsageLedger`` under several dimensions: endpoint, scenario, round (initial
+or follow-up), the pattern of tools the turn invoked, the user and the
+prompt prefix. Totals are served by ``/api/usage`` and the token counters are
+also exported on ``/metrics``. The share of input tokens served from the
+upstream prompt cache is reported per dimension as ``cache_hit_rate``.
+
+The ledger also enforces an optional per-user daily token budget. Once a
+user has spent it, new turns are either rejected or run with a lower
+``reasoning.effort`` (``USAGE_BUDGET_ACTION``).
+"""
+import logging
+import os
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Optional
+
+from metrics import PROMPT_CACHE_LOOKUPS, TOKEN_BUDGET_ACTIONS, TOKEN_COST, TOKENS, tool_label
+from request_logging import log_event
+from turn_engine import FunctionResult, ResponseCompleted, TurnEvent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DAILY_TOKEN_BUDGET = int(os.getenv("USAGE_DAILY_TOKEN_BUDGET", "0"))   # 0 disables the budget
+DEFAULT_BUDGET_ACTION = os.getenv("USAGE_BUDGET_ACTION", "downgrade").lower()  # downgrade | reject
+DEFAULT_DOWNGRADE_EFFORT = os.getenv("USAGE_DOWNGRADE_EFFORT", "low")
+
+# USD per million tokens; reasoning tokens are billed as output tokens
+PRICE_INPUT = float(os.getenv("TOKEN_PRICE_INPUT_PER_1M", "0"))
+PRICE_CACHED_INPUT = float(os.getenv("TOKEN_PRICE_CACHED_INPUT_PER_1M", "0"))
+PRICE_OUTPUT = float(os.getenv("TOKEN_PRICE_OUTPUT_PER_1M", "0"))
+
+EFFORT_ORDER = ("minimal", "low", "medium", "high")
+
+# Providers only cache prompts of at least this many input tokens
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+
+class TokenBudgetExceeded(Exception):
+    """Raised when a user has spent their daily token budget and the action is 'reject'"""
+
+
+@dataclass
+class TokenUsage:
+    """Token counts of one or more responses"""
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    reasoning_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    responses: int = 0
+
+    @classmethod
+    def from_response(cls, usage) -> "TokenUsage":
+        """Read a Responses API ``usage`` object (missing details count as zero)"""
+        if usage is None:
+            return cls()
+        input_details = getattr(usage, "input_tokens_details", None)
+        output_details = getattr(usage, "output_tokens_details", None)
+        input_tokens = getattr(usage, "input_tokens", 0) or 0
+        output_tokens = getattr(usage, "output_tokens", 0) or 0
+        return cls(
+            input_tokens=input_tokens,
+            cached_input_tokens=getattr(input_details, "cached_tokens", 0) or 0,
+            reasoning_tokens=getattr(output_details, "reasoning_tokens", 0) or 0,
+            output_tokens=output_tokens,
+            total_tokens=getattr(usage, "total_tokens", 0) or input_tokens + output_tokens,
+            responses=1,
+        )
+
+    def add(self, other: "TokenUsage") -> None:
+        self.input_tokens += other.input_tokens
+        self.cached_input_tokens += other.cached_input_tokens
+        self.reasoning_tokens += other.reasoning_tokens
+        self.output_tokens += other.output_tokens
+        self.total_tokens += other.total_tokens
+        self.responses += other.responses
+
+    @property
+    def cost(self) -> float:
+        """Estimated cost in USD from the configured per-million prices"""
+        uncached = self.input_tokens - self.cached_input_tokens
+        return (uncached * PRICE_INPUT + self.cached_input_tokens * PRICE_CACHED_INPUT
+                + self.output_tokens * PRICE_OUTPUT) / 1_000_000
+
+    @property
+    def cache_hit_rate(self) -> Optional[float]:
+        """Share of input tokens served from the upstream prompt cache"""
+        return self.cached_input_tokens / self.input_tokens if self.input_tokens else None
+
+    def to_dict(self) -> dict:
+        rate = self.cache_hit_rate
+        return {**asdict(self), "cost_usd": round(self.cost, 6),
+                "cache_hit_rate": None if rate is None else round(rate, 4)}
+
+
+def tool_pattern(tool_names: list[str]) -> str:
+    """Stable key for the set of tools a turn invoked, e.g. ``get_user_info+send_email``"""
+    return "+".join(sorted({tool_label(name) for name in tool_names})) or "none"
+
+
+class UsageLedger:
+    """
+    Aggregated token usage and the per-user daily budget
+
+    Args:
+        daily_budget: Tokens a user may spend per UTC day (0 disables the budget)
+        action: What happens to a user over budget: "downgrade" or "reject"
+        downgrade_effort: Reasoning effort used for users over budget when downgrading
+    """
+
+    DIMENSIONS = ("endpoint", "scenario", "round", "tools", "user", "prefix")
+
+    def __init__(
+        self,
+        daily_budget: int = DEFAULT_DAILY_TOKEN_BUDGET,
+        action: str = DEFAULT_BUDGET_ACTION,
+        downgrade_effort: str = DEFAULT_DOWNGRADE_EFFORT,
+    ):
+        if action not in ("downgrade", "reject"):
+            raise ValueError(f"Unknown budget action: {action}")
+        self.daily_budget = daily_budget
+        self.action = action
+        self.downgrade_effort = downgrade_effort
+        self.total = TokenUsage()
+        self._totals: dict[str, dict[str, TokenUsage]] = {dimension: {} for dimension in self.DIMENSIONS}
+        self._daily: dict[str, tuple[date, int]] = {}
+
+    @staticmethod
+    def _today() -> date:
+        return datetime.now(timezone.utc).date()
+
+    def spent_today(self, user: str) -> int:
+        day, tokens = self._daily.get(user, (None, 0))
+        return tokens if day == self._today() else 0
+
+    def over_budget(self, user: str) -> bool:
+        return self.daily_budget > 0 and self.spent_today(user) >= self.daily_budget
+
+    def charge(self, user: str, usage: TokenUsage) -> None:
+        """Count tokens against the user's daily budget as soon as a response completes"""
+        today = self._today()
+        day, tokens = self._daily.get(user, (today, 0))
+        self._daily[user] = (today, (tokens if day == today else 0) + usage.total_tokens)
+
+    def record(self, usage: TokenUsage, **keys: str) -> None:
+        """Add usage to each given dimension (endpoint, scenario, ...)"""
+        for dimension, key in keys.items():
+            self._totals[dimension].setdefault(key, TokenUsage()).add(usage)
+
+    def record_turn(self, usage: TokenUsage, **keys: str) -> None:
+        """Add a whole turn's usage to the overall total and to each given dimension"""
+        self.total.add(usage)
+        self.record(usage, **keys)
+
+    def plan(self, user: str, reasoning: Optional[dict]) -> tuple[Optional[dict], Optional[str]]:
+        """
+        What the daily budget does to a new turn, without booking it
+
+        Returns:
+            The reasoning config to use and the action: "rejected", "downgraded" or None
+        """
+        if not self.over_budget(user):
+            return reasoning, None
+        if self.action == "reject":
+            return reasoning, "rejected"
+        effort = (reasoning or {}).get("effort")
+        if effort is None or _effort_rank(effort) <= _effort_rank(self.downgrade_effort):
+            return reasoning, None
+        return {**reasoning, "effort": self.downgrade_effort}, "downgraded"
+
+    def admit(self, user: str, reasoning: Optional[dict]) -> Optional[dict]:
+        """
+        Apply the daily budget to a new turn and book the action (call once per turn)
+
+        Returns:
+            The reasoning config to use (a lower effort for users over budget)
+
+        Raises:
+            TokenBudgetExceeded: If the user is over budget and the action is "reject"
+        """
+        admitted, action = self.plan(user, reasoning)
+        if action is None:
+            return admitted
+        TOKEN_BUDGET_ACTIONS.inc(action=action)
+        if action == "rejected":
+            log_event(logger, logging.WARNING, "token budget exceeded", user=user,
+                      spent=self.spent_today(user), budget=self.daily_budget, action=action)
+            raise TokenBudgetExceeded(
+                f"Daily token budget of {self.daily_budget} tokens exhausted for {user}")
+        log_event(logger, logging.INFO, "token budget exceeded", user=user,
+                  spent=self.spent_today(user), budget=self.daily_budget, action=action,
+                  effort=reasoning["effort"], downgraded_to=self.downgrade_effort)
+        return admitted
+
+    def budget_status(self, user: str) -> dict:
+        spent = self.spent_today(user)
+        return {
+            "user": user,
+            "spent_today": spent,
+            "daily_budget": self.daily_budget or None,
+            "remaining": max(self.daily_budget - spent, 0) if self.daily_budget else None,
+            "action": self.action,
+        }
+
+    def snapshot(self) -> dict:
+        return {
+            "total": self.total.to_dict(),
+            **{f"by_{dimension}": {key: usage.to_dict() for key, usage in totals.items()}
+               for dimension, totals in self._totals.items()},
+            "budget": {"daily_tokens": self.daily_budget or None, "action": self.action,
+                       "spent_today": {user: self.spent_today(user) for user in self._daily}},
+        }
+
+
+def _effort_rank(effort: str) -> int:
+    return EFFORT_ORDER.index(effort) if effort in EFFORT_ORDER else len(EFFORT_ORDER)
+
+
+async def account_usage(
+    events: AsyncIterator[TurnEvent],
+    ledger: UsageLedger,
+    user: str,
+    endpoint: str,
+    scenario: str = "default",
+    prefix: str = "none",
+) -> AsyncIterator[TurnEvent]:
+    """Pass turn events through unchanged while booking the usage of every round"""
+    turn = TokenUsage()
+    tools: list[str] = []
+    try:
+        async for event in events:
+            if isinstance(event, ResponseCompleted):
+                usage = TokenUsage.from_response(event.usage)
+                round_key = "initial" if event.round == 0 else "follow_up"
+                ledger.charge(user, usage)
+                ledger.record(usage, round=round_key)
+                turn.add(usage)
+                labels = {"endpoint": endpoint, "scenario": scenario, "round": round_key}
+                for kind in ("input", "cached_input", "reasoning", "output"):
+                    TOKENS.inc(getattr(usage, f"{kind}_tokens"), **labels, kind=kind)
+                TOKEN_COST.inc(usage.cost, endpoint=endpoint, scenario=scenario)
+                if usage.input_tokens < PROMPT_CACHE_MIN_TOKENS:
+                    cache_result = "ineligible"
+                else:
+                    cache_result = "hit" if usage.cached_input_tokens else "miss"
+                PROMPT_CACHE_LOOKUPS.inc(endpoint=endpoint, result=cache_result)
+            elif isinstance(event, FunctionResult):
+                tools.append(event.result.name)
+            yield event
+    finally:
+        # Tokens of a cancelled turn were still spent
+        ledger.record_turn(turn, endpoint=endpoint, scenario=scenario, tools=tool_pattern(tools), user=user,
+                           prefix=prefix)
@@ -44,6 +44,7 @@ interface IState {
     isCoTReasoningActive: boolean;
     currentCoTContent: string;
     currentResponseContent: string;
+    conversationId: string | null;
 }
 
 const items = [
@@ -66,6 +67,7 @@ class Copilot extends Component<IProps, IState> {
             isCoTReasoningActive: false,
             currentCoTContent: "",
             currentResponseContent: "",
+            conversationId: null,
         };
     }
     private recognition: any = null;
@@ -394,6 +396,9 @@ class Copilot extends Component<IProps, IState> {
                 formData.append("file", this.state.selectedFile);
                 formData.append("message", message);
                 formData.append("scenario", this.props.scenario || "default");
+                if (this.state.conversationId) {
+                    formData.append("conversation_id", this.state.conversationId);
+                }
                 formData.append(
                     "messages",
                     JSON.stringify(
@@ -415,6 +420,7 @@ class Copilot extends Component<IProps, IState> {
 
                 const data = await response.json();
                 console.log(data);
+                this.setState({ conversationId: data.conversation_id ?? null });
 
                 // Add the copilot's message to the state
                 this.props.addMessage({
@@ -435,6 +441,7 @@ class Copilot extends Component<IProps, IState> {
                         content: msg.content,
                         agent: msg.agent,
                     })),
+                    conversation_id: this.state.conversationId ?? undefined,
                 };
 
                 const response = await fetch("/api/chat", {
@@ -451,6 +458,7 @@ class Copilot extends Component<IProps, IState> {
 
                 const data = await response.json();
                 console.log(data);
+                this.setState({ conversationId: data.conversation_id ?? null });
 
                 // Add the copilot's message to the state
                 this.props.addMessage({
@@ -509,6 +517,9 @@ class Copilot extends Component<IProps, IState> {
                 formData.append("file", this.state.selectedFile);
                 formData.append("message", message);
                 formData.append("scenario", this.props.scenario || "default");
+                if (this.state.conversationId) {
+                    formData.append("conversation_id", this.state.conversationId);
+                }
                 formData.append(
                     "messages",
                     JSON.stringify(
@@ -532,6 +543,7 @@ class Copilot extends Component<IProps, IState> {
                         content: msg.content,
                         agent: msg.agent,
                     })),
+                    conversation_id: this.state.conversationId ?? undefined,
                 };
 
                 response = await fetch("/api/chat/cot-stream", {
@@ -570,6 +582,12 @@ class Copilot extends Component<IProps, IState> {
                         try {
                             const parsed = JSON.parse(data);
                             switch (parsed.type) {
+                                case "conversation":
+                                    // Follow-up turns continue this conversation server-side
+                                    this.setState({
+                                        conversationId: parsed.conversation_id,
+                                    });
+                                    break;
                                 case "file_processed":
                                     console.log(
                                         `File processed: ${parsed.filename}, Content length: ${parsed.content_length}`